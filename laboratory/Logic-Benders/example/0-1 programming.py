@@ -13,6 +13,7 @@
 import os
 import sys
 import math
+import heapq
 import numpy as np
 from gurobipy import *
 import matplotlib.pyplot as plt
@@ -24,6 +25,7 @@ class ResultMaster(object):
         self.obj_con = obj_con.getValue()
         self.obj_opr = obj_opr.x
         self.obj = (model.getObjective()).getValue()  # objective
+        self.time = model.Runtime  # solution time
 
 
 # This class restores the results of reconfiguration sub-problem
@@ -39,81 +41,151 @@ class ResultBranchBound(object):
         self.d_j0  = j0     # j0
         self.d_j1  = j1     # j1
         self.d_fit = fit    # fitness
+        self.idle  = 0      # number of iterations that the cut is inactive
 
 
-# This program solves 0-1 programming based on a classical Branch-and-Bound algorithm
-# Dual information from the relaxed linear programming at each leaf node is returned
-# 
-def BranchBound(c,e,A,rhs,lb,ub,br = 0):
-    # 
-    # The model has the following format:
-    # 
-    # minimize
-    #       c * x + e
-    # subject to 
-    #       A * x >= rhs   (u)
-    #           x >= lb    (v)
-    #           x <= ub    (v)
-    # where x is binary varibale, dual and v are dual variables
-    #
-    # Global variables
-    global var, obj  # optimization
-    global dual, flag, j0, j1, fit  # node of search tree
-    if br == 0:  # initialization
-        var  = np.zeros(len(c))  # all zero
+# This class solves 0-1 programming based on a classical Branch-and-Bound algorithm.
+# The search tree is kept in an explicit node queue (depth-first or best-first) and 
+# every node owns a copy of its bounds, so the search neither recurses nor shares
+# any global state. Dual information from the relaxed linear programming at each 
+# node is returned
+#
+class BranchBoundTree(object):
+    def __init__(self,c,e,A,rhs,rule = 'depth',max_node = 100000):
+        # 
+        # The model has the following format:
+        # 
+        # minimize
+        #       c * x + e
+        # subject to 
+        #       A * x >= rhs   (u)
+        #           x >= lb    (v)
+        #           x <= ub    (v)
+        # where x is binary varibale, u and v are dual variables
+        #
+        self.c = c
+        self.e = e
+        self.A = A
+        self.rhs = rhs
+        self.rule = rule  # 'depth' or 'best'
+        self.max_node = max_node  # node limit
+        self.n_node = 0  # number of solved nodes
+        self.model = 0  # persistent linear programming
+    def Build(self):
+        # The relaxed linear programming is built only once, nodes differ only in
+        # bounds of variables and are re-optimized by dual simplex
+        model = Model()
+        n_var = np.size(self.A,1) # number of x
+        x = model.addVars(n_var)
+        obj = quicksum(self.c[i] * x[i] for i in range(n_var)) + self.e
+        model.setObjective(obj, GRB.MINIMIZE)
+        for i in range(np.size(self.A,0)):
+            nz = np.nonzero(self.A[i])[0]  # non-zero coefficients
+            model.addConstr(quicksum(self.A[i,j] * x[j] for j in nz) >= self.rhs[i])
+        model.Params.OutputFlag = 0  # turn off the display
+        model.Params.Method = 1  # dual simplex
+        model.update()
+        self.model  = model
+        self.x      = [x[i] for i in range(n_var)]
+        self.constr = model.getConstrs()
+        self.obj    = obj
+    def Linprog(self,lb,ub,basis):
+        if self.model == 0:
+            self.Build()
+        model = self.model
+        model.setAttr('LB', self.x, lb)
+        model.setAttr('UB', self.x, ub)
+        if basis != []:  # warm start from the basis of parent node
+            model.setAttr('VBasis', self.x, basis[0])
+            model.setAttr('CBasis', self.constr, basis[1])
+        model.optimize()
+        if model.status == GRB.Status.OPTIMAL:
+            lp_var = np.array(model.getAttr('X', self.x))
+            lp_obj = np.array(self.obj.getValue())
+            lp_flg = np.array(1)
+            lp_dul = np.array(model.getAttr('Pi', self.constr))
+            basis  = [model.getAttr('VBasis', self.x), model.getAttr('CBasis', self.constr)]
+            return [lp_var,lp_obj,lp_flg,lp_dul,basis]
+        else:  # feasibility solution
+            [lp_var,lp_obj,lp_flg,lp_dul] = Linprog(self.c,self.e,self.A,self.rhs,lb,ub)
+            return [lp_var,lp_obj,lp_flg,lp_dul,[]]
+    def Solve(self,lb,ub):
+        # Incumbent solution
+        var  = np.zeros(len(self.c))  # all zero
         obj  = float("inf")  # python infinity
+        # Node of search tree
         dual = []  # dual variables 
         flag = []  # optimality flag
         fit  = []  # fitness
         j0   = []  # index of x where branching has set xj to 0
         j1   = []  # index of x where branching has set xj to 1
-    # Solve the relaxed linear programming
-    [lp_var,lp_obj,lp_flg,lp_dul] = Linprog(c,e,A,rhs,lb,ub)
-    # Update global variabes for the current node in the search tree
-    dual.append(lp_dul)
-    flag.append(lp_flg)
-    fit. append(lp_obj)
-    j0.  append(np.where(lb + ub == 0))  # lb == 0 and ub == 0
-    j1.  append(np.where(lb + ub == 2))  # lb == 1 and ub == 1
-    # Branching
-    if lp_flg != 1:  # if problem is infeasible
-        var_out = lp_var
-        obj_out = lp_obj + 1e2
-        flg_out = -1
-    else:  # if problem is feasible
-        if lp_obj > obj:  # can't find any solution better than the current one
-            var_out = lp_var
-            obj_out = lp_obj
-            flg_out = -2
-        else:  # find a solution better than the current one
+        # Node queue, each node is [bound,order,lb,ub,basis]
+        queue = [[-float("inf"), 0, np.copy(lb), np.copy(ub), []]]
+        n_push = 1
+        self.n_node = 0
+        var_out = var
+        obj_out = obj
+        flg_out = 1
+        while queue != [] and self.n_node < self.max_node:
+            if self.rule == 'best':
+                [_,_,lb,ub,basis] = heapq.heappop(queue)
+            else:
+                [_,_,lb,ub,basis] = queue.pop()
+            self.n_node = self.n_node + 1
+            # Solve the relaxed linear programming
+            [lp_var,lp_obj,lp_flg,lp_dul,basis] = self.Linprog(lb,ub,basis)
+            dual.append(lp_dul)
+            flag.append(lp_flg)
+            fit. append(lp_obj)
+            j0.  append(np.where(lb + ub == 0))  # lb == 0 and ub == 0
+            j1.  append(np.where(lb + ub == 2))  # lb == 1 and ub == 1
+            if lp_flg != 1:  # if problem is infeasible
+                if self.n_node == 1:
+                    var_out = lp_var
+                    obj_out = lp_obj + 1e2
+                    flg_out = -1
+                continue
+            if lp_obj > obj:  # can't find any solution better than the current one
+                continue
             lp_var = np.array(lp_var)  # list to array
             lp_gap = np.abs(lp_var - np.rint(lp_var))  # gap
             if max(lp_gap) == 0:  # integer solution
-                var = lp_var  # update global variable
+                var = lp_var
                 obj = lp_obj
-                var_out = var  # update output
-                obj_out = obj
-                flg_out = 1
-            else:  # real solution
-                leaf = np.where(lp_gap > 0)  # index of leaf node for branching
-                pick = int(leaf[0][0])  # pick up the first index
-                lb_temp = np.copy(lb)  # temporary lower bound
-                ub_temp = np.copy(ub)  # temporary upper bound
-                # The upper branch calculation
-                if ub[pick] >= np.floor(lp_var[pick]) + 1:
-                    lb_temp[pick] = np.floor(lp_var[pick]) + 1  # branching
-                    BranchBound(c,e,A,rhs,lb_temp,ub,1)
-                # The lower branch calculation
-                if lb[pick] <= np.floor(lp_var[pick]):
-                    ub_temp[pick] = np.floor(lp_var[pick])  # branching
-                    BranchBound(c,e,A,rhs,lb,ub_temp,1)
-                # update output
                 var_out = var
                 obj_out = obj
-                flg_out = 1
-    result = ResultBranchBound(var_out,obj_out,flg_out,dual,flag,j0,j1,fit)
-    # Return results
-    return result
+                continue
+            # Branching on the first fractional variable
+            leaf = np.where(lp_gap > 0)  # index of leaf node for branching
+            pick = int(round(leaf[0][0]))  # pick up the first index
+            # The lower branch
+            if lb[pick] <= np.floor(lp_var[pick]):
+                ub_temp = np.copy(ub)
+                ub_temp[pick] = np.floor(lp_var[pick])
+                self.Push(queue, [lp_obj, n_push, np.copy(lb), ub_temp, basis])
+                n_push = n_push + 1
+            # The upper branch (explored first in depth-first search)
+            if ub[pick] >= np.floor(lp_var[pick]) + 1:
+                lb_temp = np.copy(lb)
+                lb_temp[pick] = np.floor(lp_var[pick]) + 1
+                self.Push(queue, [lp_obj, n_push, lb_temp, np.copy(ub), basis])
+                n_push = n_push + 1
+        if queue != [] and flg_out == 1:  # node limit is reached
+            flg_out = 0
+        result = ResultBranchBound(var_out,obj_out,flg_out,dual,flag,j0,j1,fit)
+        return result
+    def Push(self,queue,node):
+        if self.rule == 'best':
+            heapq.heappush(queue, node)
+        else:
+            queue.append(node)
+
+
+# This function solves 0-1 programming by the Branch-and-Bound tree
+# 
+def BranchBound(c,e,A,rhs,lb,ub):
+    Tree = BranchBoundTree(c,e,A,rhs)
+    return Tree.Solve(lb,ub)
 
 
 # This program solves a simple linear programming by Gurobi 8.1.0
@@ -168,23 +240,23 @@ def Linprog(c,e,A,rhs,lb,ub):
 # Form optimality cut
 def OptimalityInequality(c,e,A,B,a,dual,beta,j0,j1,y):
     # The following formulation is based on expression (35) in the paper
+    n_col   = len(c) # number of columns
     temp_uB = dual.dot(B) # dual*B
     temp_ua = dual.dot(a) # dual*a
     temp_bt = beta # beta
-    temp_sum_0 = 0 # initialize the first sum term
-    temp_sum_1 = 0 # initialize the second sum term
-    for i in range(len(c)):
-        if i in j1: # if i belongs to J1
-            temp_sum_0 = temp_sum_0 + dual.dot(A[:,i]) - c[i]
-        if (i not in j0) and (i not in j1): # if i doesn't belong to J0 and J1
-            if dual.dot(A[:,i]) - c[i] >= 0:
-                temp_sum_1 = temp_sum_1 + dual.dot(A[:,i]) - c[i]
-            else:
-                temp_sum_1 = temp_sum_1 + 0
+    temp_rc = dual.dot(A[:,0:n_col]) - c[0:n_col] # reduced cost of each column
+    # Masks of J0, J1 and free columns
+    idx_0  = np.asarray(j0, dtype = int).ravel()
+    mask_0 = np.zeros(n_col, dtype = bool)
+    mask_0[idx_0[idx_0 < n_col]] = True
+    idx_1  = np.asarray(j1, dtype = int).ravel()
+    mask_1 = np.zeros(n_col, dtype = bool)
+    mask_1[idx_1[idx_1 < n_col]] = True
+    free   = ~(mask_0 | mask_1)
+    temp_sum_0 = temp_rc[mask_1].sum() # the first sum term
+    temp_sum_1 = np.maximum(temp_rc[free], 0).sum() # the second sum term
     # Formulate expression
-    expr = LinExpr()
-    for i in range(len(y)):
-        expr = expr + temp_uB[i] * y[i]
+    expr = LinExpr(temp_uB[0:len(y)].tolist(), [y[i] for i in range(len(y))])
     expr = expr - temp_ua + temp_bt - e + temp_sum_0 + temp_sum_1
     # Return
     return expr
@@ -193,81 +265,172 @@ def OptimalityInequality(c,e,A,B,a,dual,beta,j0,j1,y):
 # Form feasibility cut
 def FeasibilityInequality(c,e,A,B,a,dual,beta,j0,j1,y):
     # The following formulation is based on expression (35) in the paper
+    n_col   = len(y) # number of columns
     temp_uB = dual.dot(B) # dual*B
     temp_ua = dual.dot(a) # dual*a
-    temp_sum_0 = 0 # initialize the first sum term
-    temp_sum_1 = 0 # initialize the second sum term
-    for i in range(len(y)):
-        if i in j1: # if i belongs to J1
-            temp_sum_0 = temp_sum_0 + dual.dot(A[:,i])
-        if (i not in j0) and (i not in j1): # if i doesn't belong to J0 and J1
-            if dual.dot(A[:,i]) >= 0:
-                temp_sum_1 = temp_sum_1 + dual.dot(A[:,i])
-            else:
-                temp_sum_1 = temp_sum_1 + 0
+    temp_rc = dual.dot(A[:,0:n_col]) # reduced cost of each column
+    # Masks of J0, J1 and free columns
+    idx_0  = np.asarray(j0, dtype = int).ravel()
+    mask_0 = np.zeros(n_col, dtype = bool)
+    mask_0[idx_0[idx_0 < n_col]] = True
+    idx_1  = np.asarray(j1, dtype = int).ravel()
+    mask_1 = np.zeros(n_col, dtype = bool)
+    mask_1[idx_1[idx_1 < n_col]] = True
+    free   = ~(mask_0 | mask_1)
+    temp_sum_0 = temp_rc[mask_1].sum() # the first sum term
+    temp_sum_1 = np.maximum(temp_rc[free], 0).sum() # the second sum term
     # Formulate expression
-    expr = LinExpr()
-    for i in range(len(y)):
-        expr = expr + temp_uB[i] * y[i]
+    expr = LinExpr(temp_uB[0:len(y)].tolist(), [y[i] for i in range(len(y))])
     expr = expr - temp_ua + temp_sum_0 + temp_sum_1
     # Return
     return expr
 
 
-# Master problem
-def MasterProblem(d,logic,n_iter):
-    # Create a gurobi model
-    model = Model()
-    y = model.addVars(len(d), vtype = GRB.BINARY)  # Create variables
-    obj_opr = model.addVar()  # Create variables
-    obj_con = quicksum(d[i] * y[i] for i in range(len(d))) # objective of construction
+# This function computes the lower and upper bound of a linear expression from the
+# bounds of its variables
+#
+def ExprBound(expr):
+    n_term = expr.size()  # number of terms
+    coef = np.array([expr.getCoeff(i)  for i in range(n_term)])
+    lb   = np.array([expr.getVar(i).LB for i in range(n_term)])
+    ub   = np.array([expr.getVar(i).UB for i in range(n_term)])
+    expr_min = expr.getConstant() + np.sum(np.where(coef > 0, coef * lb, coef * ub))
+    expr_max = expr.getConstant() + np.sum(np.where(coef > 0, coef * ub, coef * lb))
+    return [expr_min,expr_max]
 
-    # Add constraints
-    if n_iter == 0:
-        model.addConstr(obj_opr == 0)
-    else:
-        for i in range(n_iter):
-            dual = logic[i].d_var  # dual variables
-            flag = logic[i].d_flg  # status flag
-            beta = logic[i].d_fit  # objective at leaf node
-            j0   = logic[i].d_j0   # set of all j where branching has set xj to 0
-            j1   = logic[i].d_j1   # set of all j where branching has set xj to 1
-            # Inequality initialization
-            n_logic = np.size(flag,0)  # number of new-added logic variables
-            logic_var = model.addVars(n_logic, vtype = GRB.BINARY) # logic variable
-            logic_and = model.addVar(vtype = GRB.BINARY) # logic AND variable
-            # Formulate Inequality
-            Inequality = []
-            for t in range(n_logic):
-                if flag[t] == 1: # optimality inequality
-                    expr = OptimalityInequality(c,e,A,B,a,dual[t],beta[t],j0[t][0],j1[t][0],y)
-                    Inequality.append(expr)
-                    model.addConstr((logic_var[t] == 1) >> (expr <= 0.001))
-                    model.addConstr((logic_var[t] == 0) >> (expr >= 0.001))
-                else: # feasibility inequality
-                    expr = FeasibilityInequality(c,e,A,B,a,dual[t],beta[t],j0[t][0],j1[t][0],y)
-                    Inequality.append(expr)
-                    model.addConstr((logic_var[t] == 1) >> (expr <= -0.001))
-                    model.addConstr((logic_var[t] == 0) >> (expr >= -0.001))
-            # Add Benders cut
+
+# This function links the leaf inequalities of a B&B tree to a logic AND variable
+# which can be 1 only if every inequality holds, i.e. expr <= tol. Two encodings:
+# 1) 'indicator': one binary, two indicator constraints per leaf and an and_
+# 2) 'bigm': one binary per leaf which is 1 only if the leaf is violated, with a
+#    tight Big-M from the bounds of variables. The AND is aggregated into a single
+#    inequality, and leaves which can never be violated are pruned
+# A leaf with None inequality is unconstrained and skipped by both encodings
+#
+def LogicAnd(model,Inequality,tol,encode = 'bigm'):
+    logic_and = model.addVar(vtype = GRB.BINARY) # logic AND variable
+    n_logic = len(Inequality)  # number of leaves
+    if encode == 'indicator':
+        logic_var = []
+        for k in range(n_logic):
+            if Inequality[k] is None:  # unconstrained leaf
+                continue
+            var = model.addVar(vtype = GRB.BINARY) # logic variable
+            model.addConstr((var == 1) >> (Inequality[k] <= tol[k]))
+            model.addConstr((var == 0) >> (Inequality[k] >= tol[k]))
+            logic_var.append(var)
+        if logic_var == []:
+            logic_and.LB = 1
+        else:
             model.addConstr(logic_and == and_(logic_var)) # logic and
-            sum_cj = 0 # sum of cj
-            for t in range(len(c)):
-                if c[t] > 0:
-                    sum_cj = sum_cj + 0
-                else:
-                    sum_cj = sum_cj + c[t]
-            model.addConstr(obj_opr >= sum_cj + (logic[i].obj-sum_cj) * logic_and)
-    # Set objective
-    obj = obj_con + obj_opr
-    model.setObjective(obj,GRB.MINIMIZE)
-    # Solve
-    model.optimize()
-    # Return
-    if model.status == GRB.Status.OPTIMAL:
+        return logic_and
+    model.update()
+    logic_var = []
+    for k in range(n_logic):
+        expr = Inequality[k]
+        if expr is None:  # unconstrained leaf
+            continue
+        [expr_min,expr_max] = ExprBound(expr)
+        if expr_max < tol[k]:  # never violated
+            continue
+        if expr_min >= tol[k]:  # always violated
+            logic_and.UB = 0
+            return logic_and
+        violate = model.addVar(vtype = GRB.BINARY) # 1 if the leaf is violated
+        model.addConstr(expr >= tol[k] - (tol[k] - expr_min) * (1 - violate))
+        model.addConstr(logic_and <= 1 - violate)
+        logic_var.append(violate)
+    model.addConstr(logic_and >= 1 - quicksum(logic_var)) # logic and
+    return logic_and
+
+
+# This function formulates the inequalities of the leaves of a logic Benders cut
+# and the lower bound sum_cj of the operating cost
+def LogicCut(logic,y):
+    dual = logic.d_var  # dual variables
+    flag = logic.d_flg  # status flag
+    beta = logic.d_fit  # objective at leaf node
+    j0   = logic.d_j0   # set of all j where branching has set xj to 0
+    j1   = logic.d_j1   # set of all j where branching has set xj to 1
+    # Inequality initialization
+    n_logic = np.size(flag,0)  # number of new-added logic variables
+    # Formulate Inequality
+    Inequality = []
+    tol = []
+    for t in range(n_logic):
+        if flag[t] == 1: # optimality inequality
+            expr = OptimalityInequality(c,e,A,B,a,dual[t],beta[t],j0[t][0],j1[t][0],y)
+            Inequality.append(expr)
+            tol.append(0.001)
+        else: # feasibility inequality
+            expr = FeasibilityInequality(c,e,A,B,a,dual[t],beta[t],j0[t][0],j1[t][0],y)
+            Inequality.append(expr)
+            tol.append(-0.001)
+    sum_cj = 0 # sum of cj
+    for t in range(len(c)):
+        if c[t] > 0:
+            sum_cj = sum_cj + 0
+        else:
+            sum_cj = sum_cj + c[t]
+    return [Inequality,tol,sum_cj]
+
+
+# Master problem. Cuts which have been inactive for n_keep iterations are moved
+# to a pool (n_keep = 0 keeps all cuts). They are still valid, so cuts of the
+# pool are checked against each master solution, and the violated ones are
+# added back and the master problem is solved again. Otherwise the loop may
+# revisit old plans and cycle
+def MasterProblem(d,logic,n_iter,encode = 'bigm',n_keep = 0):
+    active = [i for i in range(n_iter) if n_keep == 0 or logic[i].idle < n_keep]
+    while True:
+        # Create a gurobi model
+        model = Model()
+        y = model.addVars(len(d), vtype = GRB.BINARY)  # Create variables
+        obj_opr = model.addVar()  # Create variables
+        obj_con = quicksum(d[i] * y[i] for i in range(len(d))) # objective of construction
+
+        # Add constraints
+        cut = []  # index and right-hand side of cuts
+        if n_iter == 0:
+            model.addConstr(obj_opr == 0)
+        else:
+            for i in active:
+                [Inequality,tol,sum_cj] = LogicCut(logic[i],y)
+                # Add Benders cut
+                logic_and = LogicAnd(model,Inequality,tol,encode)
+                expr = sum_cj + (logic[i].obj-sum_cj) * logic_and
+                model.addConstr(obj_opr >= expr)
+                cut.append([i,expr])
+        # Set objective
+        obj = obj_con + obj_opr
+        model.setObjective(obj,GRB.MINIMIZE)
+        # Solve
+        model.optimize()
+        if model.status != GRB.Status.OPTIMAL:
+            os.system("pause")
+            break
         result = ResultMaster(model,y,obj_con,obj_opr)
-    else:
-        os.system("pause")
+        # Cuts in the pool violated by the master solution, where the logic AND
+        # is 1 only if every inequality holds
+        violate = []
+        for i in range(n_iter):
+            if i in active:
+                continue
+            [Inequality,tol,sum_cj] = LogicCut(logic[i],y)
+            hold = [expr is not None and expr.getValue() < tol[t] for [t,expr] in enumerate(Inequality)]
+            if obj_opr.x < sum_cj + (logic[i].obj-sum_cj) * all(hold) - 1e-6:
+                violate.append(i)
+        if violate == []:
+            break
+        for i in violate:
+            logic[i].idle = 0
+        active = sorted(active + violate)
+    # Update inactive counter of each cut
+    for [i,expr] in cut:
+        if obj_opr.x - expr.getValue() <= 1e-6:
+            logic[i].idle = 0
+        else:
+            logic[i].idle = logic[i].idle + 1
     return result
 
 
@@ -296,16 +459,20 @@ lb = np.array([0,0,0,0])
 ub = np.array([1,1,1,1])
 
 # Benders decomposition
+encode = 'bigm' # encoding of logic Benders cut, 'bigm' or 'indicator'
+n_keep = 0 # number of inactive iterations before a cut is pruned
 logic = []
 lower_bound = []
 upper_bound = []
+master_time = []
 n_iter = 0 # index of iteration
 while True:
-    Master = MasterProblem(d,logic,n_iter)
+    Master = MasterProblem(d,logic,n_iter,encode,n_keep)
     Worker = WorkerProblem(c,e,A,B,a,lb,ub,Master)
     # logic benders
     logic.append(Worker)
     lower_bound.append(Master.obj)
+    master_time.append(Master.time)
     upper_bound.append(Master.obj_con + Worker.obj)
     # Append each variable for Benders decomposition information set
     gap = (upper_bound[n_iter]-lower_bound[n_iter])/upper_bound[n_iter]
@@ -319,6 +486,7 @@ print('')
 print('Result:')
 print('Var: %s' % str(np.r_[Worker.var,Master.y]))
 print('Obj: %s' % str(upper_bound[-1]))
+print('Master time (%s): %s' % (encode, str(np.round(master_time,4))))
 print('')
 
 # Plot
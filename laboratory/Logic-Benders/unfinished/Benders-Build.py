@@ -17,7 +17,11 @@ import time
 import numpy as np
 import matplotlib.pyplot as plt
 
+from matplotlib.figure import Figure
+from matplotlib.collections import LineCollection
+
 from gurobipy import *
+from ScenarioPool import ScenarioPool
 
 
 # This class builds the system parameter, including data of system, bus, line,
@@ -158,6 +162,7 @@ class ResultReconfig(object):
         self.N_con = N_con
         self.obj   = (model.getObjective()).getValue()
         self.rhs   = np.array([constr[n].rhs for n in range(N_con[-1])])
+        self.model = model  # solved model, released by ReconfigDual
 
 
 # This class restores the results of reconfiguration sub-problem
@@ -214,10 +219,10 @@ def Depreciation(Life,Rate):
     return Rate*((1+Rate)**Life)/((1+Rate)**Life-1)
 
 
-# This function creates the upper-level planning problem (MILP), The Logic-based
-# Benders cut is added iteratively
+# This function creates the upper-level planning problem (MILP). The model is kept
+# and the Logic-based Benders cut is added iteratively by function Planning
 #
-def Planning(Para,Info,Logic,n_iter):
+def createPlanning(Para,Info):
     #
     # minimize
     #       Investment costs of line, substation, wind farm and PV station
@@ -294,27 +299,54 @@ def Planning(Para,Info,Logic,n_iter):
         expr = expr + quicksum(x_solar[n] * tp_solar[n] for n in range(Para.N_solar))
         model.addConstr(expr >= sum(tp_load))
 
-    # Logic-based Benders cut
-    if n_iter == 0:
-        model.addConstr(obj_opr == 0)
-    else:
-        for i in range(n_iter):
-            dual_x = np.zeros(53)
-            dual_f = 0
-            for s in range(2*i, 2*i + Para.N_scenario):
-                # Dual information
-                dual   = Logic[s].y_dual  # dual variables
-                beta   = Logic[s].obj     # objective
-                x_star = Logic[s].x_star  # planning solution
-                # 
-                dual_x = dual_x + dual[0:53]
-                dual_f = dual_f + beta
-            model.addConstr(obj_opr >= dual_f + quicksum(dual_x[n] * (x_var[n] - x_star[n]) for n in range(53)))
-    # Optimize    
+    # Set objective
     model.setObjective(obj_con + obj_opr, GRB.MINIMIZE)
+    # Initial operation cost, removed once the first cut is added
+    model._init = [model.addConstr(obj_opr == 0)]
+    # Restore variables
+    model._x_line  = x_line
+    model._x_sub   = x_sub
+    model._x_wind  = x_wind
+    model._x_solar = x_solar
+    model._x_var   = x_var
+    model._obj_con = obj_con
+    model._obj_opr = obj_opr
+    model._n_iter  = 0   # number of iterations whose cuts have been added
+    model._start   = []  # incumbent of the last solution
+    return model
+
+
+# This function adds the Benders cuts of new iterations to the planning problem and
+# re-solves it with the last incumbent as MIP start
+#
+def Planning(model,Para,Logic,n_iter):
+    x_var   = model._x_var
+    obj_opr = model._obj_opr
+    # Logic-based Benders cut
+    if n_iter > 0 and model._init != []:
+        model.remove(model._init)
+        model._init = []
+    for i in range(model._n_iter, n_iter):
+        dual_x = np.zeros(53)
+        dual_f = 0
+        for s in range(2*i, 2*i + Para.N_scenario):
+            # Dual information
+            dual   = Logic[s].y_dual  # dual variables
+            beta   = Logic[s].obj     # objective
+            x_star = Logic[s].x_star  # planning solution
+            # 
+            dual_x = dual_x + dual[0:53]
+            dual_f = dual_f + beta
+        model.addConstr(obj_opr >= dual_f + quicksum(dual_x[n] * (x_var[n] - x_star[n]) for n in range(53)))
+    model._n_iter = n_iter
+    # MIP start
+    if model._start != []:
+        model.setAttr('Start', x_var, model._start)
+    # Optimize
     model.optimize()
     if model.status == GRB.Status.OPTIMAL:
-        result = ResultPlanning(model,Para,x_line,x_sub,x_wind,x_solar,obj_con,obj_opr)
+        model._start = model.getAttr('X', x_var)
+        result = ResultPlanning(model,Para,model._x_line,model._x_sub,model._x_wind,model._x_solar,model._obj_con,obj_opr)
     return result
 
 
@@ -340,9 +372,6 @@ def Reconfig(Para,Info,Result_Planning,s):
     tp_load  = Para.Load * Para.Typical_load[s]  # load
     tp_wind  = Para.Wind [:,2] * Para.Typical_wind [s]  # wind
     tp_solar = Para.Solar[:,2] * Para.Typical_solar[s]  # solar
-    # Capacity data
-    Cap_line = [Result_Planning.x_line[n] * Para.Line_S[n] for n in range(Para.N_line)]
-    Cap_sub  = [Result_Planning.x_sub [n] * Para.Sub_S [n] for n in range(Para.N_sub )]
 
     # Create reconfiguration variables
     y_line  = model.addVars(Para.N_line, vtype = GRB.BINARY)  # line
@@ -469,11 +498,11 @@ def Reconfig(Para,Info,Result_Planning,s):
     # 7.Linearization of quadratic terms
     for n in range(Para.N_line):
         expr = Var[N_P_line + n] + Var[N_Q_line + n]
-        model.addConstr(expr >= -math.sqrt(2) * y_line[n] * Cap_line[n])
-        model.addConstr(expr <=  math.sqrt(2) * y_line[n] * Cap_line[n])
+        model.addConstr(expr >= -math.sqrt(2) * y_line[n] * Para.Line_S[n])
+        model.addConstr(expr <=  math.sqrt(2) * y_line[n] * Para.Line_S[n])
         expr = Var[N_P_line + n] - Var[N_Q_line + n]
-        model.addConstr(expr >= -math.sqrt(2) * y_line[n] * Cap_line[n])
-        model.addConstr(expr <=  math.sqrt(2) * y_line[n] * Cap_line[n])
+        model.addConstr(expr >= -math.sqrt(2) * y_line[n] * Para.Line_S[n])
+        model.addConstr(expr <=  math.sqrt(2) * y_line[n] * Para.Line_S[n])
     model.update()
     N_con.append(model.getAttr(GRB.Attr.NumConstrs))  # 7
 
@@ -481,10 +510,10 @@ def Reconfig(Para,Info,Result_Planning,s):
     for n in range(Para.N_sub):
         expr = Var[N_P_sub + n] + Var[N_Q_sub + n]
         model.addConstr(expr >= 0)
-        model.addConstr(expr <= math.sqrt(2) * y_sub[n] * Cap_sub[n])
+        model.addConstr(expr <= math.sqrt(2) * y_sub[n] * Para.Sub_S[n])
         expr = Var[N_P_sub + n] - Var[N_Q_sub + n]
         model.addConstr(expr >= 0)
-        model.addConstr(expr <= math.sqrt(2) * y_sub[n] * Cap_sub[n])
+        model.addConstr(expr <= math.sqrt(2) * y_sub[n] * Para.Sub_S[n])
     model.update()
     N_con.append(model.getAttr(GRB.Attr.NumConstrs))  # 8
 
@@ -495,18 +524,18 @@ def Reconfig(Para,Info,Result_Planning,s):
         model.addConstr(Var[N_V_bus + n] <= Para.Voltage_upp ** 2)
     # 2) Power flow
     for n in range(Para.N_line):
-        model.addConstr(Var[N_P_line + n] >= -y_line[n] * Cap_line[n])
-        model.addConstr(Var[N_P_line + n] <=  y_line[n] * Cap_line[n])
+        model.addConstr(Var[N_P_line + n] >= -y_line[n] * Para.Line_S[n])
+        model.addConstr(Var[N_P_line + n] <=  y_line[n] * Para.Line_S[n])
     for n in range(Para.N_line):
-        model.addConstr(Var[N_Q_line + n] >= -y_line[n] * Cap_line[n])
-        model.addConstr(Var[N_Q_line + n] <=  y_line[n] * Cap_line[n])
+        model.addConstr(Var[N_Q_line + n] >= -y_line[n] * Para.Line_S[n])
+        model.addConstr(Var[N_Q_line + n] <=  y_line[n] * Para.Line_S[n])
     # 3) Substation
     for n in range(Para.N_sub):
         model.addConstr(Var[N_P_sub + n] >= 0)
-        model.addConstr(Var[N_P_sub + n] <= y_sub[n] * Cap_sub[n])
+        model.addConstr(Var[N_P_sub + n] <= y_sub[n] * Para.Sub_S[n])
     for n in range(Para.N_sub):
         model.addConstr(Var[N_Q_sub + n] >= 0)
-        model.addConstr(Var[N_Q_sub + n] <= y_sub[n] * Cap_sub[n])
+        model.addConstr(Var[N_Q_sub + n] <= y_sub[n] * Para.Sub_S[n])
     # 4) Load shedding
     for n in range(Para.N_bus):
         model.addConstr(Var[N_C_load + n] >= 0)
@@ -532,8 +561,10 @@ def Reconfig(Para,Info,Result_Planning,s):
     return result
 
 
-# This function creates the reconfiguration sub-problem where the binary reconfiguration 
-# variables are fixed and dual variables are returned for further analysis and operation. 
+# This function fixes the binary reconfiguration variables of the solved reconfiguration
+# sub-problem in place and returns dual variables for further analysis and operation.
+# The rows of reconfiguration and radial topology are removed, so the remaining linear
+# programming is the same as the one with reconfiguration variables fixed by constraints
 #
 def ReconfigDual(Para,Info,Result_Planning,Result_Reconfig,s):
     #
@@ -544,190 +575,28 @@ def ReconfigDual(Para,Info,Result_Planning,Result_Reconfig,s):
     #       2) Upper and lower bound
     #       3) fixed value
     #
-    model = Model()
-    global N_V_bus,  N_P_line, N_Q_line, N_P_sub, N_Q_sub
-    global N_C_load, N_S_wind, N_C_wind, N_S_solar, N_C_solar
-    # Typical data
-    tp_load  = Para.Load * Para.Typical_load[s]  # load
-    tp_wind  = Para.Wind [:,2] * Para.Typical_wind [s]  # wind
-    tp_solar = Para.Solar[:,2] * Para.Typical_solar[s]  # solar
-
-    # Create reconfiguration variables
-    y_line  = model.addVars(Para.N_line )  # line
-    y_sub   = model.addVars(Para.N_sub  )  # Substation
-    y_wind  = model.addVars(Para.N_wind )  # Wind farm
-    y_solar = model.addVars(Para.N_solar)  # PV station
+    model = Result_Reconfig.model.fixed()
+    N_con = Result_Reconfig.N_con
+    # Remove reconfiguration and radial topology
+    model.remove(model.getConstrs()[0:N_con[1]])
+    # Reconfiguration variables are ordered as line, substation, wind farm, PV station
+    N_y   = Para.N_line + Para.N_sub + Para.N_wind + Para.N_solar
+    y_var = model.getVars()[0:N_y]
+    y_fix = Result_Reconfig.y_line + Result_Reconfig.y_sub + Result_Reconfig.y_wind + Result_Reconfig.y_solar
+    model.setAttr('LB', y_var, [0] * N_y)
+    model.setAttr('UB', y_var, [GRB.INFINITY] * N_y)
+    # Fixed reconfiguration variables
+    model.addConstrs(y_var[n] == y_fix[n] for n in range(N_y))
+    model.update()
+    N_con = [N_con[n] - N_con[1] for n in range(2,len(N_con))]
+    N_con.append(model.getAttr(GRB.Attr.NumConstrs))
 
-    # Create power flow variables
-    N_V_bus   = 0  # Square of bus voltage
-    N_P_line  = N_V_bus   + Para.N_bus    # Active power flow of line
-    N_Q_line  = N_P_line  + Para.N_line   # Reactive power flow of line
-    N_P_sub   = N_Q_line  + Para.N_line   # Active power injection at substation
-    N_Q_sub   = N_P_sub   + Para.N_sub    # Reactive power injection at substation
-    N_C_load  = N_Q_sub   + Para.N_sub    # Load shedding
-    N_S_wind  = N_C_load  + Para.N_bus    # Wind output
-    N_C_wind  = N_S_wind  + Para.N_wind   # Wind curtailment
-    N_S_solar = N_C_wind  + Para.N_wind   # Solar output
-    N_C_solar = N_S_solar + Para.N_solar  # Solar curtailment
-    N_Var     = N_C_solar + Para.N_solar  # Number of all variables
-    Var = model.addVars(N_Var,lb = -GRB.INFINITY)
-    
-    # Set objective
-    obj = LinExpr()
-    obj = obj + quicksum(Var[N_P_sub   + n] * Para.Cost_power    for n in range(Para.N_sub  ))
-    obj = obj + quicksum(Var[N_C_load  + n] * Para.Cost_cutload  for n in range(Para.N_bus  ))
-    obj = obj + quicksum(Var[N_S_wind  + n] * Para.Cost_wind     for n in range(Para.N_wind ))
-    obj = obj + quicksum(Var[N_C_wind  + n] * Para.Cost_cutwind  for n in range(Para.N_wind ))
-    obj = obj + quicksum(Var[N_S_solar + n] * Para.Cost_solar    for n in range(Para.N_solar))
-    obj = obj + quicksum(Var[N_C_solar + n] * Para.Cost_cutsolar for n in range(Para.N_solar))
-    obj = obj * Para.N_day_year * Para.N_hour * 5
-    
     Rec_rate = 0  # Reconvery rate in 5 years
     for y in range(Para.N_year_of_stage):
         Rec_rate = Rec_rate + (1 + Para.Int_rate) ** (-(y + 1))
-    '''
-    obj = obj + quicksum(Rec_rate * y_line [n] * Para.Line [n,7] * Para.Dep_line  for n in range(Para.N_line ))
-    obj = obj + quicksum(Rec_rate * y_sub  [n] * Para.Sub  [n,3] * Para.Dep_sub   for n in range(Para.N_sub  ))
-    obj = obj + quicksum(Rec_rate * y_wind [n] * Para.Wind [n,3] * Para.Dep_wind  for n in range(Para.N_wind ))
-    obj = obj + quicksum(Rec_rate * y_solar[n] * Para.Solar[n,3] * Para.Dep_solar for n in range(Para.N_solar))
-    '''
     cost_line = np.zeros(Para.N_line)
     for n in range(Para.N_line):
         cost_line[n] = Para.Line [n,7] * Para.Dep_line * Rec_rate
-    
-    model.setObjective(obj, GRB.MINIMIZE)
-
-    N_con = []  # indexing constraints
-
-    # 0.Active power balance equation
-    for n in range(Para.N_bus):
-        line_head = Info.Line_head[n]
-        line_tail = Info.Line_tail[n]
-        expr = LinExpr()
-        expr = expr - quicksum(Var[N_P_line + i] for i in line_head)  # power out
-        expr = expr + quicksum(Var[N_P_line + i] for i in line_tail)  # power in
-        expr = expr + Var[N_C_load + n] * Para.Load_angle  # load shedding
-        if  Info.Sub[n]   != []:
-            expr = expr + Var[N_P_sub + Info.Sub[n][0]]
-        if  Info.Wind[n]  != []:
-            expr = expr + Var[N_S_wind + Info.Wind[n][0]] * Para.Wind_angle
-        if  Info.Solar[n] != []:
-            expr = expr + Var[N_S_solar + Info.Solar[n][0]] * Para.Solar_angle
-        model.addConstr(expr == tp_load[n] * Para.Load_angle)
-    model.update()
-    N_con.append(model.getAttr(GRB.Attr.NumConstrs))  # 0
-
-    # 1.Reactive power balance equation
-    for n in range(Para.N_bus):
-        line_head = Info.Line_head[n]
-        line_tail = Info.Line_tail[n]
-        expr = LinExpr()
-        expr = expr - quicksum(Var[N_Q_line + i] for i in line_head)  # power out
-        expr = expr + quicksum(Var[N_Q_line + i] for i in line_tail)  # power in
-        expr = expr + Var[N_C_load + n] * math.sqrt(1-Para.Load_angle**2)  # load shedding
-        if  Info.Sub[n]   != []:
-            expr = expr + Var[N_Q_sub + Info.Sub[n][0]]
-        if  Info.Wind[n]  != []:
-            expr = expr + Var[N_S_wind + Info.Wind[n][0]] * math.sqrt(1 - Para.Wind_angle ** 2)
-        if  Info.Solar[n] != []:
-            expr = expr + Var[N_S_solar + Info.Solar[n][0]] * math.sqrt(1 - Para.Solar_angle ** 2)
-        model.addConstr(expr == tp_load[n] * math.sqrt(1 - Para.Load_angle ** 2))
-    model.update()
-    N_con.append(model.getAttr(GRB.Attr.NumConstrs))  # 1
-
-    # 2.Voltage balance on line
-    for n in range(Para.N_line):
-        bus_head = Para.Line[n,1]
-        bus_tail = Para.Line[n,2]
-        expr = LinExpr()
-        expr = expr + Var[N_V_bus + bus_head] - Var[N_V_bus + bus_tail]  # voltage difference
-        expr = expr - Var[N_P_line + n] * 2 * Para.Line_R[n]
-        expr = expr - Var[N_Q_line + n] * 2 * Para.Line_X[n]
-        model.addConstr(expr >= -Para.Big_M * (1 - y_line[n]))
-        model.addConstr(expr <=  Para.Big_M * (1 - y_line[n]))
-    model.update()
-    N_con.append(model.getAttr(GRB.Attr.NumConstrs))  # 2
-
-    # 3.Renewables(wind farm)
-    for n in range(Para.N_wind):
-        expr = Var[N_S_wind  + n] + Var[N_C_wind  + n]
-        model.addConstr(expr == y_wind[n] * tp_wind [n])
-    model.update()
-    N_con.append(model.getAttr(GRB.Attr.NumConstrs))  # 3
-
-    # 4.Renewables(solar station)
-    for n in range(Para.N_solar):
-        expr = Var[N_S_solar + n] + Var[N_C_solar + n]
-        model.addConstr(expr == y_solar[n] * tp_solar[n])
-    model.update()
-    N_con.append(model.getAttr(GRB.Attr.NumConstrs))  # 4
-
-    # 5.Linearization of quadratic terms
-    for n in range(Para.N_line):
-        expr = Var[N_P_line + n] + Var[N_Q_line + n]
-        model.addConstr(expr >= -math.sqrt(2) * y_line[n] * Para.Line_S[n])
-        model.addConstr(expr <=  math.sqrt(2) * y_line[n] * Para.Line_S[n])
-        expr = Var[N_P_line + n] - Var[N_Q_line + n]
-        model.addConstr(expr >= -math.sqrt(2) * y_line[n] * Para.Line_S[n])
-        model.addConstr(expr <=  math.sqrt(2) * y_line[n] * Para.Line_S[n])
-    model.update()
-    N_con.append(model.getAttr(GRB.Attr.NumConstrs))  # 5
-
-    # 6.Linearization of quadratic terms
-    for n in range(Para.N_sub):
-        expr = Var[N_P_sub + n] + Var[N_Q_sub + n]
-        model.addConstr(expr >= 0)
-        model.addConstr(expr <= math.sqrt(2) * y_sub[n] * Para.Sub_S[n])
-        expr = Var[N_P_sub + n] - Var[N_Q_sub + n]
-        model.addConstr(expr >= 0)
-        model.addConstr(expr <= math.sqrt(2) * y_sub[n] * Para.Sub_S[n])
-    model.update()
-    N_con.append(model.getAttr(GRB.Attr.NumConstrs))  # 6
-
-    # 7.bounds of variables
-    # 1) Voltage
-    for n in range(Para.N_bus):
-        model.addConstr(Var[N_V_bus + n] >= Para.Voltage_low ** 2)
-        model.addConstr(Var[N_V_bus + n] <= Para.Voltage_upp ** 2)
-    # 2) Power flow
-    for n in range(Para.N_line):
-        model.addConstr(Var[N_P_line + n] >= -y_line[n] * Para.Line_S[n])
-        model.addConstr(Var[N_P_line + n] <=  y_line[n] * Para.Line_S[n])
-    for n in range(Para.N_line):
-        model.addConstr(Var[N_Q_line + n] >= -y_line[n] * Para.Line_S[n])
-        model.addConstr(Var[N_Q_line + n] <=  y_line[n] * Para.Line_S[n])
-    # 3) Substation
-    for n in range(Para.N_sub):
-        model.addConstr(Var[N_P_sub + n] >= 0)
-        model.addConstr(Var[N_P_sub + n] <= y_sub[n] * Para.Sub_S[n])
-    for n in range(Para.N_sub):
-        model.addConstr(Var[N_Q_sub + n] >= 0)
-        model.addConstr(Var[N_Q_sub + n] <= y_sub[n] * Para.Sub_S[n])
-    # 4) Load shedding
-    for n in range(Para.N_bus):
-        model.addConstr(Var[N_C_load + n] >= 0)
-        model.addConstr(Var[N_C_load + n] <= tp_load[n])
-    # 5) Renewables
-    for n in range(Para.N_wind):
-        model.addConstr(Var[N_S_wind + n] >= 0)
-        model.addConstr(Var[N_S_wind + n] <= y_wind[n] * tp_wind[n])
-        model.addConstr(Var[N_C_wind + n] >= 0)
-        model.addConstr(Var[N_C_wind + n] <= y_wind[n] * tp_wind[n])
-    for n in range(Para.N_solar):
-        model.addConstr(Var[N_S_solar + n] >= 0)
-        model.addConstr(Var[N_S_solar + n] <= y_solar[n] * tp_solar[n])
-        model.addConstr(Var[N_C_solar + n] >= 0)
-        model.addConstr(Var[N_C_solar + n] <= y_solar[n] * tp_solar[n])
-    model.update()
-    N_con.append(model.getAttr(GRB.Attr.NumConstrs))  # 7
-
-    # 8.Fixed reconfiguration variables
-    model.addConstrs(y_line [n] == Result_Reconfig.y_line [n] for n in range(Para.N_line ))
-    model.addConstrs(y_sub  [n] == Result_Reconfig.y_sub  [n] for n in range(Para.N_sub  ))
-    model.addConstrs(y_wind [n] == Result_Reconfig.y_wind [n] for n in range(Para.N_wind ))
-    model.addConstrs(y_solar[n] == Result_Reconfig.y_solar[n] for n in range(Para.N_solar))
-    model.update()
-    N_con.append(model.getAttr(GRB.Attr.NumConstrs))  # 8
 
     # Optimize
     model.optimize()
@@ -739,58 +608,79 @@ def ReconfigDual(Para,Info,Result_Planning,Result_Reconfig,s):
             if Result_Planning.x_line[n] == 1 and Result_Reconfig.y_line[n] == 0:
                 result.y_dual[n] = cost_line[n]
         
+    Result_Reconfig.model = 0  # release the model
     return result
 
 
 # This function plots the planning solution in all stages
 # The solution is given in three separated sub-plots
 #
-def PlotPlanning(Para,x_line):
-    x = Para.Bus[:,2]
-    y = Para.Bus[:,3]
-    
-    for n in range(Para.N_bus):  # Bus
-        plt.text(x[n] + 3, y[n] + 3, '%s'%n)
-        if n < Para.Sub[0,1]:
-            plt.plot(x[n],y[n],'b.')
-        else:
-            plt.plot(x[n],y[n],'rs')
-    for n in range(Para.N_line):  # Lines
-        x1 = x[int(round(Para.Line[n,1]))]
-        y1 = y[int(round(Para.Line[n,1]))]
-        x2 = x[int(round(Para.Line[n,2]))]
-        y2 = y[int(round(Para.Line[n,2]))]
-        if x_line[n] == 1:
-            plt.plot([x1,x2],[y1,y2],'r-')
-        else:
-            plt.plot([x1,x2],[y1,y2],'b--')
-        plt.axis('equal')
-    plt.show()
+def PlotPlanning(Para,x_line,filename = ''):
+    fig = PlotCreate(filename)
+    state = np.array(x_line) == 1
+    PlotTopology(fig.add_subplot(111),Para,state)
+    PlotShow(fig,filename)
 
 
 # This function plots the reconfiguration solution under a given scenario
 # 
 #
-def PlotReconfiguration(Para,y_line):
+def PlotReconfiguration(Para,y_line,filename = ''):
+    fig = PlotCreate(filename)
+    state = np.array(y_line) == 1
+    PlotTopology(fig.add_subplot(111),Para,state)
+    PlotShow(fig,filename)
+
+
+# This function draws the topology on the axes. Buses are drawn by scatter and
+# lines by one LineCollection. Lines in service are solid in red, and others are
+# dashed in blue
+#
+def PlotTopology(ax,Para,state):
     x = Para.Bus[:,2]
     y = Para.Bus[:,3]
+    sub = np.arange(Para.N_bus) >= Para.Sub[0,1]
     for n in range(Para.N_bus):  # Bus
-        plt.text(x[n] + 3, y[n] + 3, '%s'%n)
-        if n < Para.Sub[0,1]:
-            plt.plot(x[n],y[n],'b.')
-        else:
-            plt.plot(x[n],y[n],'rs')
-    for n in range(Para.N_line):  # Lines
-        x1 = x[int(round(Para.Line[n,1]))]
-        y1 = y[int(round(Para.Line[n,1]))]
-        x2 = x[int(round(Para.Line[n,2]))]
-        y2 = y[int(round(Para.Line[n,2]))]
-        if y_line[n] == 1:
-            plt.plot([x1,x2],[y1,y2],'r-')
-        else:
-            plt.plot([x1,x2],[y1,y2],'b--')
-    plt.axis('equal')
-    plt.show()
+        ax.text(x[n] + 3, y[n] + 3, '%s'%n)
+    ax.scatter(x[~sub],y[~sub],s = 10,c = 'b',marker = '.')
+    ax.scatter(x[ sub],y[ sub],s = 30,c = 'r',marker = 's')
+    head = np.round(Para.Line[:,1]).astype(int)
+    tail = np.round(Para.Line[:,2]).astype(int)
+    segment = np.stack([np.c_[x[head],y[head]],np.c_[x[tail],y[tail]]],axis = 1)
+    color = np.where(state,'r','b')
+    style = np.where(state,'solid','dashed')
+    ax.add_collection(LineCollection(segment,colors = color.tolist(),
+                                     linestyles = style.tolist()))
+    ax.autoscale_view()
+    ax.axis('equal')
+
+
+# This function creates a figure. If the filename is given, the figure is not
+# managed by pyplot, so it can be saved without a display
+#
+def PlotCreate(filename):
+    if filename == '':
+        return plt.figure()
+    else:
+        return Figure()
+
+
+# This function shows the figure on the screen, or saves it to the file
+#
+def PlotShow(fig,filename):
+    if filename == '':
+        plt.show()
+    else:
+        fig.savefig(filename)
+
+
+# This function solves the operation sub-problems of scenario 's' under the given
+# planning solution. It runs in the scenario pool
+#
+def ScenarioReconfig(Para,Info,Result_Planning,s):
+    Result_Reconfig = Reconfig(Para,Info,Result_Planning,s)
+    Result_Dual = ReconfigDual(Para,Info,Result_Planning,Result_Reconfig,s)
+    return [Result_Reconfig,Result_Dual]
 
 
 if __name__ == "__main__":
@@ -805,12 +695,15 @@ if __name__ == "__main__":
     Logic = []  # Set of dual information
     lower_bound = []  # 
     upper_bound = []  #
+    n_process = Para.N_scenario  # number of processes, 1 for serial sweep
+    Pool = ScenarioPool(n_process)
+    Model_Planning = createPlanning(Para,Info)
     while True:
-        Result_Planning = Planning(Para,Info,Logic,n_iter)
+        Result_Planning = Planning(Model_Planning,Para,Logic,n_iter)
         obj_opr = 0
+        Result = Pool.Sweep(ScenarioReconfig,(Para,Info,Result_Planning),Para.N_scenario)
         for s in range(Para.N_scenario):
-            Result_Reconfig = Reconfig(Para,Info,Result_Planning,s)
-            Result_Dual = ReconfigDual(Para,Info,Result_Planning,Result_Reconfig,s)
+            [Result_Reconfig,Result_Dual] = Result[s]
             Logic.append(Result_Dual)
             obj_opr = obj_opr + Result_Reconfig.obj
         lower_bound.append(Result_Planning.obj)
@@ -820,6 +713,7 @@ if __name__ == "__main__":
             break
         else:
             n_iter = n_iter + 1
+    Pool.Close()
     
     PlotPlanning(Para,Result_Planning.x_line)
     plt.plot(lower_bound)
@@ -17,6 +17,9 @@ import time
 import numpy as np
 import matplotlib.pyplot as plt
 
+from matplotlib.figure import Figure
+from matplotlib.collections import LineCollection
+
 from gurobipy import *
 
 
@@ -451,52 +454,63 @@ def Planning(Para,Info):
 # This function plots the planning solution in all stages
 # The solution is given in three separated sub-plots
 #
-def PlotPlanning(Para,x_line):
-    x = Para.Bus[:,2]
-    y = Para.Bus[:,3]
-    
-    for n in range(Para.N_bus):  # Bus
-        plt.text(x[n] + 3, y[n] + 3, '%s'%n)
-        if n < Para.Sub[0,1]:
-            plt.plot(x[n],y[n],'b.')
-        else:
-            plt.plot(x[n],y[n],'rs')
-    for n in range(Para.N_line):  # Lines
-        x1 = x[int(round(Para.Line[n,1]))]
-        y1 = y[int(round(Para.Line[n,1]))]
-        x2 = x[int(round(Para.Line[n,2]))]
-        y2 = y[int(round(Para.Line[n,2]))]
-        if x_line[n] == 1:
-            plt.plot([x1,x2],[y1,y2],'r-')
-        else:
-            plt.plot([x1,x2],[y1,y2],'b--')
-        plt.axis('equal')
-    plt.show()
+def PlotPlanning(Para,x_line,filename = ''):
+    fig = PlotCreate(filename)
+    state = np.array(x_line) == 1
+    PlotTopology(fig.add_subplot(111),Para,state)
+    PlotShow(fig,filename)
 
 
 # This function plots the reconfiguration solution under a given scenario
 # 
 #
-def PlotReconfiguration(Para,y_line,s):
+def PlotReconfiguration(Para,y_line,s,filename = ''):
+    fig = PlotCreate(filename)
+    state = np.array(y_line)[:,s] == 1
+    PlotTopology(fig.add_subplot(111),Para,state)
+    PlotShow(fig,filename)
+
+
+# This function draws the topology on the axes. Buses are drawn by scatter and
+# lines by one LineCollection. Lines in service are solid in red, and others are
+# dashed in blue
+#
+def PlotTopology(ax,Para,state):
     x = Para.Bus[:,2]
     y = Para.Bus[:,3]
+    sub = np.arange(Para.N_bus) >= Para.Sub[0,1]
     for n in range(Para.N_bus):  # Bus
-        plt.text(x[n] + 3, y[n] + 3, '%s'%n)
-        if n < Para.Sub[0,1]:
-            plt.plot(x[n],y[n],'b.')
-        else:
-            plt.plot(x[n],y[n],'rs')
-    for n in range(Para.N_line):  # Lines
-        x1 = x[int(round(Para.Line[n,1]))]
-        y1 = y[int(round(Para.Line[n,1]))]
-        x2 = x[int(round(Para.Line[n,2]))]
-        y2 = y[int(round(Para.Line[n,2]))]
-        if y_line[n,s] == 1:
-            plt.plot([x1,x2],[y1,y2],'r-')
-        else:
-            plt.plot([x1,x2],[y1,y2],'b--')
-    plt.axis('equal')
-    plt.show()
+        ax.text(x[n] + 3, y[n] + 3, '%s'%n)
+    ax.scatter(x[~sub],y[~sub],s = 10,c = 'b',marker = '.')
+    ax.scatter(x[ sub],y[ sub],s = 30,c = 'r',marker = 's')
+    head = np.round(Para.Line[:,1]).astype(int)
+    tail = np.round(Para.Line[:,2]).astype(int)
+    segment = np.stack([np.c_[x[head],y[head]],np.c_[x[tail],y[tail]]],axis = 1)
+    color = np.where(state,'r','b')
+    style = np.where(state,'solid','dashed')
+    ax.add_collection(LineCollection(segment,colors = color.tolist(),
+                                     linestyles = style.tolist()))
+    ax.autoscale_view()
+    ax.axis('equal')
+
+
+# This function creates a figure. If the filename is given, the figure is not
+# managed by pyplot, so it can be saved without a display
+#
+def PlotCreate(filename):
+    if filename == '':
+        return plt.figure()
+    else:
+        return Figure()
+
+
+# This function shows the figure on the screen, or saves it to the file
+#
+def PlotShow(fig,filename):
+    if filename == '':
+        plt.show()
+    else:
+        fig.savefig(filename)
 
 
 if __name__ == "__main__":
@@ -14,11 +14,15 @@
 
 import sys
 import math
+import heapq
 import xlrd
 import time
 import numpy as np
 import matplotlib.pyplot as plt
 
+from matplotlib.figure import Figure
+from matplotlib.collections import LineCollection
+
 from gurobipy import *
 
 
@@ -613,77 +617,147 @@ def ReconfigRelax(Para,Info,Result_Planning,Result_Reconfig,t,d,s):
     return d
 
 
-# This program solves 0-1 programming based on a classical Branch-and-Bound algorithm
-# Dual information from the relaxed linear programming at each leaf node is returned
-# 
-def BranchBound(c,d,A,B,lb,ub,br = 0):
-    # 
-    # The model has the following format:
-    # 
-    # minimize
-    #       c * x + d
-    # subject to 
-    #       A * x >= B     (u)
-    #       lb <= x <= ub  (v)
-    # where x is binary varibale, u and v are dual variables
-    #
-    # Global variables
-    global var, obj  # optimization
-    global dual, flag, j0, j1, fit  # node of search tree
-    if br == 0:  # initialization
-        var  = np.zeros(len(c))  # all zero
+# This class solves 0-1 programming based on a classical Branch-and-Bound algorithm.
+# The search tree is kept in an explicit node queue (depth-first or best-first) and 
+# every node owns a copy of its bounds, so the search neither recurses nor shares
+# any global state. Dual information from the relaxed linear programming at each 
+# node is returned
+#
+class BranchBoundTree(object):
+    def __init__(self,c,d,A,B,rule = 'depth',max_node = 100000):
+        # 
+        # The model has the following format:
+        # 
+        # minimize
+        #       c * x + d
+        # subject to 
+        #       A * x >= B     (u)
+        #           x >= lb    (v)
+        #           x <= ub    (v)
+        # where x is binary varibale, u and v are dual variables
+        #
+        self.c = c
+        self.d = d
+        self.A = A
+        self.B = B
+        self.rule = rule  # 'depth' or 'best'
+        self.max_node = max_node  # node limit
+        self.n_node = 0  # number of solved nodes
+        self.model = 0  # persistent linear programming
+    def Build(self):
+        # The relaxed linear programming is built only once, nodes differ only in
+        # bounds of variables and are re-optimized by dual simplex
+        model = Model()
+        n_var = np.size(self.A,1) # number of x
+        x = model.addVars(n_var)
+        obj = quicksum(self.c[i] * x[i] for i in range(n_var)) + self.d
+        model.setObjective(obj, GRB.MINIMIZE)
+        for i in range(np.size(self.A,0)):
+            nz = np.nonzero(self.A[i])[0]  # non-zero coefficients
+            model.addConstr(quicksum(self.A[i,j] * x[j] for j in nz) >= self.B[i])
+        model.Params.OutputFlag = 0  # turn off the display
+        model.Params.Method = 1  # dual simplex
+        model.update()
+        self.model  = model
+        self.x      = [x[i] for i in range(n_var)]
+        self.constr = model.getConstrs()
+        self.obj    = obj
+    def Linprog(self,lb,ub,basis):
+        if self.model == 0:
+            self.Build()
+        model = self.model
+        model.setAttr('LB', self.x, lb)
+        model.setAttr('UB', self.x, ub)
+        if basis != []:  # warm start from the basis of parent node
+            model.setAttr('VBasis', self.x, basis[0])
+            model.setAttr('CBasis', self.constr, basis[1])
+        model.optimize()
+        if model.status == GRB.Status.OPTIMAL:
+            lp_var = np.array(model.getAttr('X', self.x))
+            lp_obj = np.array(self.obj.getValue())
+            lp_flg = np.array(1)
+            lp_dul = np.array(model.getAttr('Pi', self.constr))
+            basis  = [model.getAttr('VBasis', self.x), model.getAttr('CBasis', self.constr)]
+            return [lp_var,lp_obj,lp_flg,lp_dul,basis]
+        else:  # feasibility solution
+            [lp_var,lp_obj,lp_flg,lp_dul] = Linprog(self.c,self.d,self.A,self.B,lb,ub)
+            return [lp_var,lp_obj,lp_flg,lp_dul,[]]
+    def Solve(self,lb,ub):
+        # Incumbent solution
+        var  = np.zeros(len(self.c))  # all zero
         obj  = float("inf")  # python infinity
+        # Node of search tree
         dual = []  # dual variables 
         flag = []  # optimality flag
         fit  = []  # fitness
         j0   = []  # index of x where branching has set xj to 0
         j1   = []  # index of x where branching has set xj to 1
-    # Solve the relaxed linear programming
-    [lp_var,lp_obj,lp_flg,lp_dul] = Linprog(c,d,A,B,lb,ub)
-    # Update global variabes for the current node in the search tree
-    dual.append(lp_dul)
-    flag.append(lp_flg)
-    fit. append(lp_obj)
-    j0.  append(np.where(lb + ub == 0))  # lb == 0 and ub == 0
-    j1.  append(np.where(lb + ub == 2))  # lb == 1 and ub == 1
-    # Branching
-    if lp_flg != 1:  # if problem is infeasible
-        var_out = lp_var
-        obj_out = lp_obj
-        flg_out = -1
-    else:  # if problem is feasible
-        if lp_obj > obj:  # can't find any solution better than the current one
-            var_out = lp_var
-            obj_out = lp_obj
-            flg_out = -2
-        else:  # find a solution better than the current one
+        # Node queue, each node is [bound,order,lb,ub,basis]
+        queue = [[-float("inf"), 0, np.copy(lb), np.copy(ub), []]]
+        n_push = 1
+        self.n_node = 0
+        var_out = var
+        obj_out = obj
+        flg_out = 1
+        while queue != [] and self.n_node < self.max_node:
+            if self.rule == 'best':
+                [_,_,lb,ub,basis] = heapq.heappop(queue)
+            else:
+                [_,_,lb,ub,basis] = queue.pop()
+            self.n_node = self.n_node + 1
+            # Solve the relaxed linear programming
+            [lp_var,lp_obj,lp_flg,lp_dul,basis] = self.Linprog(lb,ub,basis)
+            dual.append(lp_dul)
+            flag.append(lp_flg)
+            fit. append(lp_obj)
+            j0.  append(np.where(lb + ub == 0))  # lb == 0 and ub == 0
+            j1.  append(np.where(lb + ub == 2))  # lb == 1 and ub == 1
+            if lp_flg != 1:  # if problem is infeasible
+                if self.n_node == 1:
+                    var_out = lp_var
+                    obj_out = lp_obj
+                    flg_out = -1
+                continue
+            if lp_obj > obj:  # can't find any solution better than the current one
+                continue
             lp_var = np.array(lp_var)  # list to array
             lp_gap = np.abs(lp_var - np.rint(lp_var))  # gap
             if max(lp_gap) == 0:  # integer solution
-                var = lp_var  # update global variable
+                var = lp_var
                 obj = lp_obj
-                var_out = var  # update output
-                obj_out = obj
-                flg_out = 1
-            else:  # real solution
-                leaf = np.where(lp_gap > 0)  # index of leaf node for branching
-                pick = int(leaf[0][0])  # pick up the first index
-                lb_temp = lb  # temporary lower bound
-                ub_temp = ub  # temporary upper bound
-                # The upper branch calculation
-                if ub[pick] >= np.floor(lp_var[pick]) + 1:
-                    lb_temp[pick] = np.floor(lp_var[pick]) + 1  # branching
-                    BranchBound(c,d,A,B,lb_temp,ub,1)
-                # The lower branch calculation
-                if lb[pick] <= np.floor(lp_var[pick]):
-                    ub_temp[pick] = np.floor(lp_var[pick])  # branching
-                    BranchBound(c,d,A,B,lb,ub_temp,1)
-                # update output
                 var_out = var
                 obj_out = obj
-                flg_out = 1
-    # Return results
-    return [var_out,obj_out,flg_out,dual,flag,j0,j1,fit]
+                continue
+            # Branching on the first fractional variable
+            leaf = np.where(lp_gap > 0)  # index of leaf node for branching
+            pick = int(round(leaf[0][0]))  # pick up the first index
+            # The lower branch
+            if lb[pick] <= np.floor(lp_var[pick]):
+                ub_temp = np.copy(ub)
+                ub_temp[pick] = np.floor(lp_var[pick])
+                self.Push(queue, [lp_obj, n_push, np.copy(lb), ub_temp, basis])
+                n_push = n_push + 1
+            # The upper branch (explored first in depth-first search)
+            if ub[pick] >= np.floor(lp_var[pick]) + 1:
+                lb_temp = np.copy(lb)
+                lb_temp[pick] = np.floor(lp_var[pick]) + 1
+                self.Push(queue, [lp_obj, n_push, lb_temp, np.copy(ub), basis])
+                n_push = n_push + 1
+        if queue != [] and flg_out == 1:  # node limit is reached
+            flg_out = 0
+        return [var_out,obj_out,flg_out,dual,flag,j0,j1,fit]
+    def Push(self,queue,node):
+        if self.rule == 'best':
+            heapq.heappush(queue, node)
+        else:
+            queue.append(node)
+
+
+# This function solves 0-1 programming by the Branch-and-Bound tree
+# 
+def BranchBound(c,d,A,B,lb,ub):
+    Tree = BranchBoundTree(c,d,A,B)
+    return Tree.Solve(lb,ub)
 
 
 # This program solves a simple linear programming by Gurobi 8.1.0
@@ -737,53 +811,64 @@ def Linprog(c,d,A,B,lb,ub):
 # This function plots the planning solution in all stages
 # The solution is given in three separated sub-plots
 #
-def PlotPlanning(Para,x_line):
-    x = Para.Bus[:,2]
-    y = Para.Bus[:,3]
+def PlotPlanning(Para,x_line,filename = ''):
+    fig = PlotCreate(filename)
     for t in range(Para.N_stage):
-        plt.subplot(1, Para.N_stage, t + 1)
-        for n in range(Para.N_bus):  # Bus
-            plt.text(x[n] + 3, y[n] + 3, '%s'%n)
-            if n < Para.Sub[0,1]:
-                plt.plot(x[n],y[n],'b.')
-            else:
-                plt.plot(x[n],y[n],'rs')
-        for n in range(Para.N_line):  # Lines
-            x1 = x[int(Para.Line[n,1])]
-            y1 = y[int(Para.Line[n,1])]
-            x2 = x[int(Para.Line[n,2])]
-            y2 = y[int(Para.Line[n,2])]
-            if x_line[n][t] == 1 or n < Para.N_line_ext:
-                plt.plot([x1,x2],[y1,y2],'r-')
-            else:
-                plt.plot([x1,x2],[y1,y2],'b--')
-        plt.axis('equal')
-    plt.show()
+        state = (np.array(x_line)[:,t] == 1) | (np.arange(Para.N_line) < Para.N_line_ext)
+        PlotTopology(fig.add_subplot(1, Para.N_stage, t + 1),Para,state)
+    PlotShow(fig,filename)
 
 
 # This function plots the reconfiguration solution under a given scenario
 # 
 #
-def PlotReconfiguration(Para,y_line):
+def PlotReconfiguration(Para,y_line,filename = ''):
+    fig = PlotCreate(filename)
+    state = np.array(y_line) == 1
+    PlotTopology(fig.add_subplot(111),Para,state)
+    PlotShow(fig,filename)
+
+
+# This function draws the topology on the axes. Buses are drawn by scatter and
+# lines by one LineCollection. Lines in service are solid in red, and others are
+# dashed in blue
+#
+def PlotTopology(ax,Para,state):
     x = Para.Bus[:,2]
     y = Para.Bus[:,3]
+    sub = np.arange(Para.N_bus) >= Para.Sub[0,1]
     for n in range(Para.N_bus):  # Bus
-        plt.text(x[n] + 3, y[n] + 3, '%s'%n)
-        if n < Para.Sub[0,1]:
-            plt.plot(x[n],y[n],'b.')
-        else:
-            plt.plot(x[n],y[n],'rs')
-    for n in range(Para.N_line):  # Lines
-        x1 = x[int(Para.Line[n,1])]
-        y1 = y[int(Para.Line[n,1])]
-        x2 = x[int(Para.Line[n,2])]
-        y2 = y[int(Para.Line[n,2])]
-        if y_line[n] == 1:
-            plt.plot([x1,x2],[y1,y2],'r-')
-        else:
-            plt.plot([x1,x2],[y1,y2],'b--')
-    plt.axis('equal')
-    plt.show()
+        ax.text(x[n] + 3, y[n] + 3, '%s'%n)
+    ax.scatter(x[~sub],y[~sub],s = 10,c = 'b',marker = '.')
+    ax.scatter(x[ sub],y[ sub],s = 30,c = 'r',marker = 's')
+    head = np.round(Para.Line[:,1]).astype(int)
+    tail = np.round(Para.Line[:,2]).astype(int)
+    segment = np.stack([np.c_[x[head],y[head]],np.c_[x[tail],y[tail]]],axis = 1)
+    color = np.where(state,'r','b')
+    style = np.where(state,'solid','dashed')
+    ax.add_collection(LineCollection(segment,colors = color.tolist(),
+                                     linestyles = style.tolist()))
+    ax.autoscale_view()
+    ax.axis('equal')
+
+
+# This function creates a figure. If the filename is given, the figure is not
+# managed by pyplot, so it can be saved without a display
+#
+def PlotCreate(filename):
+    if filename == '':
+        return plt.figure()
+    else:
+        return Figure()
+
+
+# This function shows the figure on the screen, or saves it to the file
+#
+def PlotShow(fig,filename):
+    if filename == '':
+        plt.show()
+    else:
+        fig.savefig(filename)
 
 
 if __name__ == "__main__":
@@ -15,12 +15,19 @@
 
 import sys
 import math
+import heapq
 import xlrd
 import time
 import numpy as np
 import matplotlib.pyplot as plt
 
+from scipy import sparse
+
+from matplotlib.figure import Figure
+from matplotlib.collections import LineCollection
+
 from gurobipy import *
+from ScenarioPool import ScenarioPool
 
 
 # This class builds the system parameter, including data of system, bus, line,
@@ -133,6 +140,7 @@ class ResultPlanning(object):
         self.obj_con = obj_con.getValue()
         self.obj_opr = obj_opr.x
         self.obj = (model.getObjective()).getValue()  # objective
+        self.time = model.Runtime  # solution time
 
 
 # This class restores the results of reconfiguration sub-problem
@@ -275,32 +283,90 @@ def Depreciation(Life,Rate):
 #
 def OptimalityInequality(c,d,A,B,a,dual,beta,j0,j1,var):
     # The following formulation is based on expression (35) in the paper
-    temp_uB = dual.dot(B) # u*B
+    n_col   = len(var) # number of columns
+    temp_uB = B.T.dot(dual) # u*B
     temp_ua = dual.dot(a) # u*a
     temp_bt = beta # beta
-    temp_sum_0 = 0 # initialize the first sum term
-    temp_sum_1 = 0 # initialize the second sum term
-    for i in range(len(var)):
-        if i in j1: # if i belongs to J1
-            temp_sum_0 = temp_sum_0 + dual.dot(A[:,i]) - c[i]
-        if (i not in j0) and (i not in j1): # if i doesn't belong to J0 and J1
-            if dual.dot(A[:,i]) - c[i] >= 0:
-                temp_sum_1 = temp_sum_1 + dual.dot(A[:,i]) - c[i]
-            else:
-                temp_sum_1 = temp_sum_1 + 0
+    temp_rc = A[:,0:n_col].T.dot(dual) - c[0:n_col] # reduced cost of each column
+    # Masks of J0, J1 and free columns
+    idx_0  = np.asarray(j0, dtype = int).ravel()
+    mask_0 = np.zeros(n_col, dtype = bool)
+    mask_0[idx_0[idx_0 < n_col]] = True
+    idx_1  = np.asarray(j1, dtype = int).ravel()
+    mask_1 = np.zeros(n_col, dtype = bool)
+    mask_1[idx_1[idx_1 < n_col]] = True
+    free   = ~(mask_0 | mask_1)
+    temp_sum_0 = temp_rc[mask_1].sum() # the first sum term
+    temp_sum_1 = np.maximum(temp_rc[free], 0).sum() # the second sum term
     # Formulate expression
-    expr = LinExpr()
-    for i in range(len(var)):
-        expr = expr + temp_uB[i] * var[i]
+    expr = LinExpr(temp_uB[0:len(var)].tolist(), [var[i] for i in range(len(var))])
     expr = expr - temp_ua + temp_bt + temp_sum_0 + temp_sum_1 - d
     # Return
     return expr
 
 
-# This function creates the upper-level planning problem (MILP), The Logic-based
-# Benders cut is added iteratively
+# This function computes the lower and upper bound of a linear expression from the
+# bounds of its variables
 #
-def Planning(Para,Info,Relax,Logic,n_iter):
+def ExprBound(expr):
+    n_term = expr.size()  # number of terms
+    coef = np.array([expr.getCoeff(i)  for i in range(n_term)])
+    lb   = np.array([expr.getVar(i).LB for i in range(n_term)])
+    ub   = np.array([expr.getVar(i).UB for i in range(n_term)])
+    expr_min = expr.getConstant() + np.sum(np.where(coef > 0, coef * lb, coef * ub))
+    expr_max = expr.getConstant() + np.sum(np.where(coef > 0, coef * ub, coef * lb))
+    return [expr_min,expr_max]
+
+
+# This function links the leaf inequalities of a B&B tree to a logic AND variable
+# which can be 1 only if every inequality holds, i.e. expr <= tol. Two encodings:
+# 1) 'indicator': one binary, two indicator constraints per leaf and an and_
+# 2) 'bigm': one binary per leaf which is 1 only if the leaf is violated, with a
+#    tight Big-M from the bounds of variables. The AND is aggregated into a single
+#    inequality, and leaves which can never be violated are pruned
+# A leaf with None inequality is unconstrained and skipped by both encodings
+#
+def LogicAnd(model,Inequality,tol,encode = 'bigm'):
+    logic_and = model.addVar(vtype = GRB.BINARY) # logic AND variable
+    n_logic = len(Inequality)  # number of leaves
+    if encode == 'indicator':
+        logic_var = []
+        for k in range(n_logic):
+            if Inequality[k] is None:  # unconstrained leaf
+                continue
+            var = model.addVar(vtype = GRB.BINARY) # logic variable
+            model.addConstr((var == 1) >> (Inequality[k] <= tol[k]))
+            model.addConstr((var == 0) >> (Inequality[k] >= tol[k]))
+            logic_var.append(var)
+        if logic_var == []:
+            logic_and.LB = 1
+        else:
+            model.addConstr(logic_and == and_(logic_var)) # logic and
+        return logic_and
+    model.update()
+    logic_var = []
+    for k in range(n_logic):
+        expr = Inequality[k]
+        if expr is None:  # unconstrained leaf
+            continue
+        [expr_min,expr_max] = ExprBound(expr)
+        if expr_max < tol[k]:  # never violated
+            continue
+        if expr_min >= tol[k]:  # always violated
+            logic_and.UB = 0
+            return logic_and
+        violate = model.addVar(vtype = GRB.BINARY) # 1 if the leaf is violated
+        model.addConstr(expr >= tol[k] - (tol[k] - expr_min) * (1 - violate))
+        model.addConstr(logic_and <= 1 - violate)
+        logic_var.append(violate)
+    model.addConstr(logic_and >= 1 - quicksum(logic_var)) # logic and
+    return logic_and
+
+
+# This function creates the upper-level planning problem (MILP). The model is kept
+# and the Logic-based Benders cut is added iteratively by function Planning
+#
+def createPlanning(Para,Info):
     #
     # minimize
     #       Investment costs of line, substation, wind farm and PV station
@@ -377,66 +443,95 @@ def Planning(Para,Info,Relax,Logic,n_iter):
         expr = expr + quicksum(x_solar[n] * tp_solar[n] for n in range(Para.N_solar))
         model.addConstr(expr >= sum(tp_load))
 
+    # Set objective
+    model.setObjective(obj_con + obj_opr, GRB.MINIMIZE)
+    # Initial operation cost, removed once the first cut is added
+    model._init = [model.addConstr(obj_opr == 0)]
+    # Restore variables
+    model._x_line  = x_line
+    model._x_sub   = x_sub
+    model._x_wind  = x_wind
+    model._x_solar = x_solar
+    model._x_var   = x_var
+    model._obj_con = obj_con
+    model._obj_opr = obj_opr
+    model._n_iter  = 0   # number of iterations whose cuts have been added
+    model._start   = []  # incumbent of the last solution
+    return model
+
+
+# This function adds the Benders cuts of new iterations to the planning problem and
+# re-solves it with the last incumbent as MIP start
+#
+def Planning(model,Para,Relax,Logic,n_iter,encode = 'bigm'):
+    x_var = model._x_var
+    obj_opr = model._obj_opr
     # Logic-based Benders cut
-    if n_iter == 0:
-        model.addConstr(obj_opr == 0)
-    else:
-        for i in range(n_iter):
+    if n_iter > 0 and model._init != []:
+        model.remove(model._init)
+        model._init = []
+    for i in range(model._n_iter, n_iter):
+        
+        # Basic Benders cut
+        dual_x = np.zeros(53)
+        dual_f = 0
+        for s in range(2*i, 2*i + Para.N_scenario):
+            # Dual information
+            dual   = Relax[s].x_dual  # dual variables
+            beta   = Relax[s].obj     # objective
+            x_star = Relax[s].x_star  # planning solution
+            # 
+            dual_x = dual_x + dual[0:53]
+            dual_f = dual_f + beta
+        model.addConstr(obj_opr >= dual_f + quicksum(dual_x[n] * (x_var[n] - x_star[n]) for n in range(53)))
+        '''
+        # Logic Benders cut
+        logic_expr = LinExpr()
+        for s in range(2*i, 2*i + Para.N_scenario):
+            c    = Logic[s].c
+            d    = Logic[s].d
+            A    = Logic[s].A
+            B    = Logic[s].B
+            a    = Logic[s].a
+            dual = Logic[s].d_var  # dual variables
+            flag = Logic[s].d_flg  # status flag
+            beta = Logic[s].d_fit  # objective at leaf node
+            j0   = Logic[s].d_j0   # set of all j where branching has set xj to 0
+            j1   = Logic[s].d_j1   # set of all j where branching has set xj to 1
+            # Inequality initialization
+            n_logic = np.size(flag,0)  # number of new-added logic variables
+            # Formulate Inequality
+            Inequality = []
+            tol = []
+            for k in range(n_logic):
+                if flag[k] == 1: # optimality inequality
+                    expr = OptimalityInequality(c,d,A,B,a,dual[k],beta[k],j0[k],j1[k],x_var)
+                else:
+                    expr = None
+                Inequality.append(expr)
+                tol.append(0.001)
+            # Add Benders cut
+            logic_and = LogicAnd(model,Inequality,tol,encode)
             
-            # Basic Benders cut
-            dual_x = np.zeros(53)
-            dual_f = 0
-            for s in range(2*i, 2*i + Para.N_scenario):
-                # Dual information
-                dual   = Relax[s].x_dual  # dual variables
-                beta   = Relax[s].obj     # objective
-                x_star = Relax[s].x_star  # planning solution
-                # 
-                dual_x = dual_x + dual[0:53]
-                dual_f = dual_f + beta
-            model.addConstr(obj_opr >= dual_f + quicksum(dual_x[n] * (x_var[n] - x_star[n]) for n in range(53)))
-            '''
-            # Logic Benders cut
-            logic_expr = LinExpr()
-            for s in range(2*i, 2*i + Para.N_scenario):
-                c    = Logic[s].c
-                d    = Logic[s].d
-                A    = Logic[s].A
-                B    = Logic[s].B
-                a    = Logic[s].a
-                dual = Logic[s].d_var  # dual variables
-                flag = Logic[s].d_flg  # status flag
-                beta = Logic[s].d_fit  # objective at leaf node
-                j0   = Logic[s].d_j0   # set of all j where branching has set xj to 0
-                j1   = Logic[s].d_j1   # set of all j where branching has set xj to 1
-                # Inequality initialization
-                n_logic = np.size(flag,0)  # number of new-added logic variables
-                logic_var = model.addVars(n_logic, vtype = GRB.BINARY)  # logic variable
-                logic_and = model.addVar(vtype = GRB.BINARY) # logic AND variable
-                # Formulate Inequality
-                for k in range(n_logic):
-                    if flag[k] == 1: # optimality inequality
-                        expr = OptimalityInequality(c,d,A,B,a,dual[k],beta[k],j0[k],j1[k],x_var)
-                        model.addConstr((logic_var[k] == 1) >> (expr <= 0.001))
-                        model.addConstr((logic_var[k] == 0) >> (expr >= 0.001))
-                # Add Benders cut
-                model.addConstr(logic_and == and_(logic_var)) # logic and
-                
-                sum_cj = d # sum of cj
-                for k in range(len(c)):
-                    if c[k] > 0:
-                        sum_cj = sum_cj + 0
-                    else:
-                        sum_cj = sum_cj + c[k]
-                
-                logic_expr = logic_expr + (Logic[s].obj - sum_cj) * logic_and
-            model.addConstr(obj_opr >= sum_cj + logic_expr)
-            '''
-    # Optimize    
-    model.setObjective(obj_con + obj_opr, GRB.MINIMIZE)
+            sum_cj = d # sum of cj
+            for k in range(len(c)):
+                if c[k] > 0:
+                    sum_cj = sum_cj + 0
+                else:
+                    sum_cj = sum_cj + c[k]
+            
+            logic_expr = logic_expr + (Logic[s].obj - sum_cj) * logic_and
+        model.addConstr(obj_opr >= sum_cj + logic_expr)
+        '''
+    model._n_iter = n_iter
+    # MIP start
+    if model._start != []:
+        model.setAttr('Start', x_var, model._start)
+    # Optimize
     model.optimize()
     if model.status == GRB.Status.OPTIMAL:
-        result = ResultPlanning(model,Para,x_line,x_sub,x_wind,x_solar,obj_con,obj_opr)
+        model._start = model.getAttr('X', x_var)
+        result = ResultPlanning(model,Para,model._x_line,model._x_sub,model._x_wind,model._x_solar,model._obj_con,obj_opr)
     return result
 
 
@@ -993,46 +1088,26 @@ def ReconfigRelax(Para,Info,Result_Planning,Result_Reconfig,Result_Dual,s):
     # Formulate objective matrics
     c = np.array(Result_Dual.y_dual)
     d = Result_Dual.obj - np.inner(c,np.array(Result_Dual.y_star))
-    # Formulate constraint matrics
-    A = np.eye(N_y_var)  # reconfiguration
-    A = -A[0:N_con[0],:]  # transform a <= b to -a >= -b
+    # Formulate constraint matrics (sparse)
+    A_0 = -sparse.eye(N_con[0],N_y_var)  # reconfiguration, -y >= -x
+    row,col = [],[]
     for n in range(Para.N_bus):  # radial topology
-        A_temp = np.zeros(N_y_var)
-        line_head = Info.Line_head[n]
-        line_tail = Info.Line_tail[n]
-        for i in line_tail:
-            A_temp[N_y_pos + i] = 1
-        for i in line_head:
-            A_temp[N_y_neg + i] = 1
-        A = np.append(A, [ A_temp], axis = 0)  #  expr >=  1
-        A = np.append(A, [-A_temp], axis = 0)  # -expr >= -1
-    '''
-    for n in range(Para.N_line):  # y_pos & y_neg
-        A_temp = np.zeros(N_y_var)
-        A_temp[N_y_pos  + n] =  1
-        A_temp[N_y_neg  + n] =  1
-        A_temp[N_y_line + n] = -1
-        A = np.append(A, [ A_temp], axis = 0)  #  expr >=  0
-        A = np.append(A, [-A_temp], axis = 0)  # -expr >= -0
-    '''
+        for i in Info.Line_tail[n]:
+            row.append(n)
+            col.append(N_y_pos + i)
+        for i in Info.Line_head[n]:
+            row.append(n)
+            col.append(N_y_neg + i)
+    A_1 = sparse.csr_matrix((np.ones(len(row)),(row,col)),shape = (Para.N_bus,N_y_var))
+    pair = np.array([[1],[-1]])  # expr >= rhs and -expr >= -rhs
+    A = sparse.vstack([A_0, sparse.kron(A_1,pair)]).tocsr()
     # Right-hand side value
-    rhs = np.array(Result_Planning.x_star) 
-    rhs = (-1) * rhs  # negate
-    
-    for n in range(N_con[0],N_con[0]+Para.N_bus):
-        rhs = np.append(rhs,  int(round(Result_Reconfig.rhs[n])))
-        rhs = np.append(rhs, -int(round(Result_Reconfig.rhs[n])))
-
+    rhs_1 = Result_Reconfig.rhs[N_con[0] : N_con[0] + Para.N_bus]
+    rhs = np.r_[-np.array(Result_Planning.x_star), np.kron(np.round(rhs_1),[1,-1])]
     # Right-hand side constant a
-    a = np.zeros(N_con[0])  # constant
-    for n in range(N_con[0],N_con[1]):
-        a = np.append(a,  Result_Reconfig.rhs[n])
-        a = np.append(a, -Result_Reconfig.rhs[n])
+    a = np.r_[np.zeros(N_con[0]), np.kron(rhs_1,[1,-1])]
     # Right-hand side coeficient matrix B
-    B = np.eye(N_x_var)
-    for n in range(N_con[0],N_con[1]):
-        B = np.append(B, [np.zeros(N_x_var)], axis = 0)
-        B = np.append(B, [np.zeros(N_x_var)], axis = 0)
+    B = sparse.vstack([sparse.eye(N_x_var), sparse.csr_matrix((2 * Para.N_bus,N_x_var))]).tocsr()
     # Bounds
     lb  = np.zeros(N_y_var)
     ub  = np.ones (N_y_var)
@@ -1043,79 +1118,147 @@ def ReconfigRelax(Para,Info,Result_Planning,Result_Reconfig,Result_Dual,s):
     return result
 
 
-# This program solves 0-1 programming based on a classical Branch-and-Bound algorithm
-# Dual information from the relaxed linear programming at each leaf node is returned
-# 
-def BranchBound(c,d,A,rhs,lb,ub,br = 0):
-    # 
-    # The model has the following format:
-    # 
-    # minimize
-    #       c * x + d
-    # subject to 
-    #       A * x >= rhs   (u)
-    #           x >= lb    (v)
-    #           x <= ub    (v)
-    # where x is binary varibale, u and v are dual variables
-    #
-    # Global variables
-    global var, obj  # optimization
-    global dual, flag, j0, j1, fit  # node of search tree
-    if br == 0:  # initialization
-        var  = np.zeros(len(c))  # all zero
+# This class solves 0-1 programming based on a classical Branch-and-Bound algorithm.
+# The search tree is kept in an explicit node queue (depth-first or best-first) and 
+# every node owns a copy of its bounds, so the search neither recurses nor shares
+# any global state. Dual information from the relaxed linear programming at each 
+# node is returned
+#
+class BranchBoundTree(object):
+    def __init__(self,c,d,A,rhs,rule = 'depth',max_node = 100000):
+        # 
+        # The model has the following format:
+        # 
+        # minimize
+        #       c * x + d
+        # subject to 
+        #       A * x >= rhs   (u)
+        #           x >= lb    (v)
+        #           x <= ub    (v)
+        # where x is binary varibale, u and v are dual variables
+        #
+        self.c = c
+        self.d = d
+        self.A = A
+        self.rhs = rhs
+        self.rule = rule  # 'depth' or 'best'
+        self.max_node = max_node  # node limit
+        self.n_node = 0  # number of solved nodes
+        self.model = 0  # persistent linear programming
+    def Build(self):
+        # The relaxed linear programming is built only once, nodes differ only in
+        # bounds of variables and are re-optimized by dual simplex
+        model = Model()
+        n_var = np.shape(self.A)[1] # number of x
+        x = model.addVars(n_var)
+        obj = quicksum(self.c[i] * x[i] for i in range(n_var)) + self.d
+        model.setObjective(obj, GRB.MINIMIZE)
+        # A can be a dense or a scipy.sparse matrix
+        model.addMConstr(self.A, [x[i] for i in range(n_var)], '>', self.rhs)
+        model.Params.OutputFlag = 0  # turn off the display
+        model.Params.Method = 1  # dual simplex
+        model.update()
+        self.model  = model
+        self.x      = [x[i] for i in range(n_var)]
+        self.constr = model.getConstrs()
+        self.obj    = obj
+    def Linprog(self,lb,ub,basis):
+        if self.model == 0:
+            self.Build()
+        model = self.model
+        model.setAttr('LB', self.x, lb)
+        model.setAttr('UB', self.x, ub)
+        if basis != []:  # warm start from the basis of parent node
+            model.setAttr('VBasis', self.x, basis[0])
+            model.setAttr('CBasis', self.constr, basis[1])
+        model.optimize()
+        if model.status == GRB.Status.OPTIMAL:
+            lp_var = np.array(model.getAttr('X', self.x))
+            lp_obj = np.array(self.obj.getValue())
+            lp_flg = np.array(1)
+            lp_dul = np.array(model.getAttr('Pi', self.constr))
+            basis  = [model.getAttr('VBasis', self.x), model.getAttr('CBasis', self.constr)]
+            return [lp_var,lp_obj,lp_flg,lp_dul,basis]
+        else:  # feasibility solution
+            [lp_var,lp_obj,lp_flg,lp_dul] = Linprog(self.c,self.d,self.A,self.rhs,lb,ub)
+            return [lp_var,lp_obj,lp_flg,lp_dul,[]]
+    def Solve(self,lb,ub):
+        # Incumbent solution
+        var  = np.zeros(len(self.c))  # all zero
         obj  = float("inf")  # python infinity
+        # Node of search tree
         dual = []  # dual variables 
         flag = []  # optimality flag
         fit  = []  # fitness
         j0   = []  # index of x where branching has set xj to 0
         j1   = []  # index of x where branching has set xj to 1
-    # Solve the relaxed linear programming
-    [lp_var,lp_obj,lp_flg,lp_dul] = Linprog(c,d,A,rhs,lb,ub)
-    # Update global variabes for the current node in the search tree
-    dual.append(lp_dul)
-    flag.append(lp_flg)
-    fit. append(lp_obj)
-    j0.  append(np.where(lb + ub == 0))  # lb == 0 and ub == 0
-    j1.  append(np.where(lb + ub == 2))  # lb == 1 and ub == 1
-    # Branching
-    if lp_flg != 1:  # if problem is infeasible
-        var_out = lp_var
-        obj_out = lp_obj
-        flg_out = -1
-    else:  # if problem is feasible
-        if lp_obj > obj:  # can't find any solution better than the current one
-            var_out = lp_var
-            obj_out = lp_obj
-            flg_out = -2
-        else:  # find a solution better than the current one
+        # Node queue, each node is [bound,order,lb,ub,basis]
+        queue = [[-float("inf"), 0, np.copy(lb), np.copy(ub), []]]
+        n_push = 1
+        self.n_node = 0
+        var_out = var
+        obj_out = obj
+        flg_out = 1
+        while queue != [] and self.n_node < self.max_node:
+            if self.rule == 'best':
+                [_,_,lb,ub,basis] = heapq.heappop(queue)
+            else:
+                [_,_,lb,ub,basis] = queue.pop()
+            self.n_node = self.n_node + 1
+            # Solve the relaxed linear programming
+            [lp_var,lp_obj,lp_flg,lp_dul,basis] = self.Linprog(lb,ub,basis)
+            dual.append(lp_dul)
+            flag.append(lp_flg)
+            fit. append(lp_obj)
+            j0.  append(np.where(lb + ub == 0))  # lb == 0 and ub == 0
+            j1.  append(np.where(lb + ub == 2))  # lb == 1 and ub == 1
+            if lp_flg != 1:  # if problem is infeasible
+                if self.n_node == 1:
+                    var_out = lp_var
+                    obj_out = lp_obj
+                    flg_out = -1
+                continue
+            if lp_obj > obj:  # can't find any solution better than the current one
+                continue
             lp_var = np.array(lp_var)  # list to array
             lp_gap = np.abs(lp_var - np.rint(lp_var))  # gap
             if max(lp_gap) == 0:  # integer solution
-                var = lp_var  # update global variable
+                var = lp_var
                 obj = lp_obj
-                var_out = var  # update output
-                obj_out = obj
-                flg_out = 1
-            else:  # real solution
-                leaf = np.where(lp_gap > 0)  # index of leaf node for branching
-                pick = int(round(leaf[0][0]))  # pick up the first index
-                lb_temp = lb  # temporary lower bound
-                ub_temp = ub  # temporary upper bound
-                # The upper branch calculation
-                if ub[pick] >= np.floor(lp_var[pick]) + 1:
-                    lb_temp[pick] = np.floor(lp_var[pick]) + 1  # branching
-                    BranchBound(c,d,A,rhs,lb_temp,ub,1)
-                # The lower branch calculation
-                if lb[pick] <= np.floor(lp_var[pick]):
-                    ub_temp[pick] = np.floor(lp_var[pick])  # branching
-                    BranchBound(c,d,A,rhs,lb,ub_temp,1)
-                # update output
                 var_out = var
                 obj_out = obj
-                flg_out = 1
-    result = ResultBranchBound(var_out,obj_out,flg_out,dual,flag,j0,j1,fit)
-    # Return results
-    return result
+                continue
+            # Branching on the first fractional variable
+            leaf = np.where(lp_gap > 0)  # index of leaf node for branching
+            pick = int(round(leaf[0][0]))  # pick up the first index
+            # The lower branch
+            if lb[pick] <= np.floor(lp_var[pick]):
+                ub_temp = np.copy(ub)
+                ub_temp[pick] = np.floor(lp_var[pick])
+                self.Push(queue, [lp_obj, n_push, np.copy(lb), ub_temp, basis])
+                n_push = n_push + 1
+            # The upper branch (explored first in depth-first search)
+            if ub[pick] >= np.floor(lp_var[pick]) + 1:
+                lb_temp = np.copy(lb)
+                lb_temp[pick] = np.floor(lp_var[pick]) + 1
+                self.Push(queue, [lp_obj, n_push, lb_temp, np.copy(ub), basis])
+                n_push = n_push + 1
+        if queue != [] and flg_out == 1:  # node limit is reached
+            flg_out = 0
+        result = ResultBranchBound(var_out,obj_out,flg_out,dual,flag,j0,j1,fit)
+        return result
+    def Push(self,queue,node):
+        if self.rule == 'best':
+            heapq.heappush(queue, node)
+        else:
+            queue.append(node)
+
+
+# This function solves 0-1 programming by the Branch-and-Bound tree
+# 
+def BranchBound(c,d,A,rhs,lb,ub):
+    Tree = BranchBoundTree(c,d,A,rhs)
+    return Tree.Solve(lb,ub)
 
 
 # This program solves a simple linear programming by Gurobi 8.1.0
@@ -1130,16 +1273,17 @@ def Linprog(c,d,A,rhs,lb,ub):
     #           x <= ub    (v)
     # where u and v are dual variables
     #
+    # A can be a dense or a scipy.sparse matrix
+    #
     model = Model()
     # Create variables
-    n_var = np.size(A,1) # number of x
+    [n_row,n_var] = np.shape(A) # number of constraints and x
     x = model.addVars(n_var)
     # Set objective
     obj = quicksum(c[i] * x[i] for i in range(n_var)) + d
     model.setObjective(obj, GRB.MINIMIZE)
     # Add constraints
-    for i in range(np.size(A,0)):
-        model.addConstr(quicksum(A[i,j] * x[j] for j in range(n_var)) >= rhs[i])
+    model.addMConstr(A, [x[i] for i in range(n_var)], '>', rhs)
     for i in range(n_var):
         model.addConstr(x[i] >= lb[i])
         model.addConstr(x[i] <= ub[i])
@@ -1154,12 +1298,12 @@ def Linprog(c,d,A,rhs,lb,ub):
         lp_flg = 1 # feasible
         # Return dual variables
         constrs = model.getConstrs() # get constraints
-        lp_dul  = [constrs[i].pi for i in range(np.size(A,0))] # dual variable
+        lp_dul  = [constrs[i].pi for i in range(n_row)] # dual variable
     else:
         # Return feasibility solution
-        n_eye = np.size(A,0) # number of new-added variables (eye matrix)
+        n_eye = n_row # number of new-added variables (eye matrix)
         c  = np.append(np.zeros(n_var), np.ones(n_eye), axis = 0)
-        A  = np.append(A,  np.eye(n_eye), axis = 1)
+        A  = sparse.hstack([A, sparse.eye(n_eye)]).tocsr()
         lb = np.append(lb, np.zeros(n_eye))
         ub = np.append(ub, np.ones(n_eye) * float("inf"))
         [lp_var,lp_obj,_,lp_dul] = Linprog(c,d,A,rhs,lb,ub)
@@ -1175,52 +1319,73 @@ def Linprog(c,d,A,rhs,lb,ub):
 # This function plots the planning solution in all stages
 # The solution is given in three separated sub-plots
 #
-def PlotPlanning(Para,x_line):
-    x = Para.Bus[:,2]
-    y = Para.Bus[:,3]
-    
-    for n in range(Para.N_bus):  # Bus
-        plt.text(x[n] + 3, y[n] + 3, '%s'%n)
-        if n < Para.Sub[0,1]:
-            plt.plot(x[n],y[n],'b.')
-        else:
-            plt.plot(x[n],y[n],'rs')
-    for n in range(Para.N_line):  # Lines
-        x1 = x[int(round(Para.Line[n,1]))]
-        y1 = y[int(round(Para.Line[n,1]))]
-        x2 = x[int(round(Para.Line[n,2]))]
-        y2 = y[int(round(Para.Line[n,2]))]
-        if x_line[n] == 1:
-            plt.plot([x1,x2],[y1,y2],'r-')
-        else:
-            plt.plot([x1,x2],[y1,y2],'b--')
-        plt.axis('equal')
-    plt.show()
+def PlotPlanning(Para,x_line,filename = ''):
+    fig = PlotCreate(filename)
+    state = np.array(x_line) == 1
+    PlotTopology(fig.add_subplot(111),Para,state)
+    PlotShow(fig,filename)
 
 
 # This function plots the reconfiguration solution under a given scenario
 # 
 #
-def PlotReconfiguration(Para,y_line):
+def PlotReconfiguration(Para,y_line,filename = ''):
+    fig = PlotCreate(filename)
+    state = np.array(y_line) == 1
+    PlotTopology(fig.add_subplot(111),Para,state)
+    PlotShow(fig,filename)
+
+
+# This function draws the topology on the axes. Buses are drawn by scatter and
+# lines by one LineCollection. Lines in service are solid in red, and others are
+# dashed in blue
+#
+def PlotTopology(ax,Para,state):
     x = Para.Bus[:,2]
     y = Para.Bus[:,3]
+    sub = np.arange(Para.N_bus) >= Para.Sub[0,1]
     for n in range(Para.N_bus):  # Bus
-        plt.text(x[n] + 3, y[n] + 3, '%s'%n)
-        if n < Para.Sub[0,1]:
-            plt.plot(x[n],y[n],'b.')
-        else:
-            plt.plot(x[n],y[n],'rs')
-    for n in range(Para.N_line):  # Lines
-        x1 = x[int(round(Para.Line[n,1]))]
-        y1 = y[int(round(Para.Line[n,1]))]
-        x2 = x[int(round(Para.Line[n,2]))]
-        y2 = y[int(round(Para.Line[n,2]))]
-        if y_line[n] == 1:
-            plt.plot([x1,x2],[y1,y2],'r-')
-        else:
-            plt.plot([x1,x2],[y1,y2],'b--')
-    plt.axis('equal')
-    plt.show()
+        ax.text(x[n] + 3, y[n] + 3, '%s'%n)
+    ax.scatter(x[~sub],y[~sub],s = 10,c = 'b',marker = '.')
+    ax.scatter(x[ sub],y[ sub],s = 30,c = 'r',marker = 's')
+    head = np.round(Para.Line[:,1]).astype(int)
+    tail = np.round(Para.Line[:,2]).astype(int)
+    segment = np.stack([np.c_[x[head],y[head]],np.c_[x[tail],y[tail]]],axis = 1)
+    color = np.where(state,'r','b')
+    style = np.where(state,'solid','dashed')
+    ax.add_collection(LineCollection(segment,colors = color.tolist(),
+                                     linestyles = style.tolist()))
+    ax.autoscale_view()
+    ax.axis('equal')
+
+
+# This function creates a figure. If the filename is given, the figure is not
+# managed by pyplot, so it can be saved without a display
+#
+def PlotCreate(filename):
+    if filename == '':
+        return plt.figure()
+    else:
+        return Figure()
+
+
+# This function shows the figure on the screen, or saves it to the file
+#
+def PlotShow(fig,filename):
+    if filename == '':
+        plt.show()
+    else:
+        fig.savefig(filename)
+
+
+# This function solves the operation sub-problems of scenario 's' under the given
+# planning solution. It runs in the scenario pool
+#
+def ScenarioReconfig(Para,Info,Result_Planning,s):
+    Result_Reconfig = Reconfig(Para,Info,Result_Planning,s)
+    Result_Dual = ReconfigDual(Para,Info,Result_Planning,Result_Reconfig,s)
+    Result_Relax = ReconfigRelax_Origin(Para,Info,Result_Planning,Result_Reconfig,Result_Dual,s)
+    return [Result_Reconfig,Result_Dual,Result_Relax]
 
 
 if __name__ == "__main__":
@@ -1231,18 +1396,22 @@ if __name__ == "__main__":
     [Para,Info] = ReadData(filename)
     
     # Logic-based Benders decomposition
+    encode = 'bigm' # encoding of logic Benders cut, 'bigm' or 'indicator'
     n_iter = 0  # index of iteration
     Relax = []  # Set of dual information
     Logic = []  # Set of logic information
     lower_bound = []  # 
     upper_bound = []  #
+    n_process = Para.N_scenario  # number of processes, 1 for serial sweep
+    Pool = ScenarioPool(n_process)
+    Model_Planning = createPlanning(Para,Info)
     while True:
-        Result_Planning = Planning(Para,Info,Relax,Logic,n_iter)
+        Result_Planning = Planning(Model_Planning,Para,Relax,Logic,n_iter,encode)
+        print('Iteration %d, master time (%s): %.4f' % (n_iter,encode,Result_Planning.time))
         obj_opr = 0
+        Result = Pool.Sweep(ScenarioReconfig,(Para,Info,Result_Planning),Para.N_scenario)
         for s in range(Para.N_scenario):
-            Result_Reconfig = Reconfig(Para,Info,Result_Planning,s)
-            Result_Dual = ReconfigDual(Para,Info,Result_Planning,Result_Reconfig,s)
-            Result_Relax = ReconfigRelax_Origin(Para,Info,Result_Planning,Result_Reconfig,Result_Dual,s)
+            [Result_Reconfig,Result_Dual,Result_Relax] = Result[s]
             #Result_Logic = ReconfigRelax(Para,Info,Result_Planning,Result_Reconfig,Result_Dual,s)
             Relax.append(Result_Relax)
             #Logic.append(Result_Logic)
@@ -1255,6 +1424,7 @@ if __name__ == "__main__":
             break
         else:
             n_iter = n_iter + 1
+    Pool.Close()
     
     PlotPlanning(Para,Result_Planning.x_line)
     plt.plot(lower_bound)
@@ -20,7 +20,11 @@ import time
 import numpy as np
 import matplotlib.pyplot as plt
 
+from matplotlib.figure import Figure
+from matplotlib.collections import LineCollection
+
 from gurobipy import *
+from ScenarioPool import ScenarioPool
 
 
 # This class builds the system parameter, including data of system, bus, line,
@@ -133,6 +137,7 @@ class ResultPlanning(object):
         self.obj_con = obj_con.getValue()
         self.obj_opr = obj_opr.x
         self.obj = (model.getObjective()).getValue()  # objective
+        self.time = model.Runtime  # solution time
 
 
 # This class restores the results of reconfiguration sub-problem
@@ -232,6 +237,7 @@ class ResultBranchBound(object):
         self.A = []
         self.B = []
         self.a = []
+        self.cut = []  # combinatorial feasibility cut
 
 
 class ResultNetworkFlow(object):
@@ -249,6 +255,18 @@ class ResultNetworkFlow(object):
         self.lp_flg = np.array(lp_flg)
         self.lp_dul = np.array(lp_dul)
 
+
+# This class restores the results of combinatorial radiality check
+class ResultRadial(object):
+    def __init__(self,flag,y_pos,y_neg,cut):
+        self.flg = flag  # 1: feasible, -1: infeasible, 0: undecided
+        # Spanning forest
+        self.y_pos  = y_pos
+        self.y_neg  = y_neg
+        self.y_line = [y_pos[n] + y_neg[n] for n in range(len(y_pos))]
+        # Set of lines where at least one line should be built
+        self.cut = cut
+
 # This function input data from Excel files. The filtname can be changed to other
 # power system for further study
 #
@@ -294,23 +312,23 @@ def Depreciation(Life,Rate):
 #
 def OptimalityInequality(c,d,A,B,a,dual,beta,j0,j1,var):
     # The following formulation is based on expression (35) in the paper
+    n_col   = len(var) # number of columns
     temp_uB = dual.dot(B) # u*B
     temp_ua = dual.dot(a) # u*a
     temp_bt = beta # beta
-    temp_sum_0 = 0 # initialize the first sum term
-    temp_sum_1 = 0 # initialize the second sum term
-    for i in range(len(var)):
-        if i in j1: # if i belongs to J1
-            temp_sum_0 = temp_sum_0 + dual.dot(A[:,i]) - c[i]
-        if (i not in j0) and (i not in j1): # if i doesn't belong to J0 and J1
-            if dual.dot(A[:,i]) - c[i] >= 0:
-                temp_sum_1 = temp_sum_1 + dual.dot(A[:,i]) - c[i]
-            else:
-                temp_sum_1 = temp_sum_1 + 0
+    temp_rc = dual.dot(A[:,0:n_col]) - c[0:n_col] # reduced cost of each column
+    # Masks of J0, J1 and free columns
+    idx_0  = np.asarray(j0, dtype = int).ravel()
+    mask_0 = np.zeros(n_col, dtype = bool)
+    mask_0[idx_0[idx_0 < n_col]] = True
+    idx_1  = np.asarray(j1, dtype = int).ravel()
+    mask_1 = np.zeros(n_col, dtype = bool)
+    mask_1[idx_1[idx_1 < n_col]] = True
+    free   = ~(mask_0 | mask_1)
+    temp_sum_0 = temp_rc[mask_1].sum() # the first sum term
+    temp_sum_1 = np.maximum(temp_rc[free], 0).sum() # the second sum term
     # Formulate expression
-    expr = LinExpr()
-    for i in range(len(var)):
-        expr = expr + temp_uB[i] * var[i]
+    expr = LinExpr(temp_uB[0:len(var)].tolist(), [var[i] for i in range(len(var))])
     expr = expr - temp_ua + temp_bt + temp_sum_0 + temp_sum_1 - d
     # Return
     return expr
@@ -319,31 +337,89 @@ def OptimalityInequality(c,d,A,B,a,dual,beta,j0,j1,var):
 # Form feasibility cut
 def FeasibilityInequality(A,B,a,dual,beta,j0,j1,y):
     # The following formulation is based on expression (35) in the paper
+    n_col   = len(y) # number of columns
     temp_uB = dual.dot(B) # dual*B
     temp_ua = dual.dot(a) # dual*a
-    temp_sum_0 = 0 # initialize the first sum term
-    temp_sum_1 = 0 # initialize the second sum term
-    for i in range(len(y)):
-        if i in j1: # if i belongs to J1
-            temp_sum_0 = temp_sum_0 + dual.dot(A[:,i])
-        if (i not in j0) and (i not in j1): # if i doesn't belong to J0 and J1
-            if dual.dot(A[:,i]) >= 0:
-                temp_sum_1 = temp_sum_1 + dual.dot(A[:,i])
-            else:
-                temp_sum_1 = temp_sum_1 + 0
+    temp_rc = dual.dot(A[:,0:n_col]) # reduced cost of each column
+    # Masks of J0, J1 and free columns
+    idx_0  = np.asarray(j0, dtype = int).ravel()
+    mask_0 = np.zeros(n_col, dtype = bool)
+    mask_0[idx_0[idx_0 < n_col]] = True
+    idx_1  = np.asarray(j1, dtype = int).ravel()
+    mask_1 = np.zeros(n_col, dtype = bool)
+    mask_1[idx_1[idx_1 < n_col]] = True
+    free   = ~(mask_0 | mask_1)
+    temp_sum_0 = temp_rc[mask_1].sum() # the first sum term
+    temp_sum_1 = np.maximum(temp_rc[free], 0).sum() # the second sum term
     # Formulate expression
-    expr = LinExpr()
-    for i in range(len(y)):
-        expr = expr + temp_uB[i] * y[i]
+    expr = LinExpr(temp_uB[0:len(y)].tolist(), [y[i] for i in range(len(y))])
     expr = expr - temp_ua + temp_sum_0 + temp_sum_1
     # Return
     return expr
 
 
-# This function creates the upper-level planning problem (MILP), The Logic-based
-# Benders cut is added iteratively
+# This function computes the lower and upper bound of a linear expression from the
+# bounds of its variables
+#
+def ExprBound(expr):
+    n_term = expr.size()  # number of terms
+    coef = np.array([expr.getCoeff(i)  for i in range(n_term)])
+    lb   = np.array([expr.getVar(i).LB for i in range(n_term)])
+    ub   = np.array([expr.getVar(i).UB for i in range(n_term)])
+    expr_min = expr.getConstant() + np.sum(np.where(coef > 0, coef * lb, coef * ub))
+    expr_max = expr.getConstant() + np.sum(np.where(coef > 0, coef * ub, coef * lb))
+    return [expr_min,expr_max]
+
+
+# This function links the leaf inequalities of a B&B tree to a logic AND variable
+# which can be 1 only if every inequality holds, i.e. expr <= tol. Two encodings:
+# 1) 'indicator': one binary, two indicator constraints per leaf and an and_
+# 2) 'bigm': one binary per leaf which is 1 only if the leaf is violated, with a
+#    tight Big-M from the bounds of variables. The AND is aggregated into a single
+#    inequality, and leaves which can never be violated are pruned
+# A leaf with None inequality is unconstrained and skipped by both encodings
 #
-def Planning(Para,Info,Relax,Logic,n_iter):
+def LogicAnd(model,Inequality,tol,encode = 'bigm'):
+    logic_and = model.addVar(vtype = GRB.BINARY) # logic AND variable
+    n_logic = len(Inequality)  # number of leaves
+    if encode == 'indicator':
+        logic_var = []
+        for k in range(n_logic):
+            if Inequality[k] is None:  # unconstrained leaf
+                continue
+            var = model.addVar(vtype = GRB.BINARY) # logic variable
+            model.addConstr((var == 1) >> (Inequality[k] <= tol[k]))
+            model.addConstr((var == 0) >> (Inequality[k] >= tol[k]))
+            logic_var.append(var)
+        if logic_var == []:
+            logic_and.LB = 1
+        else:
+            model.addConstr(logic_and == and_(logic_var)) # logic and
+        return logic_and
+    model.update()
+    logic_var = []
+    for k in range(n_logic):
+        expr = Inequality[k]
+        if expr is None:  # unconstrained leaf
+            continue
+        [expr_min,expr_max] = ExprBound(expr)
+        if expr_max < tol[k]:  # never violated
+            continue
+        if expr_min >= tol[k]:  # always violated
+            logic_and.UB = 0
+            return logic_and
+        violate = model.addVar(vtype = GRB.BINARY) # 1 if the leaf is violated
+        model.addConstr(expr >= tol[k] - (tol[k] - expr_min) * (1 - violate))
+        model.addConstr(logic_and <= 1 - violate)
+        logic_var.append(violate)
+    model.addConstr(logic_and >= 1 - quicksum(logic_var)) # logic and
+    return logic_and
+
+
+# This function creates the upper-level planning problem (MILP). The model is kept
+# and the Logic-based Benders cut is added iteratively by function Planning
+#
+def createPlanning(Para,Info):
     #
     # minimize
     #       Investment costs of line, substation, wind farm and PV station
@@ -421,59 +497,88 @@ def Planning(Para,Info,Relax,Logic,n_iter):
     for n in range(Para.N_solar):
         model.addConstr(x_solar[n] == 1)
 
+    # Set objective
+    model.setObjective(obj_con + obj_opr, GRB.MINIMIZE)
+    model.addConstr(obj_opr >= 0)
+    # Restore variables
+    model._x_line  = x_line
+    model._x_sub   = x_sub
+    model._x_wind  = x_wind
+    model._x_solar = x_solar
+    model._x_var   = x_var
+    model._obj_con = obj_con
+    model._obj_opr = obj_opr
+    model._n_logic = 0   # number of iterations whose logic cuts have been added
+    model._n_relax = 0   # number of iterations whose basic cuts have been added
+    model._start   = []  # incumbent of the last solution
+    return model
+
+
+# This function adds the Benders cuts of new iterations to the planning problem and
+# re-solves it with the last incumbent as MIP start
+#
+def Planning(model,Para,Relax,Logic,n_iter,encode = 'bigm'):
+    x_line  = model._x_line
+    x_var   = model._x_var
+    obj_opr = model._obj_opr
     # Logic-based Benders cut
-    if len(Logic) != 0:
-        for i in range(int(0.5 * len(Logic))):
-            for s in range(2*i, 2*i + Para.N_scenario):
-                if Logic[s] != 1:
-                    kk = s%2
-                    #A    = A[s]
-                    #B    = B[s]
-                    #a    = a[s]
-                    dual = Logic[s].d_var  # dual variables
-                    flag = Logic[s].d_flg  # status flag
-                    beta = Logic[s].d_fit  # objective at leaf node
-                    j0   = Logic[s].d_j0   # set of all j where branching has set xj to 0
-                    j1   = Logic[s].d_j1   # set of all j where branching has set xj to 1
-                    # Inequality initialization
-                    n_logic = np.size(flag,0)  # number of new-added logic variables
-                    logic_var = model.addVars(n_logic, vtype = GRB.BINARY) # logic variable
-                    logic_and = model.addVar(vtype = GRB.BINARY) # logic AND variable
-                    # Formulate Inequality
-                    Inequality = []
-                    for t in range(n_logic):
-                        if flag[t] != 1: # optimality inequality
-                            expr = FeasibilityInequality(A[kk],B[kk],a[kk],dual[t][0:1803],beta[t],j0[t][0],j1[t][0],x_var[0:Para.N_line])
-                            Inequality.append(expr)
-                            model.addConstr((logic_var[t] == 1) >> (expr <= -0.001))
-                            model.addConstr((logic_var[t] == 0) >> (expr >= -0.001))
-                    # Add Benders cut
-                    model.addConstr(logic_and == and_(logic_var)) # logic and
-                    sum_cj = 0 # sum of cj
-                    model.addConstr(obj_opr >= sum_cj + (Logic[s].obj-sum_cj) * logic_and)
+    for i in range(model._n_logic, int(0.5 * len(Logic))):
+        for s in range(2*i, 2*i + Para.N_scenario):
+            if Logic[s] != 1:
+                if Logic[s].cut != []:  # combinatorial feasibility cut
+                    for cut in Logic[s].cut:
+                        model.addConstr(quicksum(x_line[n] for n in cut) >= 1)
+                    continue
+                kk = s%2
+                #A    = A[s]
+                #B    = B[s]
+                #a    = a[s]
+                dual = Logic[s].d_var  # dual variables
+                flag = Logic[s].d_flg  # status flag
+                beta = Logic[s].d_fit  # objective at leaf node
+                j0   = Logic[s].d_j0   # set of all j where branching has set xj to 0
+                j1   = Logic[s].d_j1   # set of all j where branching has set xj to 1
+                # Inequality initialization
+                n_logic = np.size(flag,0)  # number of new-added logic variables
+                # Formulate Inequality
+                Inequality = []
+                tol = []
+                for t in range(n_logic):
+                    if flag[t] != 1: # optimality inequality
+                        expr = FeasibilityInequality(A[kk],B[kk],a[kk],dual[t][0:1803],beta[t],j0[t][0],j1[t][0],x_var[0:Para.N_line])
+                    else:
+                        expr = None
+                    Inequality.append(expr)
+                    tol.append(-0.001)
+                # Add Benders cut
+                logic_and = LogicAnd(model,Inequality,tol,encode)
+                sum_cj = 0 # sum of cj
+                model.addConstr(obj_opr >= sum_cj + (Logic[s].obj-sum_cj) * logic_and)
 
     # Basic Benders cut
-    if len(Relax) == 0:
-        model.addConstr(obj_opr >= 0)
-    else:
-        for i in range(int(0.5 * len(Relax))):
-            # Basic Benders cut
-            dual_x = np.zeros(53)
-            dual_f = 0
-            for s in range(2*i, 2*i + Para.N_scenario):
-                # Dual information
-                dual   = Relax[s].x_dual  # dual variables
-                beta   = Relax[s].obj     # objective
-                x_star = Relax[s].x_star  # planning solution
-                #
-                dual_x = dual_x + dual[0:53]
-                dual_f = dual_f + beta
-            model.addConstr(obj_opr >= dual_f + quicksum(dual_x[n] * (x_var[n] - x_star[n]) for n in range(53)))
+    for i in range(model._n_relax, int(0.5 * len(Relax))):
+        # Basic Benders cut
+        dual_x = np.zeros(53)
+        dual_f = 0
+        for s in range(2*i, 2*i + Para.N_scenario):
+            # Dual information
+            dual   = Relax[s].x_dual  # dual variables
+            beta   = Relax[s].obj     # objective
+            x_star = Relax[s].x_star  # planning solution
+            #
+            dual_x = dual_x + dual[0:53]
+            dual_f = dual_f + beta
+        model.addConstr(obj_opr >= dual_f + quicksum(dual_x[n] * (x_var[n] - x_star[n]) for n in range(53)))
+    model._n_logic = int(0.5 * len(Logic))
+    model._n_relax = int(0.5 * len(Relax))
+    # MIP start
+    if model._start != []:
+        model.setAttr('Start', x_var, model._start)
     # Optimize
-    model.setObjective(obj_con + obj_opr, GRB.MINIMIZE)
     model.optimize()
     if model.status == GRB.Status.OPTIMAL:
-        result = ResultPlanning(model,Para,x_line,x_sub,x_wind,x_solar,obj_con,obj_opr)
+        model._start = model.getAttr('X', x_var)
+        result = ResultPlanning(model,Para,x_line,model._x_sub,model._x_wind,model._x_solar,model._obj_con,obj_opr)
     return result
 
 '''
@@ -642,7 +747,7 @@ def NetworkFlow_int(Para,Info,Result_Planning,s,fg = 0):
     tp_solar = Para.Solar[:,2] * Para.Typical_solar[s]  # solar
     tp_wind_ex  = np.zeros(Para.N_bus)
     tp_solar_ex = np.zeros(Para.N_bus)
-    tp_sub = np.array([20,20,0,10])
+    tp_sub = Para.Sub_S * Result_Planning.x_sub  # substation capacity
     for n in range(Para.N_bus):
         if  Info.Wind [n] != []:
             tp_wind_ex [n] =  tp_wind[Info.Wind [n][0]]
@@ -803,9 +908,133 @@ def NetworkFlow_int(Para,Info,Result_Planning,s,fg = 0):
     '''
     return model_netflow,N_con,flag,A,B,a
 
+# This function checks whether a planning solution admits a radial topology by
+# union-find and breadth-first search. Buses with load or a built substation 
+# are grouped by built lines. A group with load should contain a substation 
+# whose capacity covers the net load, otherwise the plan is infeasible and 
+# the lines from the group to other usable buses form an infeasible edge set. 
+# If all the groups pass, a spanning forest is grown from the substations and
+# checked against line and substation capacities. A load bus not reached by
+# the forest makes the plan infeasible as well, with the lines leaving its
+# group as the infeasible edge set. The problem is undecided if the forest
+# violates capacities.
+# Note that it is only called by LogicPlanning, which is disabled in the main
+# loop, since Reconfig allows load shedding and the cuts do not hold there
+#
+def RadialCheck(Para,Info,Result_Planning,s):
+    # Typical data
+    tp_load  = Para.Load * Para.Typical_load[s]  # load
+    tp_wind  = Para.Wind [:,2] * Para.Typical_wind [s]  # wind
+    tp_solar = Para.Solar[:,2] * Para.Typical_solar[s]  # solar
+    tp_net   = np.array(tp_load, dtype = float)  # net load
+    tp_cap   = np.zeros(Para.N_bus)  # substation capacity
+    for n in range(Para.N_bus):
+        if  Info.Wind [n] != []:
+            tp_net[n] = tp_net[n] - tp_wind [Info.Wind [n][0]]
+        if  Info.Solar[n] != []:
+            tp_net[n] = tp_net[n] - tp_solar[Info.Solar[n][0]]
+        if  Info.Sub  [n] != []:
+            j = Info.Sub[n][0]
+            tp_cap[n] = Para.Sub_S[j] * Result_Planning.x_sub[j]
+    # Usable buses: load bus or bus with a built substation
+    root   = [Info.Sub[n] != [] and tp_cap[n] > 0 for n in range(Para.N_bus)]
+    usable = [Para.Load[n] > 0 or root[n] for n in range(Para.N_bus)]
+    # Union-find over built lines
+    group = list(range(Para.N_bus))
+    def Find(i):
+        while group[i] != i:
+            group[i] = group[group[i]]  # path halving
+            i = group[i]
+        return i
+    for n in range(Para.N_line):
+        head = int(round(Para.Line[n,1]))
+        tail = int(round(Para.Line[n,2]))
+        if Result_Planning.x_line[n] == 1 and usable[head] and usable[tail]:
+            group[Find(head)] = Find(tail)
+    # Load and capacity of each group
+    grp_load = np.zeros(Para.N_bus)
+    grp_cap  = np.zeros(Para.N_bus)
+    grp_flag = np.zeros(Para.N_bus)  # group with load
+    for n in range(Para.N_bus):
+        if usable[n]:
+            g = Find(n)
+            grp_cap [g] = grp_cap [g] + tp_cap[n]
+            grp_load[g] = grp_load[g] + tp_net[n]
+            if Para.Load[n] > 0:
+                grp_flag[g] = 1
+    # Infeasible edge set of a group, i.e. lines to other usable buses
+    def Boundary(g):
+        edge = []
+        for n in range(Para.N_line):
+            head = int(round(Para.Line[n,1]))
+            tail = int(round(Para.Line[n,2]))
+            in_head = usable[head] and Find(head) == g
+            in_tail = usable[tail] and Find(tail) == g
+            if in_head != in_tail:
+                other = tail if in_head else head
+                if Para.Load[other] > 0 or Info.Sub[other] != []:
+                    edge.append(n)
+        return edge
+    cut = []
+    for g in range(Para.N_bus):
+        if grp_flag[g] == 1 and grp_load[g] > grp_cap[g]:
+            cut.append(Boundary(g))
+    y_pos = [0 for n in range(Para.N_line)]
+    y_neg = [0 for n in range(Para.N_line)]
+    if cut != []:
+        return ResultRadial(-1,y_pos,y_neg,cut)
+    # Spanning forest by breadth-first search from substations
+    parent = [-1 for n in range(Para.N_bus)]  # line to the parent bus
+    order  = [n for n in range(Para.N_bus) if root[n]]
+    visit  = [root[n] for n in range(Para.N_bus)]
+    k = 0
+    while k < len(order):
+        i = order[k]
+        k = k + 1
+        for n in Info.Line_head[i] + Info.Line_tail[i]:
+            if Result_Planning.x_line[n] != 1:
+                continue
+            j = int(round(Para.Line[n,1] + Para.Line[n,2])) - i
+            if usable[j] and not visit[j]:
+                visit[j]  = True
+                parent[j] = n
+                order.append(j)
+                if int(round(Para.Line[n,2])) == j:
+                    y_pos[n] = 1  # head is the parent
+                else:
+                    y_neg[n] = 1  # tail is the parent
+    # Load buses not reached by the forest, e.g. a group without substation
+    # whose renewables cover the load
+    unvisit = set(Find(n) for n in range(Para.N_bus) if Para.Load[n] > 0 and not visit[n])
+    if unvisit != set():
+        cut = [Boundary(g) for g in sorted(unvisit)]
+        y_pos = [0 for n in range(Para.N_line)]
+        y_neg = [0 for n in range(Para.N_line)]
+        return ResultRadial(-1,y_pos,y_neg,cut)
+    # Capacity check on the forest
+    flag = 1
+    flow = np.array(tp_net)
+    for j in reversed(order):
+        n = parent[j]
+        if n == -1:  # substation
+            if flow[j] > tp_cap[j]:
+                flag = 0
+            continue
+        if flow[j] > Para.Line_S[n]:
+            flag = 0
+        i = int(round(Para.Line[n,1] + Para.Line[n,2])) - j
+        flow[i] = flow[i] + flow[j]
+    return ResultRadial(flag,y_pos,y_neg,cut)
 
 
 def LogicPlanning(Para,Info,Result_Planning,s):
+    # Combinatorial check of radial topology
+    Result_Radial = RadialCheck(Para,Info,Result_Planning,s)
+    if Result_Radial.flg == 1:
+        return 1
+    if Result_Radial.flg == -1:
+        return Result_Radial
+    # Undecided, the 0-1 network flow problem is solved
     N_var = Para.N_line * 2 + Para.N_bus ** 2
     lb = np.zeros(N_var)
     ub = np.ones (N_var)
@@ -1404,52 +1633,73 @@ def ReconfigRelax(Para,Info,Result_Planning,Result_Reconfig,Result_Dual,s):
 # This function plots the planning solution in all stages
 # The solution is given in three separated sub-plots
 #
-def PlotPlanning(Para,x_line):
-    x = Para.Bus[:,2]
-    y = Para.Bus[:,3]
-
-    for n in range(Para.N_bus):  # Bus
-        plt.text(x[n] + 3, y[n] + 3, '%s'%n)
-        if n < Para.Sub[0,1]:
-            plt.plot(x[n],y[n],'b.')
-        else:
-            plt.plot(x[n],y[n],'rs')
-    for n in range(Para.N_line):  # Lines
-        x1 = x[int(round(Para.Line[n,1]))]
-        y1 = y[int(round(Para.Line[n,1]))]
-        x2 = x[int(round(Para.Line[n,2]))]
-        y2 = y[int(round(Para.Line[n,2]))]
-        if x_line[n] == 1:
-            plt.plot([x1,x2],[y1,y2],'r-')
-        else:
-            plt.plot([x1,x2],[y1,y2],'b--')
-        plt.axis('equal')
-    plt.show()
+def PlotPlanning(Para,x_line,filename = ''):
+    fig = PlotCreate(filename)
+    state = np.array(x_line) == 1
+    PlotTopology(fig.add_subplot(111),Para,state)
+    PlotShow(fig,filename)
 
 
 # This function plots the reconfiguration solution under a given scenario
 #
 #
-def PlotReconfiguration(Para,y_line):
+def PlotReconfiguration(Para,y_line,filename = ''):
+    fig = PlotCreate(filename)
+    state = np.array(y_line) == 1
+    PlotTopology(fig.add_subplot(111),Para,state)
+    PlotShow(fig,filename)
+
+
+# This function draws the topology on the axes. Buses are drawn by scatter and
+# lines by one LineCollection. Lines in service are solid in red, and others are
+# dashed in blue
+#
+def PlotTopology(ax,Para,state):
     x = Para.Bus[:,2]
     y = Para.Bus[:,3]
+    sub = np.arange(Para.N_bus) >= Para.Sub[0,1]
     for n in range(Para.N_bus):  # Bus
-        plt.text(x[n] + 3, y[n] + 3, '%s'%n)
-        if n < Para.Sub[0,1]:
-            plt.plot(x[n],y[n],'b.')
-        else:
-            plt.plot(x[n],y[n],'rs')
-    for n in range(Para.N_line):  # Lines
-        x1 = x[int(round(Para.Line[n,1]))]
-        y1 = y[int(round(Para.Line[n,1]))]
-        x2 = x[int(round(Para.Line[n,2]))]
-        y2 = y[int(round(Para.Line[n,2]))]
-        if y_line[n] == 1:
-            plt.plot([x1,x2],[y1,y2],'r-')
-        else:
-            plt.plot([x1,x2],[y1,y2],'b--')
-    plt.axis('equal')
-    plt.show()
+        ax.text(x[n] + 3, y[n] + 3, '%s'%n)
+    ax.scatter(x[~sub],y[~sub],s = 10,c = 'b',marker = '.')
+    ax.scatter(x[ sub],y[ sub],s = 30,c = 'r',marker = 's')
+    head = np.round(Para.Line[:,1]).astype(int)
+    tail = np.round(Para.Line[:,2]).astype(int)
+    segment = np.stack([np.c_[x[head],y[head]],np.c_[x[tail],y[tail]]],axis = 1)
+    color = np.where(state,'r','b')
+    style = np.where(state,'solid','dashed')
+    ax.add_collection(LineCollection(segment,colors = color.tolist(),
+                                     linestyles = style.tolist()))
+    ax.autoscale_view()
+    ax.axis('equal')
+
+
+# This function creates a figure. If the filename is given, the figure is not
+# managed by pyplot, so it can be saved without a display
+#
+def PlotCreate(filename):
+    if filename == '':
+        return plt.figure()
+    else:
+        return Figure()
+
+
+# This function shows the figure on the screen, or saves it to the file
+#
+def PlotShow(fig,filename):
+    if filename == '':
+        plt.show()
+    else:
+        fig.savefig(filename)
+
+
+# This function solves the operation sub-problems of scenario 's' under the given
+# planning solution. It runs in the scenario pool
+#
+def ScenarioReconfig(Para,Info,Result_Planning,s):
+    Result_Reconfig = Reconfig(Para,Info,Result_Planning,s)
+    Result_Dual = ReconfigDual(Para,Info,Result_Planning,Result_Reconfig,s)
+    Result_Relax = ReconfigRelax(Para,Info,Result_Planning,Result_Reconfig,Result_Dual,s)
+    return [Result_Reconfig,Result_Dual,Result_Relax]
 
 
 if __name__ == "__main__":
@@ -1460,6 +1710,7 @@ if __name__ == "__main__":
     [Para,Info] = ReadData(filename)
 
     # Logic-based Benders decomposition
+    encode = 'bigm' # encoding of logic Benders cut, 'bigm' or 'indicator'
     n_iter = 0  # index of iteration
     Relax = []  # Set of dual information
     Logic = []  # Set of logic information
@@ -1468,8 +1719,12 @@ if __name__ == "__main__":
     A = []
     B = []
     a = []
+    n_process = Para.N_scenario  # number of processes, 1 for serial sweep
+    Pool = ScenarioPool(n_process)
+    Model_Planning = createPlanning(Para,Info)
     while True:
-        Result_Planning = Planning(Para,Info,Relax,Logic,n_iter)
+        Result_Planning = Planning(Model_Planning,Para,Relax,Logic,n_iter,encode)
+        print('Iteration %d, master time (%s): %.4f' % (n_iter,encode,Result_Planning.time))
         obj_opr = 0
         '''
         for s in range(Para.N_scenario):
@@ -1496,10 +1751,9 @@ if __name__ == "__main__":
         else:
             gap = 1
         '''
+        Result = Pool.Sweep(ScenarioReconfig,(Para,Info,Result_Planning),Para.N_scenario)
         for s in range(Para.N_scenario):
-            Result_Reconfig = Reconfig(Para,Info,Result_Planning,s)
-            Result_Dual = ReconfigDual(Para,Info,Result_Planning,Result_Reconfig,s)
-            Result_Relax = ReconfigRelax(Para,Info,Result_Planning,Result_Reconfig,Result_Dual,s)
+            [Result_Reconfig,Result_Dual,Result_Relax] = Result[s]
             Relax.append(Result_Relax)
             obj_opr = obj_opr + Result_Reconfig.obj
             #
@@ -1511,6 +1765,7 @@ if __name__ == "__main__":
             break
         else:
             n_iter = n_iter + 1
+    Pool.Close()
 
     PlotPlanning(Para,Result_Planning.x_line)
     plt.plot(lower_bound)
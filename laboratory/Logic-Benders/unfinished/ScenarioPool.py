@@ -0,0 +1,38 @@
+#!/usr/bin/python
+
+# Copyright 2019, Southeast University, Liu Pengxiang
+#
+# A process pool for scenario sweeps in the logic-based Benders decomposition
+#
+# The operation sub-problems of different scenarios are independent under
+# a given planning solution, so they can be solved in parallel. Results are
+# collected in the order of scenarios, so the Benders cuts are the same as
+# the serial sweep
+
+import multiprocessing
+
+
+# This class runs a function for every scenario 's' in a process pool. The
+# processes are started once and reused in all iterations. Processes are
+# spawned rather than forked, so each process has its own gurobi environment.
+# The function should be defined at module level and take the scenario index
+# as its last argument. If n_process <= 1, scenarios are solved serially
+#
+class ScenarioPool(object):
+    def __init__(self,n_process = 0):
+        self.n_process = n_process  # number of processes
+        self.pool = 0
+        if n_process > 1:
+            context = multiprocessing.get_context('spawn')
+            self.pool = context.Pool(n_process)
+    def Sweep(self,func,args,N_scenario):
+        task = [tuple(args) + (s,) for s in range(N_scenario)]
+        if self.pool == 0:
+            return [func(*arg) for arg in task]
+        else:  # results are in the order of scenarios
+            return self.pool.starmap(func,task)
+    def Close(self):
+        if self.pool != 0:
+            self.pool.close()
+            self.pool.join()
+            self.pool = 0
@@ -8,17 +8,31 @@
 # system in Zhejiang province, China.
 
 
+import os
 import sys
-import csv
+import copy
 import math
 import xlrd
 import time
+import multiprocessing
+import heapq
+import hashlib
 import numpy as np
 import matplotlib.pyplot as plt
 
+from matplotlib.figure import Figure
+from matplotlib.collections import LineCollection
+
+from scipy import sparse
+
 from gurobipy import *
 
 
+# Module state shared by the functions below
+BatchPool = []  # batched worker LPs given by createBatchLP, used if Para.Batch > 0
+EvaluatePool = {}  # worker model and plan of an evaluation process, see EvaluateInit
+
+
 # This class builds the system parameter
 # Note: AC => 0, DC => 1, AC/DC => 2
 #
@@ -32,6 +46,12 @@ class Parameter(object):
         self.N_time   = 90  # number of times
         self.Int_rate = 0.05  # interest rate
         self.Big_M = 245  # Big M
+        self.Tight_M = 1  # per-line Big M (1) or uniform Big M (0)
+        self.Presolve = 1  # remove variables fixed by data (1) or not (0)
+        self.Decompose = 0  # hour-decomposed workers (1) or not (0)
+        self.Radial = 1  # radial power flow before the worker LP (1) or not (0)
+        self.Batch = 0  # batched worker LP of each stage (1), all (2) or none (0)
+        self.N_basis = 8  # number of bases cached for each worker, 0 to disable
         self.Factor = [0.95,math.sqrt(1-0.95**2)]  # power factor
         self.Voltage = 35
         self.Voltage_low = 35 * 0.95
@@ -60,6 +80,7 @@ class Parameter(object):
         self.Line_X = self.Line[:,5]
         self.Line_S = self.Line[:,6:8]
         self.Line_S_max = (self.Line_S).sum(axis = 1)
+        [self.Big_M_V,self.Big_M_S] = BigM(self)
         self.Dep_line = Depreciation(25,self.Int_rate)
         # Converter station
         self.Conv = Data[2]
@@ -110,7 +131,7 @@ class BusInfo(object):
 # This class restores the results of planning master problem
 class ResultMasterMILP(object):
     def __init__(self,model,Para,var):
-        variable = var.copy()
+        variable = Pre.Restore(var)  # full-size variables
         x_line = np.zeros((Para.N_line, Para.N_stage))
         x_conv = np.zeros((Para.N_conv, Para.N_stage))
         x_sub  = np.zeros((Para.N_sub , Para.N_stage))
@@ -143,7 +164,9 @@ class ResultMasterMILP(object):
 
 # This class restores the results of reconfiguration worker-problem
 class ResultWorkerLP(object):
-    def __init__(self,model,Para,N_con):
+    def __init__(self,model,Para,N_con,mask,flag = 1):
+        # Optimality (1) or feasibility (-1) information
+        self.flag = flag
         # Get all variables
         var = model.getVars()
         var = np.array([var[i].x for i in range(len(var))])
@@ -156,7 +179,8 @@ class ResultWorkerLP(object):
         self.x_gen  = var[N_X_gen  : N_X_gen  + Para.N_gen ]
         self.y_line = var[N_Y_line : N_Y_line + Para.N_line]
         # Saving operating variables
-        opr = var[N_Index:].reshape((N_Var,Para.N_hour), order = 'A')
+        opr = var[N_Index : N_Index + N_Var * len(model._hour)]  # without phase-1 slacks
+        opr = opr.reshape((N_Var,-1), order = 'A')  # hours of the worker
         self.V_bus  = opr[N_V_bus  : N_V_bus  + Para.N_bus , :]
         self.P_line = opr[N_P_line : N_P_line + Para.N_line, :]
         self.Q_line = opr[N_Q_line : N_Q_line + Para.N_line, :]
@@ -167,9 +191,11 @@ class ResultWorkerLP(object):
         self.C_load = opr[N_C_load : N_C_load + Para.N_bus , :]
         self.S_gen  = opr[N_S_gen  : N_S_gen  + Para.N_gen , :]
         self.C_gen  = opr[N_C_gen  : N_C_gen  + Para.N_gen , :]
-        # Saving dual information
+        # Saving dual information, zero for variables fixed by data
         constr = model.getConstrs()
-        dual = [constr[n].pi  for n in range(N_con[-2],N_con[-1])]
+        dual = np.zeros(N_Index)
+        dual[mask] = [constr[n].pi  for n in range(N_con[-2],N_con[-1])]
+        dual = dual.tolist()
         self.d_x_line = np.array([dual.pop(0) for n in range(Para.N_line)])
         self.d_x_conv = np.array([dual.pop(0) for n in range(Para.N_conv)])
         self.d_x_sub  = np.array([dual.pop(0) for n in range(Para.N_sub )])
@@ -177,6 +203,41 @@ class ResultWorkerLP(object):
         self.d_y_line = np.array([dual.pop(0) for n in range(Para.N_line)])
         
 
+# This class restores the results of a worker given by arrays in the same form
+# as ResultWorkerLP, e.g. of the radial power flow or a block of the batched
+# LP, where 'link' is the reconfiguration variables, 'opr' is the operating
+# variables of the hours and 'dual' is the duals of the fixing constraints
+#
+class ResultWorkerArray(object):
+    def __init__(self,Para,link,opr,obj,dual):
+        # Optimality information
+        self.flag = 1
+        self.obj = obj
+        # Saving reconfiguration variables
+        self.x_line = link[N_X_line : N_X_line + Para.N_line]
+        self.x_conv = link[N_X_conv : N_X_conv + Para.N_conv]
+        self.x_sub  = link[N_X_sub  : N_X_sub  + Para.N_sub ]
+        self.x_gen  = link[N_X_gen  : N_X_gen  + Para.N_gen ]
+        self.y_line = link[N_Y_line : N_Y_line + Para.N_line]
+        # Saving operating variables
+        self.V_bus  = opr[N_V_bus  : N_V_bus  + Para.N_bus , :]
+        self.P_line = opr[N_P_line : N_P_line + Para.N_line, :]
+        self.Q_line = opr[N_Q_line : N_Q_line + Para.N_line, :]
+        self.P_conv = opr[N_P_conv : N_P_conv + Para.N_conv, :]
+        self.Q_conv = opr[N_Q_conv : N_Q_conv + Para.N_conv, :]
+        self.P_sub  = opr[N_P_sub  : N_P_sub  + Para.N_sub , :]
+        self.Q_sub  = opr[N_Q_sub  : N_Q_sub  + Para.N_sub , :]
+        self.C_load = opr[N_C_load : N_C_load + Para.N_bus , :]
+        self.S_gen  = opr[N_S_gen  : N_S_gen  + Para.N_gen , :]
+        self.C_gen  = opr[N_C_gen  : N_C_gen  + Para.N_gen , :]
+        # Saving dual information
+        self.d_x_line = dual[N_X_line : N_X_line + Para.N_line]
+        self.d_x_conv = dual[N_X_conv : N_X_conv + Para.N_conv]
+        self.d_x_sub  = dual[N_X_sub  : N_X_sub  + Para.N_sub ]
+        self.d_x_gen  = dual[N_X_gen  : N_X_gen  + Para.N_gen ]
+        self.d_y_line = dual[N_Y_line : N_Y_line + Para.N_line]
+
+
 # This class formulates the traditional and logic Benders cut
 class BendersInfo(object):
     def __init__(self,Para,Result_Planning):
@@ -196,6 +257,122 @@ class BendersInfo(object):
         self.obj = 0
 
 
+# This class detects the master variables fixed by data, and builds a mapping
+# between the full-size linking variables, i.e. x_line, x_conv, x_sub, x_gen
+# and y_line in the order of master variables, and the reduced ones:
+#   1) x_gen is fixed by the stage of installation Gen[n,5]
+#   2) Installation is monotone, so x = 1 is passed to the later stages and
+#      x = 0 to the former stages
+#   3) y_line of an expandable line is 0 if x_line = 0, and y_line of an
+#      expandable DC line equals x_line
+# Each full-size variable is a column of the reduced master (col >= 0) or a
+# constant (col = -1). Fixed variables are constants in the master, have no
+# fixing constraint in the workers and no term in the cuts
+#
+class Presolve(object):
+    def __init__(self,Para):
+        x_line = np.full((Para.N_line, Para.N_stage), np.nan)
+        x_conv = np.full((Para.N_conv, Para.N_stage), np.nan)
+        x_sub  = np.full((Para.N_sub , Para.N_stage), np.nan)
+        x_gen  = np.full((Para.N_gen , Para.N_stage), np.nan)
+        y_line = np.full((Para.N_line, Para.N_scene, Para.N_stage), np.nan)
+        if Para.Presolve == 1:
+            for n in range(Para.N_gen):
+                x_gen[n,:] = np.arange(Para.N_stage) >= Para.Gen[n,5]
+            for x in [x_line,x_conv,x_sub,x_gen]:
+                for t in range(1,Para.N_stage):
+                    x[x[:,t-1] == 1, t] = 1
+                for t in range(Para.N_stage-2,-1,-1):
+                    x[x[:,t+1] == 0, t] = 0
+        value = np.r_[x_line.ravel(), x_conv.ravel(), x_sub.ravel(), x_gen.ravel()]
+        col = np.full(len(value), -1)
+        col[np.isnan(value)] = np.arange(np.isnan(value).sum())
+        # Reconfiguration
+        col_y = np.full(y_line.shape, -1)
+        for n in range(Para.N_line):
+            if Para.Presolve == 0 or Para.Line[n,6] > 0:  # existing line
+                continue
+            for t in range(Para.N_stage):
+                k = n * Para.N_stage + t  # index of x_line[n,t]
+                if value[k] == 0:
+                    y_line[n,:,t] = 0
+                elif Para.Line[n,9] == 1:  # DC line
+                    y_line[n,:,t] = value[k]
+                    col_y [n,:,t] = col[k]
+        free = np.isnan(y_line) & (col_y == -1)
+        col_y[free] = col.max() + 1 + np.arange(free.sum())
+        self.col   = np.r_[col, col_y.ravel()]
+        self.value = np.r_[value, y_line.ravel()]
+        self.N_link = len(self.col)  # number of full-size variables
+        self.N_free = int(self.col.max()) + 1  # number of reduced variables
+    # Full-size variables, i.e. columns of the reduced master or constants
+    def Link(self,Var):
+        return [Var[c] if c >= 0 else v for [c,v] in zip(self.col,self.value)]
+    # Split the full-size variables into x_line, x_conv, x_sub, x_gen, y_line
+    def Split(self,Para,link):
+        link = np.array(link, dtype = object)
+        size = np.cumsum([0,Para.N_line,Para.N_conv,Para.N_sub,Para.N_gen,
+                          Para.N_line * Para.N_scene]) * Para.N_stage
+        shape = [(Para.N_line, Para.N_stage),(Para.N_conv, Para.N_stage),
+                 (Para.N_sub , Para.N_stage),(Para.N_gen , Para.N_stage),
+                 (Para.N_line, Para.N_scene, Para.N_stage)]
+        return [link[size[i] : size[i+1]].reshape(shape[i]) for i in range(5)]
+    # Mask of variables in the worker of scenario 's' at stage 't' which are
+    # not fixed by data, and values of the fixed ones
+    def Worker(self,Para,s,t):
+        [x_line,x_conv,x_sub,x_gen,y_line] = self.Split(Para,self.col)
+        mask = np.r_[x_line[:,t], x_conv[:,t], x_sub[:,t], x_gen[:,t], y_line[:,s,t]] >= 0
+        [x_line,x_conv,x_sub,x_gen,y_line] = self.Split(Para,self.value)
+        value = np.r_[x_line[:,t], x_conv[:,t], x_sub[:,t], x_gen[:,t], y_line[:,s,t]]
+        return [mask,value.astype(float)]
+    # Restore the full-size master variables from the reduced ones
+    def Restore(self,var):
+        return self.Link(var) + list(var[self.N_free:])
+    # Reduce the full-size linking variables
+    def Reduce(self,link):
+        var = np.zeros(self.N_free)
+        var[self.col[self.col >= 0]] = np.array(link)[self.col >= 0]
+        return var.tolist()
+
+
+# This function adds a constraint to the master problem unless all the terms
+# are fixed by data. A violated constant constraint means the master problem
+# is infeasible, so an error is raised instead of dropping it
+#
+def PresolveConstr(model,constr):
+    if isinstance(constr,(bool,np.bool_)):
+        if not constr:
+            raise ValueError('Data is inconsistent with the variables fixed by presolve')
+        return
+    model.addConstr(constr)
+
+
+# This class restores the results of out-of-sample evaluation. Results of each
+# operating state are saved in the order of the input states, and statistics
+# are computed over the feasible states:
+#   1) expect: expected hourly cost, load shedding and renewables curtailment
+#   2) quantile: 5%, 50%, 95% and 99% quantiles of them
+#   3) prob_cut: probability of load shedding and renewables curtailment
+#
+class ResultEvaluate(object):
+    def __init__(self,State,Output):
+        self.state = State
+        self.cost     = Output[:,0]  # hourly operating cost
+        self.cut_load = Output[:,1]  # load shedding
+        self.cut_gen  = Output[:,2]  # renewables curtailment
+        self.flag     = Output[:,3]  # optimal (1) or infeasible (-1)
+        feasible = Output[self.flag == 1, 0:3]
+        self.n_infeasible = int((self.flag != 1).sum())
+        if len(feasible) > 0:
+            self.expect   = feasible.mean(axis = 0)
+            self.quantile = np.percentile(feasible, [5,50,95,99], axis = 0)
+            self.prob_cut = (feasible[:,1:3] > 1e-6).mean(axis = 0)
+        else:
+            self.expect   = np.full(3, np.nan)
+            self.quantile = np.full((4,3), np.nan)
+            self.prob_cut = np.full(2, np.nan)
+
+
 # This function input data from Excel files. The filtname can be changed 
 # to other power system for further study
 #
@@ -228,6 +405,22 @@ def Matrix_slice(Matrix,Coordinate):
     return Matrix_partitioned
 
 
+# This function computes the Big M of each line, i.e. the tightest values for
+# constraints relaxed by y_line when line is switched off. The flow of a line
+# which is switched off is zero, so terms of R and X vanish and
+#   1) Voltage drop: |V_i - V_j - 2*(R*P + X*Q)| <= V_upp^2 - V_low^2
+#   2) Power flow: |P|, |Q| <= S_max, the capacity with investment
+# If Tight_M = 0, the uniform Big_M is used for benchmarking
+#
+def BigM(Para):
+    Big_M_V = np.ones(Para.N_line) * (Para.Voltage_upp ** 2 - Para.Voltage_low ** 2)
+    Big_M_S = Para.Line_S_max.copy()
+    if Para.Tight_M == 0:
+        Big_M_V = np.ones(Para.N_line) * Para.Big_M
+        Big_M_S = np.ones(Para.N_line) * Para.Big_M
+    return [Big_M_V,Big_M_S]
+
+
 # This function creates a depreciation calculator
 #
 def Depreciation(life,rate):
@@ -235,53 +428,82 @@ def Depreciation(life,rate):
     return recovery
 
 
-# This class restores the 'plot' function
+# This class restores the 'plot' function. A figure is shown on the screen, or
+# saved to a file if the filename is given. Batch renders the planning of all
+# stages and the reconfiguration of all scenarios into files in a process pool,
+# which does not need a display
 class PlotFunc(object):
     def __init__(self,Para):
         pass
-    def Planning(self,Para,Res,t):
-        x_line = Res.x_line[:,t]
-        x_conv = Res.x_conv[:,t]
-        for n in range(Para.N_line):
-            if Para.Line[n,6] > 0:
-                x_line[n] = 1
-        self.Plot_Figure(Para,x_line,x_conv)
-    def Reconfig(self,Para,Res,s,t):
+    def Planning(self,Para,Res,t,filename = ''):
+        [x_line,x_conv] = self.Planning_State(Para,Res,t)
+        self.Plot_Figure(Para,x_line,x_conv,filename)
+    def Reconfig(self,Para,Res,s,t,filename = ''):
         y_line = Res.y_line[:,s,t]
         x_conv = Res.x_conv[:,t]
-        self.Plot_Figure(Para,y_line,x_conv)
-    def Plot_Figure(self,Para,Line,Conv):
-        x = (Para.Bus[:,2]).copy()
-        y = (Para.Bus[:,3]).copy()
-        for n in range(Para.N_bus):  # Bus
-            if Para.Bus[n,7] == 1:
-                y[n] = y[n] - 150
-        for n in range(Para.N_bus):  # Bus
-            plt.text(x[n] + 3, y[n] + 3, '%s'%n)
-            if n in Para.Sub[:,1]:
-                plt.plot(x[n],y[n],'rs')
-            else:
-                plt.plot(x[n],y[n],'b.')
-        for n in range(Para.N_line):  # lines
-            x1 = x[int(round(Para.Line[n,1]))]
-            y1 = y[int(round(Para.Line[n,1]))]
-            x2 = x[int(round(Para.Line[n,2]))]
-            y2 = y[int(round(Para.Line[n,2]))]
-            if Line[n] == 1:
-                if Para.Line[n,9] == 0:
-                    plt.plot([x1,x2],[y1,y2],'r-')
-                if Para.Line[n,9] == 1:
-                    plt.plot([x1,x2],[y1,y2],'b-')
-            else:
-                plt.plot([x1,x2],[y1,y2],'b--')
-        for n in range(Para.N_conv):  # converters
-            if Conv[n] == 1:
-                head = int(round(Para.Conv[n,1]))
-                tail = int(round(Para.Conv[n,2]))
-                plt.plot(x[head],y[head],'bs')
-                plt.plot(x[tail],y[tail],'bs')
-        plt.axis('equal')
-        plt.show()
+        self.Plot_Figure(Para,y_line,x_conv,filename)
+    def Batch(self,Para,Res,path,form = 'png',n_process = 4):
+        os.makedirs(path,exist_ok = True)
+        task = []
+        for t in range(Para.N_stage):
+            [x_line,x_conv] = self.Planning_State(Para,Res,t)
+            filename = os.path.join(path,'planning-%d.%s' % (t,form))
+            task.append((Para,x_line,x_conv,filename))
+            for s in range(Para.N_scene):
+                filename = os.path.join(path,'reconfig-%d-%d.%s' % (s,t,form))
+                task.append((Para,Res.y_line[:,s,t],x_conv,filename))
+        context = multiprocessing.get_context('spawn')
+        with context.Pool(n_process) as pool:
+            pool.starmap(PlotFile,task)
+    def Planning_State(self,Para,Res,t):
+        x_line = (Res.x_line[:,t]).copy()
+        x_conv = (Res.x_conv[:,t]).copy()
+        x_line[Para.Line[:,6] > 0] = 1  # existing line
+        return [x_line,x_conv]
+    def Plot_Figure(self,Para,Line,Conv,filename = ''):
+        if filename == '':
+            fig = plt.figure()
+            PlotTopology(fig.add_subplot(111),Para,Line,Conv)
+            plt.show()
+        else:
+            PlotFile(Para,Line,Conv,filename)
+
+
+# This function draws the topology on the axes. Buses are drawn by scatter and
+# lines by one LineCollection. Lines in service are solid (AC in red and DC in
+# blue) and other lines are dashed
+#
+def PlotTopology(ax,Para,Line,Conv):
+    x = (Para.Bus[:,2]).copy()
+    y = (Para.Bus[:,3]).copy()
+    y[Para.Bus[:,7] == 1] = y[Para.Bus[:,7] == 1] - 150  # DC bus
+    sub = np.isin(np.arange(Para.N_bus),Para.Sub[:,1])
+    for n in range(Para.N_bus):  # Bus
+        ax.text(x[n] + 3, y[n] + 3, '%s'%n)
+    ax.scatter(x[~sub],y[~sub],s = 10,c = 'b',marker = '.')
+    ax.scatter(x[ sub],y[ sub],s = 30,c = 'r',marker = 's')
+    head = np.round(Para.Line[:,1]).astype(int)
+    tail = np.round(Para.Line[:,2]).astype(int)
+    segment = np.stack([np.c_[x[head],y[head]],np.c_[x[tail],y[tail]]],axis = 1)
+    state = np.array(Line) == 1
+    color = np.where(state & (Para.Line[:,9] == 0),'r','b')
+    style = np.where(state,'solid','dashed')
+    ax.add_collection(LineCollection(segment,colors = color.tolist(),
+                                     linestyles = style.tolist()))
+    conv = Para.Conv[np.array(Conv) == 1]  # converters
+    node = np.round(np.r_[conv[:,1],conv[:,2]]).astype(int)
+    ax.scatter(x[node],y[node],s = 30,c = 'b',marker = 's')
+    ax.autoscale_view()
+    ax.axis('equal')
+
+
+# This function renders the topology into a file. The figure is not managed by
+# pyplot, so no display is needed and the memory is released after saving
+#
+def PlotFile(Para,Line,Conv,filename):
+    fig = Figure()
+    PlotTopology(fig.add_subplot(111),Para,Line,Conv)
+    fig.savefig(filename)
 
 
 # This function...
@@ -308,6 +530,9 @@ def Indexing(Para):
     N_S_gen  = N_C_load + Para.N_bus   # renewables generation
     N_C_gen  = N_S_gen  + Para.N_gen   # renewables curtailment
     N_Var    = N_C_gen  + Para.N_gen   # Number of all variables
+    # Variables fixed by data
+    global Pre
+    Pre = Presolve(Para)
 
 
 def createMasterMILP(Para,Info):
@@ -321,13 +546,11 @@ def createMasterMILP(Para,Info):
     #
     model = Model()
 
-    # Investment variables
-    x_line = model.addVars(Para.N_line, Para.N_stage, vtype = GRB.BINARY)
-    x_conv = model.addVars(Para.N_conv, Para.N_stage, vtype = GRB.BINARY)
-    x_sub  = model.addVars(Para.N_sub,  Para.N_stage, vtype = GRB.BINARY)
-    x_gen  = model.addVars(Para.N_gen,  Para.N_stage, vtype = GRB.BINARY)
+    # Investment and reconfiguration variables, where those fixed by data are
+    # constants (see Presolve)
+    Link = model.addVars(Pre.N_free, vtype = GRB.BINARY)
+    [x_line,x_conv,x_sub,x_gen,y_line] = Pre.Split(Para,Pre.Link(Link))
     # Reconfiguration variables
-    y_line = model.addVars(Para.N_line, Para.N_scene, Para.N_stage, vtype = GRB.BINARY)
     y_pos  = model.addVars(Para.N_line, Para.N_scene, Para.N_stage, vtype = GRB.BINARY)
     y_neg  = model.addVars(Para.N_line, Para.N_scene, Para.N_stage, vtype = GRB.BINARY)
     # Fictitious power flow variables
@@ -360,22 +583,21 @@ def createMasterMILP(Para,Info):
 
     # Constraint 1 (installation)
     for t in range(Para.N_stage-1):
-        model.addConstrs(x_line[n,t] <= x_line[n,t+1] for n in range(Para.N_line))
-        model.addConstrs(x_conv[n,t] <= x_conv[n,t+1] for n in range(Para.N_conv))
-        model.addConstrs(x_sub [n,t] <= x_sub [n,t+1] for n in range(Para.N_sub ))
-        model.addConstrs(x_gen [n,t] <= x_gen [n,t+1] for n in range(Para.N_gen ))
-    
+        for x in [x_line,x_conv,x_sub,x_gen]:
+            for n in range(len(x)):
+                PresolveConstr(model, x[n,t] <= x[n,t+1])
+
     # Constraint 2 (reconfiguration)
     for t in range(Para.N_stage):
         for s in range(Para.N_scene):
             for n in range(Para.N_line):
                 if Para.Line[n,6] > 0:  # existing line
-                    model.addConstr(y_line[n,s,t] <= 1)
+                    PresolveConstr(model, y_line[n,s,t] <= 1)
                 else:  # expandable line
                     if Para.Line[n,9] == 0:  # AC line
-                        model.addConstr(y_line[n,s,t] <= x_line[n,t])
-                    if Para.Line[n,9] == 1:  # DC line
-                        model.addConstr(y_line[n,s,t] == x_line[n,t])
+                        PresolveConstr(model, y_line[n,s,t] <= x_line[n,t])
+                    if Para.Line[n,9] == 1 and Para.Presolve == 0:  # DC line
+                        PresolveConstr(model, y_line[n,s,t] == x_line[n,t])
     
     # Constraint 3 (fictitious power flow initialization)
     for t in range(Para.N_stage):
@@ -462,9 +684,9 @@ def createMasterMILP(Para,Info):
         '''
         for n in range(Para.N_gen):
             if t >= Para.Gen[n,5]:
-                model.addConstr(x_gen[n,t] == 1)
+                PresolveConstr(model, x_gen[n,t] == 1)
             else:
-                model.addConstr(x_gen[n,t] == 0)
+                PresolveConstr(model, x_gen[n,t] == 0)
     
     # Set objective
     model.setObjective(obj_con + obj_opr, GRB.MINIMIZE)
@@ -472,11 +694,12 @@ def createMasterMILP(Para,Info):
     return model
    
 
-# This function creates the reconfiguration worker problem. Dual variables 
+# This function creates the reconfiguration worker problem. Dual variables
 # are returned for generating Benders cut. The problem is formulated under
-# a given scenario 's' at stage 't'.
+# a given scenario 's' at stage 't'. If 'hour' is given, only the operation
+# of that hour is formulated, i.e. the hour-decomposed worker
 #
-def createWorkerLP(Para,Info,s,t):
+def createWorkerLP(Para,Info,s,t,hour = -1):
     #
     # minimize
     #       Costs of power purchasing, load shedding, renewables generation
@@ -491,6 +714,7 @@ def createWorkerLP(Para,Info,s,t):
     # Display
     number = t * Para.N_scene + s
     print('Formulating No.%d' % number)
+    Hour = range(Para.N_hour) if hour < 0 else [hour]  # hours of the worker
     # Scenario Data
     Data_gen  = np.zeros((Para.N_gen,Para.N_hour))
     Data_load = np.zeros((Para.N_bus,Para.N_hour))
@@ -511,12 +735,23 @@ def createWorkerLP(Para,Info,s,t):
     x_sub  = model.addVars(Para.N_sub)   # substation
     x_gen  = model.addVars(Para.N_gen)   # renewables
     y_line = model.addVars(Para.N_line)  # reconfiguration
+    # Variables fixed by data
+    [mask,value] = Pre.Worker(Para,s,t)
+    model.update()
+    link = model.getVars()
+    for i in np.flatnonzero(~mask):
+        link[i].LB = value[i]
+        link[i].UB = value[i]
     # Create power flow variables
-    Var = model.addVars(N_Var, Para.N_hour, lb = -GRB.INFINITY)
+    Var = model.addVars(N_Var, Hour, lb = -GRB.INFINITY)
+    # Constraints depending on data: [constraint, index, hour, coefficient]
+    Con_load = []  # right-hand side is load
+    Con_gen  = []  # right-hand side is renewables
+    Con_xgen = []  # coefficient of x_gen is renewables
 
     # Set objective
     obj = LinExpr()
-    for h in range(Para.N_hour):
+    for h in Hour:
         for n in range(Para.N_sub):
             obj = obj + Var[N_P_sub  + n, h] * Para.Cost_load
             #obj = obj + Var[N_Q_sub  + n, h] * Para.Cost_load
@@ -529,7 +764,7 @@ def createWorkerLP(Para,Info,s,t):
     model.setObjective(obj, GRB.MINIMIZE)
 
     # Set constraints
-    for h in range(Para.N_hour):
+    for h in Hour:
         # 1.Active power balance equation
         for n in range(Para.N_bus):
             # Bus-Branch information
@@ -558,9 +793,11 @@ def createWorkerLP(Para,Info,s,t):
                     expr = expr + Var[N_S_gen + bus_no, h] * Para.Factor[0]
             # Add constraint
             if Para.Bus[n,7] == 0:  # AC bus
-                model.addConstr(expr == Data_load[n,h] * Para.Factor[0])
+                con = model.addConstr(expr == Data_load[n,h] * Para.Factor[0])
+                Con_load.append([con,n,h,Para.Factor[0]])
             if Para.Bus[n,7] == 1:  # DC bus
-                model.addConstr(expr == Data_load[n,h] * 1.0)
+                con = model.addConstr(expr == Data_load[n,h] * 1.0)
+                Con_load.append([con,n,h,1.0])
         
         # 2.Reactive power balance equation
         for n in range(Para.N_bus):
@@ -590,7 +827,8 @@ def createWorkerLP(Para,Info,s,t):
                     expr = expr + Var[N_S_gen + bus_no, h] * Para.Factor[1]
             # Add constraint
             if Para.Bus[n,7] == 0:  # AC bus
-                model.addConstr(expr == Data_load[n,h] * Para.Factor[1])
+                con = model.addConstr(expr == Data_load[n,h] * Para.Factor[1])
+                Con_load.append([con,n,h,Para.Factor[1]])
             if Para.Bus[n,7] == 1:  # DC bus
                 model.addConstr(expr == Data_load[n,h] * 0.0)
         
@@ -603,15 +841,16 @@ def createWorkerLP(Para,Info,s,t):
             expr = expr - Var[N_V_bus + bus_tail, h]
             expr = expr - Var[N_P_line + n, h] * 2 * Para.Line_R[n]
             expr = expr - Var[N_Q_line + n, h] * 2 * Para.Line_X[n]
-            model.addConstr(expr >= -Para.Big_M * (1 - y_line[n]))
-            model.addConstr(expr <=  Para.Big_M * (1 - y_line[n]))
+            model.addConstr(expr >= -Para.Big_M_V[n] * (1 - y_line[n]))
+            model.addConstr(expr <=  Para.Big_M_V[n] * (1 - y_line[n]))
         
         # 4.Renewable generation
         for n in range(Para.N_gen):
             expr = LinExpr()
             expr = expr + Var[N_S_gen + n, h]
             expr = expr + Var[N_C_gen + n, h]
-            model.addConstr(expr == x_gen[n] * Data_gen[n,h])
+            con = model.addConstr(expr == x_gen[n] * Data_gen[n,h])
+            Con_xgen.append([con,n,h,-1.0])
         
         # 5.Linearization of quadratic terms in line equations
         for n in range(Para.N_line):
@@ -695,15 +934,23 @@ def createWorkerLP(Para,Info,s,t):
         # 5) Load shedding
         for n in range(Para.N_bus):
             model.addConstr(Var[N_C_load + n, h] >= 0)
-            model.addConstr(Var[N_C_load + n, h] <= Data_load[n,h])
+            con = model.addConstr(Var[N_C_load + n, h] <= Data_load[n,h])
+            Con_load.append([con,n,h,1.0])
         # 6) Renewables
         for n in range(Para.N_gen):
             model.addConstr(Var[N_S_gen + n, h] >= 0)
-            model.addConstr(Var[N_S_gen + n, h] <= Data_gen[n,h])
+            con = model.addConstr(Var[N_S_gen + n, h] <= Data_gen[n,h])
+            Con_gen.append([con,n,h,1.0])
         for n in range(Para.N_gen):
             model.addConstr(Var[N_C_gen + n, h] >= 0)
-            model.addConstr(Var[N_C_gen + n, h] <= Data_gen[n,h])
+            con = model.addConstr(Var[N_C_gen + n, h] <= Data_gen[n,h])
+            Con_gen.append([con,n,h,1.0])
     model.update()
+    model._hour = list(Hour)
+    model._basis = {}  # cached bases, {topology: [VBasis, CBasis]}
+    model._load = Con_load
+    model._gen  = Con_gen
+    model._xgen = Con_xgen
     return model
 
 
@@ -711,36 +958,442 @@ def createWorkerLP(Para,Info,s,t):
 # given scenario
 #
 def WorkerLP(Para,Info,Res_Master,WorkerPool,s,t):
+    worker = WorkerPool[t * Para.N_scene + s]
+    if not isinstance(worker,list):
+        return WorkerSolve(Para,Res_Master,worker,s,t)
+    # Hour-decomposed worker. Hours are coupled only by the copies of x and y,
+    # so objectives and duals of the hours are summed. If any hour is
+    # infeasible, feasibility cuts of the infeasible hours are summed instead
+    Result = [WorkerSolve(Para,Res_Master,model,s,t) for model in worker]
+    return WorkerMerge(Result)
+
+
+# This function merges the results of the hours of a hour-decomposed worker
+#
+def WorkerMerge(Result):
+    if 0 in Result:
+        return 0
+    if -1 in [result.flag for result in Result]:
+        Result = [result for result in Result if result.flag == -1]
+    result = Result[0]
+    for other in Result[1:]:
+        for name in ['obj','d_x_line','d_x_conv','d_x_sub','d_x_gen','d_y_line']:
+            setattr(result, name, getattr(result,name) + getattr(other,name))
+        for name in ['V_bus','P_line','Q_line','P_conv','Q_conv',
+                     'P_sub','Q_sub','C_load','S_gen','C_gen']:
+            setattr(result, name, np.c_[getattr(result,name), getattr(other,name)])
+    return result
+
+
+# This function solves a worker model under the given master solution. Bases
+# of the latest N_basis topologies of the worker are cached, so the worker is
+# warm-started when the topology y_line[:,s,t] repeats, e.g. in consecutive
+# incumbents of the callback where only investments change
+#
+def WorkerSolve(Para,Res_Master,worker,s,t):
+    # Radial power flow, and the LP is solved only if it fails
+    if Para.Radial == 1:
+        result = RadialFlow(Para,Res_Master,worker._hour,s,t)
+        if result != 0:
+            return result
     # Model formulation
-    model = WorkerPool[t * Para.N_scene + s].copy()
+    model = worker.copy()
     model.update()
+    model._hour = worker._hour
     # Number of constraints
     N_con = []
     N_con.append(model.getAttr(GRB.Attr.NumConstrs))
-    # Add constraints
+    # Add constraints, except for variables fixed by data
     var = model.getVars()
-    for n in range(Para.N_line):
-        model.addConstr(var[N_X_line + n] == Res_Master.x_line[n,t])
-    for n in range(Para.N_conv):
-        model.addConstr(var[N_X_conv + n] == Res_Master.x_conv[n,t])
-    for n in range(Para.N_sub ):
-        model.addConstr(var[N_X_sub  + n] == Res_Master.x_sub [n,t])
-    for n in range(Para.N_gen ):
-        model.addConstr(var[N_X_gen  + n] == Res_Master.x_gen [n,t])
-    for n in range(Para.N_line):
-        model.addConstr(var[N_Y_line + n] == Res_Master.y_line[n,s,t])
+    link = np.r_[Res_Master.x_line[:,t], Res_Master.x_conv[:,t], Res_Master.x_sub[:,t],
+                 Res_Master.x_gen[:,t], Res_Master.y_line[:,s,t]]
+    [mask,value] = Pre.Worker(Para,s,t)
+    for i in np.flatnonzero(mask):
+        model.addConstr(var[i] == link[i])
     model.update()
     N_con.append(model.getAttr(GRB.Attr.NumConstrs))
+    # Load the cached basis of the same topology
+    Basis = worker._basis
+    topology = np.round(Res_Master.y_line[:,s,t]).astype(np.int8).tobytes()
+    if Para.N_basis > 0 and topology in Basis:
+        Basis[topology] = Basis.pop(topology)  # most recently used
+        model.setAttr('VBasis', model.getVars(), Basis[topology][0])
+        model.setAttr('CBasis', model.getConstrs(), Basis[topology][1])
     # Optimize
     model.Params.OutputFlag = 0  # turn off the display
     model.optimize()
     if model.status == GRB.Status.OPTIMAL:
-        result = ResultWorkerLP(model,Para,N_con)
+        # Cache the basis, and the least recently used one is evicted
+        if Para.N_basis > 0:
+            Basis.pop(topology, None)
+            Basis[topology] = [model.getAttr('VBasis', model.getVars()),
+                               model.getAttr('CBasis', model.getConstrs())]
+            if len(Basis) > Para.N_basis:
+                Basis.pop(next(iter(Basis)))
+        result = ResultWorkerLP(model,Para,N_con,mask)
+        return result
+    if model.status in [GRB.Status.INFEASIBLE, GRB.Status.INF_OR_UNBD]:
+        result = WorkerPhaseOne(model,Para,N_con,mask)
         return result
     else:
         return 0
 
 
+# This function evaluates a worker by the radial power flow instead of the LP.
+# If each island of the topology is a tree fed by one substation, the
+# LinDistFlow has a unique flow without load shedding and curtailment, which
+# is given by a backward sweep of the downstream loads. Voltages are given by
+# a forward sweep, and the substation voltage is set to centre them within the
+# bounds. If no limit is violated and shedding and curtailment do not pay off,
+# the flow is optimal and the duals are known analytically:
+#   1) Active power balance: Cost_load, reactive power balance: 0
+#   2) Renewables: Cost_gen - Cost_load * factor, i.e. the value of 1 MW
+#   3) All the limits: 0, which is complementary whether they bind or not
+# So only x_gen has a non-zero term in the cut. 0 is returned if any of the
+# conditions fails, e.g. loops, congestion or a fractional master solution,
+# and then the worker LP is solved
+#
+def RadialFlow(Para,Res_Master,Hour,s,t):
+    tol = 1e-6
+    # Reconfiguration variables, with those fixed by data
+    link = np.r_[Res_Master.x_line[:,t], Res_Master.x_conv[:,t], Res_Master.x_sub[:,t],
+                 Res_Master.x_gen[:,t], Res_Master.y_line[:,s,t]]
+    [mask,value] = Pre.Worker(Para,s,t)
+    link = np.where(mask, np.array(link, dtype = float), value)
+    if np.abs(link - link.round()).max() > tol:
+        return 0
+    x_line = link[N_X_line : N_X_line + Para.N_line]
+    x_conv = link[N_X_conv : N_X_conv + Para.N_conv]
+    x_sub  = link[N_X_sub  : N_X_sub  + Para.N_sub ]
+    x_gen  = link[N_X_gen  : N_X_gen  + Para.N_gen ]
+    y_line = link[N_Y_line : N_Y_line + Para.N_line]
+    # Duals of renewables, and shedding and curtailment must not pay off
+    factor_load = np.where(Para.Bus[:,7] == 0, Para.Factor[0], 1.0)
+    factor_gen  = np.where(Para.Gen[:,6] == 1, 1.0, Para.Factor[0])
+    d_gen = Para.Cost_gen - Para.Cost_load * factor_gen
+    if Para.Cost_cutload < Para.Cost_load * factor_load.max():
+        return 0
+    if (d_gen > Para.Cost_cutgen).any():
+        return 0
+    # Scenario Data
+    index_hour = s * Para.N_hour + np.array(Hour)
+    gen_type = Para.Gen[:,6].astype(int)
+    Data_load = np.outer(Para.Load[:,t], Para.Ty_load[index_hour])
+    Data_gen  = Para.Gen[:,2:3] * Para.Ty_gen[index_hour][:,gen_type].T
+    S_gen = x_gen[:,None] * Data_gen
+    # Net load of each bus
+    bus_sub = Para.Sub[:,1].round().astype(int)
+    bus_gen = Para.Gen[:,1].round().astype(int)
+    P_net = Data_load * factor_load[:,None]
+    Q_net = Data_load * np.where(Para.Bus[:,7] == 0, Para.Factor[1], 0.0)[:,None]
+    np.subtract.at(P_net, bus_gen, S_gen * factor_gen[:,None])
+    np.subtract.at(Q_net, bus_gen, S_gen * np.where(Para.Gen[:,6] == 1, 0.0, Para.Factor[1])[:,None])
+    # Branches in operation, lines followed by converters
+    head = np.r_[Para.Line[:,1], Para.Conv[:,1]].round().astype(int)
+    tail = np.r_[Para.Line[:,2], Para.Conv[:,2]].round().astype(int)
+    Adj = [[] for n in range(Para.N_bus)]
+    for b in np.flatnonzero(np.r_[y_line, x_conv] > 0.5):
+        Adj[head[b]].append([b, tail[b]])
+        Adj[tail[b]].append([b, head[b]])
+    # Search trees from substations
+    parent = np.full(Para.N_bus, -1)  # branch to the parent bus
+    root   = np.full(Para.N_bus, -1)  # substation of the island
+    order  = []
+    for k in range(Para.N_sub):
+        if root[bus_sub[k]] >= 0:  # two substations in an island
+            return 0
+        root[bus_sub[k]] = k
+        queue = [bus_sub[k]]
+        for i in queue:
+            order.append(i)
+            for [b,j] in Adj[i]:
+                if b == parent[i]:
+                    continue
+                if root[j] >= 0:  # loop or another substation
+                    return 0
+                root[j] = k
+                parent[j] = b
+                queue.append(j)
+    # Islands without substation must have no load
+    if (np.abs(P_net[root < 0]) > tol).any() or (np.abs(Q_net[root < 0]) > tol).any():
+        return 0
+    # Backward sweep of power flow
+    P_flow = np.zeros((Para.N_line + Para.N_conv, len(Hour)))
+    Q_flow = np.zeros((Para.N_line + Para.N_conv, len(Hour)))
+    for i in reversed(order):
+        b = parent[i]
+        if b < 0:
+            continue
+        j = head[b] + tail[b] - i  # parent bus
+        sign = 1 if tail[b] == i else -1
+        P_flow[b] = sign * P_net[i]
+        P_net[j] = P_net[j] + P_net[i]
+        if b < Para.N_line and Para.Line[b,9] == 0:  # AC line
+            Q_flow[b] = sign * Q_net[i]
+            Q_net[j] = Q_net[j] + Q_net[i]
+        elif (np.abs(Q_net[i]) > tol).any():  # no reactive power is transferred
+            return 0
+    P_sub = P_net[bus_sub]
+    Q_sub = Q_net[bus_sub]
+    # Forward sweep of voltage, where converters start new voltage islands
+    U = np.zeros((Para.N_bus, len(Hour)))  # voltage relative to the island root
+    island = np.arange(Para.N_bus)
+    for i in order:
+        b = parent[i]
+        if b < 0 or b >= Para.N_line:
+            continue
+        j = head[b] + tail[b] - i
+        drop = 2 * (Para.Line_R[b] * P_flow[b] + Para.Line_X[b] * Q_flow[b])
+        U[i] = U[j] - drop if tail[b] == i else U[j] + drop
+        island[i] = island[j]
+    V_low = Para.Voltage_low ** 2
+    V_upp = Para.Voltage_upp ** 2
+    U_max = np.full(U.shape, -np.inf)
+    U_min = np.full(U.shape,  np.inf)
+    np.maximum.at(U_max, island, U)
+    np.minimum.at(U_min, island, U)
+    if (U_max - U_min > V_upp - V_low + tol).any():
+        return 0
+    V_bus = U + (V_upp + V_low - U_max[island] - U_min[island]) / 2
+    # Limits of lines, converters and substations
+    P_line = P_flow[0 : Para.N_line]
+    Q_line = Q_flow[0 : Para.N_line]
+    P_conv = P_flow[Para.N_line : ]
+    cap_line = np.minimum(Para.Line_S[:,0] + x_line * Para.Line_S[:,1],
+                          y_line * Para.Line_S_max)[:,None]
+    cap_conv = (x_conv * Para.Conv[:,3])[:,None]
+    cap_sub  = (Para.Sub_S[:,0] + x_sub * Para.Sub_S[:,1])[:,None]
+    violation = [np.abs(P_line) - cap_line,
+                 np.abs(Q_line) - cap_line,
+                 np.abs(P_line) + np.abs(Q_line) - 1.414 * cap_line,
+                 np.abs(P_conv) - cap_conv,
+                 -Q_sub, Q_sub - P_sub,
+                 P_sub - cap_sub, Q_sub - cap_sub,
+                 P_sub + Q_sub - 1.414 * cap_sub]
+    if max([v.max(initial = -np.inf) for v in violation]) > tol:
+        return 0
+    # Operating variables
+    opr = np.zeros((N_Var, len(Hour)))
+    opr[N_V_bus  : N_V_bus  + Para.N_bus ] = V_bus
+    opr[N_P_line : N_P_line + Para.N_line] = P_line
+    opr[N_Q_line : N_Q_line + Para.N_line] = Q_line
+    opr[N_P_conv : N_P_conv + Para.N_conv] = P_conv
+    opr[N_P_sub  : N_P_sub  + Para.N_sub ] = P_sub
+    opr[N_Q_sub  : N_Q_sub  + Para.N_sub ] = Q_sub
+    opr[N_S_gen  : N_S_gen  + Para.N_gen ] = S_gen
+    obj = (Para.Cost_load * P_sub.sum() + Para.Cost_gen * S_gen.sum()) * Para.N_time
+    # Duals of the fixing constraints, zero for variables fixed by data
+    dual = np.zeros(N_Index)
+    dual[N_X_gen : N_X_gen + Para.N_gen] = d_gen * Para.N_time * Data_gen.sum(axis = 1)
+    dual[~mask] = 0
+    return ResultWorkerArray(Para,link,opr,obj,dual)
+
+
+# This function creates the batched worker LPs, where the workers of a batch
+# are assembled into one block-diagonal LP so that they are solved by a single
+# call. 'batch' is 1 for a batch of each stage and 2 for one batch of all the
+# workers, and hours of a hour-decomposed worker are blocks of the same batch.
+# Fixing constraints of the linking variables are created once, and their
+# right-hand sides are set to the master solution before each solve
+#
+def createBatchLP(Para,WorkerPool,batch = 1):
+    Batch = [[] for t in range(Para.N_stage)] if batch == 1 else [[]]
+    for t in range(Para.N_stage):
+        for s in range(Para.N_scene):
+            worker = WorkerPool[t * Para.N_scene + s]
+            for model in (worker if isinstance(worker,list) else [worker]):
+                Batch[t if batch == 1 else 0].append([model,s,t])
+    Pool = []
+    for Block in Batch:
+        # Blocks in canonical form
+        A = []
+        sense = []
+        rhs = []
+        lb = []
+        ub = []
+        fix = []  # index of fixing constraints in the batch
+        offset = 0
+        for block in Block:
+            [worker,s,t] = block
+            var = worker.getVars()
+            con = worker.getConstrs()
+            A.append(worker.getA())
+            sense.extend(worker.getAttr('Sense',con))
+            rhs.extend(worker.getAttr('RHS',con))
+            lb.extend(worker.getAttr('LB',var))
+            ub.extend(worker.getAttr('UB',var))
+            [mask,value] = Pre.Worker(Para,s,t)
+            block.extend([offset, len(var), len(fix), mask])
+            fix.extend(offset + np.flatnonzero(mask))
+            offset = offset + len(var)
+        # Model
+        model = Model()
+        x = model.addMVar(offset, lb = np.array(lb), ub = np.array(ub))
+        model.addMConstr(sparse.block_diag(A, format = 'csr'), x, np.array(sense), np.array(rhs))
+        select = sparse.csr_matrix((np.ones(len(fix)), (np.arange(len(fix)), fix)),
+                                   shape = (len(fix), offset))
+        model._fix = model.addMConstr(select, x, '=', np.zeros(len(fix)))
+        model._x = x
+        model._block = Block  # [worker, s, t, offset, N_var, offset of fixing, mask]
+        model.Params.OutputFlag = 0  # turn off the display
+        BatchObj(model)
+        Pool.append(model)
+    return Pool
+
+
+# This function sets the objective of a batched LP with those of its blocks
+#
+def BatchObj(model):
+    c = [block[0].getAttr('Obj',block[0].getVars()) for block in model._block]
+    model._x.Obj = np.concatenate(c)
+    model.update()
+
+
+# This function solves the batched LPs under a given master solution and
+# returns the results of all the workers as {(s,t): result}. The radial power
+# flow is tried first, and a batch is solved only if any of its blocks fails.
+# If a batch is not optimal, e.g. one block is infeasible, its workers are
+# solved one by one so that the infeasible ones get phase-1 results
+#
+def BatchWorker(Para,Res_Master,BatchPool):
+    Result = {}
+    for model in BatchPool:
+        Block = model._block
+        # Radial power flow
+        Radial = [0] * len(Block)
+        if Para.Radial == 1:
+            Radial = [RadialFlow(Para,Res_Master,block[0]._hour,block[1],block[2])
+                      for block in Block]
+        if 0 not in Radial:
+            for [block,result] in zip(Block,Radial):
+                Result.setdefault((block[1],block[2]),[]).append(result)
+            continue
+        # Fixing constraints
+        rhs = []
+        for [worker,s,t,offset,n_var,n_fix,mask] in Block:
+            link = np.r_[Res_Master.x_line[:,t], Res_Master.x_conv[:,t], Res_Master.x_sub[:,t],
+                         Res_Master.x_gen[:,t], Res_Master.y_line[:,s,t]]
+            rhs.extend(np.array(link, dtype = float)[mask])
+        model._fix.RHS = np.array(rhs)
+        model.optimize()
+        if model.status != GRB.Status.OPTIMAL:
+            for [worker,s,t,offset,n_var,n_fix,mask] in Block:
+                result = WorkerSolve(Para,Res_Master,worker,s,t)
+                Result.setdefault((s,t),[]).append(result)
+            continue
+        # Split the solution and duals into blocks
+        x  = model._x.X
+        c  = model._x.Obj
+        pi = model._fix.Pi
+        for [worker,s,t,offset,n_var,n_fix,mask] in Block:
+            var = x[offset : offset + n_var]
+            obj = c[offset : offset + n_var].dot(var)
+            opr = var[N_Index : ].reshape((N_Var,-1), order = 'A')
+            dual = np.zeros(N_Index)
+            dual[mask] = pi[n_fix : n_fix + mask.sum()]
+            result = ResultWorkerArray(Para,var[0 : N_Index],opr,obj,dual)
+            Result.setdefault((s,t),[]).append(result)
+    return {case: WorkerMerge(Result[case]) for case in Result}
+
+
+# This function solves the phase-1 problem of an infeasible worker. All the
+# operating constraints are relaxed by slack variables with unit penalty, 
+# while the fixing constraints are kept so that their dual variables give
+# the coefficients of a feasibility cut
+#
+def WorkerPhaseOne(model,Para,N_con,mask):
+    constr = model.getConstrs()
+    relax  = [constr[n] for n in range(N_con[-2])]  # operating constraints
+    model.feasRelax(0, False, None, None, None, relax, [1.0] * len(relax))
+    model.optimize()
+    if model.status == GRB.Status.OPTIMAL:
+        result = ResultWorkerLP(model,Para,N_con,mask,-1)
+        return result
+    else:
+        return 0
+
+
+# This function formulates the linear expression of a Benders cut with the
+# given dual information. The constant term is returned together with the 
+# expression, i.e. cut = expr + c
+#
+def BendersExpr(model,Incumbent,d_x_line,d_x_conv,d_x_sub,d_x_gen,d_y_line,d_object):
+    d = np.r_[d_x_line.ravel(), d_x_conv.ravel(), d_x_sub.ravel(),
+              d_x_gen .ravel(), d_y_line.ravel()]
+    # Terms of variables fixed by data vanish, and those of the same reduced
+    # variable are merged
+    free  = Pre.col >= 0
+    coeff = np.zeros(Pre.N_free)
+    np.add.at(coeff, Pre.col[free], d[free])
+    c = d_object - coeff.dot(Incumbent[0 : Pre.N_free])  # constant
+    index = np.flatnonzero(coeff)
+    expr = LinExpr(coeff[index].tolist(), [model._vars[i] for i in index])
+    return [expr,c]
+
+
+# This function solves all the worker problems under a given master solution
+# and collects the dual information in a BendersInfo object. Phase-1 results
+# of infeasible workers are restored in 'infeasible' as [result,s,t]
+#
+def BendersWorker(Para,Info,Res_Master,WorkerPool):
+    Benders = BendersInfo(Para,Res_Master)
+    Benders.infeasible = []
+    # Batched worker linear programming
+    if Para.Batch > 0:
+        Result = BatchWorker(Para,Res_Master,BatchPool)
+    # Operating worker linear programming
+    for t in range(Para.N_stage):
+        for s in range(Para.N_scene):
+            if Para.Batch > 0:
+                result = Result[(s,t)]
+            else:
+                result = WorkerLP(Para,Info,Res_Master,WorkerPool,s,t)
+            if result == 0:  # numerical trouble, no cut is generated
+                return 0
+            if result.flag == -1:
+                Benders.infeasible.append([result,s,t])
+                continue
+            # Formulate coefficient
+            Benders.d_x_line[:,t] = Benders.d_x_line[:,t] + result.d_x_line
+            Benders.d_x_conv[:,t] = Benders.d_x_conv[:,t] + result.d_x_conv
+            Benders.d_x_sub [:,t] = Benders.d_x_sub [:,t] + result.d_x_sub
+            Benders.d_x_gen [:,t] = Benders.d_x_gen [:,t] + result.d_x_gen
+            Benders.d_y_line[:,s,t] = result.d_y_line
+            Benders.obj = Benders.obj + result.obj
+    return Benders
+
+
+# This function formulates the Benders cuts of a given master solution. If
+# any worker is infeasible, feasibility cuts are returned instead of the 
+# optimality cut
+#
+def BendersConstr(model,Incumbent,Benders):
+    Constr = []
+    # Formulate feasibility cut
+    if Benders.infeasible != []:
+        for [result,s,t] in Benders.infeasible:
+            f_x_line = np.zeros((Para.N_line, Para.N_stage))
+            f_x_conv = np.zeros((Para.N_conv, Para.N_stage))
+            f_x_sub  = np.zeros((Para.N_sub , Para.N_stage))
+            f_x_gen  = np.zeros((Para.N_gen , Para.N_stage))
+            f_y_line = np.zeros((Para.N_line, Para.N_scene, Para.N_stage))
+            f_x_line[:,t] = result.d_x_line
+            f_x_conv[:,t] = result.d_x_conv
+            f_x_sub [:,t] = result.d_x_sub
+            f_x_gen [:,t] = result.d_x_gen
+            f_y_line[:,s,t] = result.d_y_line
+            [expr,c] = BendersExpr(model,Incumbent,f_x_line,f_x_conv,
+                                   f_x_sub,f_x_gen,f_y_line,result.obj)
+            Constr.append(expr + c <= 0)
+        return Constr
+    # Formulate optimality cut
+    [expr,c] = BendersExpr(model,Incumbent,Benders.d_x_line,Benders.d_x_conv,
+                           Benders.d_x_sub,Benders.d_x_gen,Benders.d_y_line,
+                           Benders.obj)
+    Constr.append(model._vars[-1] >= expr + c)
+    return Constr
+
+
 # This function adds Benders cut to the master problem once an
 # incumbent solution is found
 #
@@ -749,78 +1402,393 @@ def BendersCut(model,where):
         # Incumbent solutions
         Incumbent  = model.cbGetSolution(model._vars)
         Res_Master = ResultMasterMILP(model,Para,Incumbent)
-        # Initialize Benders cut coefficient
-        d_x_line = np.zeros((Para.N_line, Para.N_stage))
-        d_x_conv = np.zeros((Para.N_conv, Para.N_stage))
-        d_x_sub  = np.zeros((Para.N_sub , Para.N_stage))
-        d_x_gen  = np.zeros((Para.N_gen , Para.N_stage))
-        d_y_line = np.zeros((Para.N_line, Para.N_scene, Para.N_stage))
-        d_object = 0
         # Operating worker linear programming
-        for t in range(Para.N_stage):
-            for s in range(Para.N_scene):
-                result = WorkerLP(Para,Info,Res_Master,WorkerPool,s,t)
-                # Formulate coefficient
-                d_x_line[:,t] = d_x_line[:,t] + result.d_x_line
-                d_x_conv[:,t] = d_x_conv[:,t] + result.d_x_conv
-                d_x_sub [:,t] = d_x_sub [:,t] + result.d_x_sub
-                d_x_gen [:,t] = d_x_gen [:,t] + result.d_x_gen
-                d_y_line[:,s,t] = result.d_y_line
-                d_object = d_object + result.obj
-        # Formulate Benders cut
-        i = 0  # index of variables
-        c = d_object  # constant
-        expr = LinExpr()
-        for n in range(Para.N_line):
-            for t in range(Para.N_stage):
-                expr.addTerms(d_x_line[n,t], model._vars[i])
-                c = c - d_x_line[n,t] * Incumbent[i]
-                i = i + 1
-        for n in range(Para.N_conv):
-            for t in range(Para.N_stage):
-                expr.addTerms(d_x_conv[n,t], model._vars[i])
-                c = c - d_x_conv[n,t] * Incumbent[i]
-                i = i + 1
-        for n in range(Para.N_sub ):
-            for t in range(Para.N_stage):
-                expr.addTerms(d_x_sub [n,t], model._vars[i])
-                c = c - d_x_sub [n,t] * Incumbent[i]
-                i = i + 1
-        for n in range(Para.N_gen ):
-            for t in range(Para.N_stage):
-                expr.addTerms(d_x_gen [n,t], model._vars[i])
-                c = c - d_x_gen [n,t] * Incumbent[i]
-                i = i + 1
-        for n in range(Para.N_line):
+        Benders = BendersWorker(Para,Info,Res_Master,WorkerPool)
+        if Benders == 0:  # numerical trouble, the incumbent is not priced
+            print('Numerical trouble in the worker LPs, optimization is terminated')
+            model._trouble = 1
+            model.terminate()
+            return
+        # Add Benders cut
+        for constr in BendersConstr(model,Incumbent,Benders):
+            model.cbLazy(constr)
+        model._point.append(Incumbent)
+
+
+# This function adds Benders cuts of a given master solution to the master
+# problem before optimization, e.g. solutions of a previous run re-priced
+# with the current operating costs
+#
+def BendersPoint(model,Incumbent,WorkerPool):
+    Res_Master = ResultMasterMILP(model,Para,Incumbent)
+    Benders = BendersWorker(Para,Info,Res_Master,WorkerPool)
+    if Benders != 0:
+        for constr in BendersConstr(model,Incumbent,Benders):
+            model.addConstr(constr)
+        model._point.append(Incumbent)
+    return Benders
+
+
+# This function builds a radial plan by a constructive heuristic. For each
+# stage, a shortest-path tree is grown from the substations where existing
+# lines are free and new lines/converters are weighted by investment costs.
+# Lines, converters and substations are then built if the peak load of the
+# downstream sub-tree exceeds the existing capacity. Values are returned in 
+# the order of master variables for a MIP start
+#
+def HeuristicStart(Para,Info,model):
+    x_line = np.zeros((Para.N_line, Para.N_stage))
+    x_conv = np.zeros((Para.N_conv, Para.N_stage))
+    x_sub  = np.zeros((Para.N_sub , Para.N_stage))
+    x_gen  = np.zeros((Para.N_gen , Para.N_stage))
+    y_line = np.zeros((Para.N_line, Para.N_scene, Para.N_stage))
+    Peak = max(Para.Ty_load)  # peak of typical load
+    for t in range(Para.N_stage):
+        # Shortest-path tree from all substations
+        dist = np.ones(Para.N_bus) * float("inf")
+        parent = [None for n in range(Para.N_bus)]  # [type,index] of branch
+        order = []  # buses in the order of settlement
+        settle = np.zeros(Para.N_bus)
+        heap = []
+        for n in range(Para.N_sub):
+            root = int(round(Para.Sub[n,1]))
+            dist[root] = 0
+            heapq.heappush(heap, (0, root))
+        while heap != []:
+            [d,i] = heapq.heappop(heap)
+            if settle[i] == 1:
+                continue
+            settle[i] = 1
+            order.append(i)
+            branch = []  # [type,index,bus,cost]
+            for n in Info.Line_head[i]:
+                branch.append([0, n, int(round(Para.Line[n,2])), Para.Line[n,8]])
+            for n in Info.Line_tail[i]:
+                branch.append([0, n, int(round(Para.Line[n,1])), Para.Line[n,8]])
+            for n in Info.Conv_head[i]:
+                branch.append([1, n, int(round(Para.Conv[n,2])), Para.Conv[n,4]])
+            for n in Info.Conv_tail[i]:
+                branch.append([1, n, int(round(Para.Conv[n,1])), Para.Conv[n,4]])
+            for [tp,n,j,cost] in branch:
+                if tp == 0 and Para.Line[n,6] > 0:  # existing line
+                    cost = 0
+                if j < Para.N_bus_AC and Para.Load[j,t] == 0:
+                    continue  # none load bus can not have a parent
+                if d + cost < dist[j]:
+                    dist[j] = d + cost
+                    parent[j] = [tp,n]
+                    heapq.heappush(heap, (dist[j], j))
+        # Peak power flow of each sub-tree
+        flow = Para.Load[:,t] * Peak
+        for i in reversed(order):
+            if parent[i] == None:
+                continue
+            [tp,n] = parent[i]
+            if tp == 0:
+                j = int(round(Para.Line[n,1] + Para.Line[n,2])) - i
+                y_line[n,:,t] = 1
+                if Para.Line[n,6] == 0 or flow[i] > Para.Line_S[n,0]:
+                    x_line[n,t] = 1
+            else:
+                j = int(round(Para.Conv[n,1] + Para.Conv[n,2])) - i
+                x_conv[n,t] = 1
+            flow[j] = flow[j] + flow[i]
+        for n in range(Para.N_sub):
+            if flow[int(round(Para.Sub[n,1]))] > Para.Sub_S[n,0]:
+                x_sub[n,t] = 1
+        for n in range(Para.N_gen):
+            if t >= Para.Gen[n,5]:
+                x_gen[n,t] = 1
+    # Installation and reconfiguration constraints
+    for t in range(1,Para.N_stage):
+        x_line[:,t] = np.maximum(x_line[:,t], x_line[:,t-1])
+        x_conv[:,t] = np.maximum(x_conv[:,t], x_conv[:,t-1])
+        x_sub [:,t] = np.maximum(x_sub [:,t], x_sub [:,t-1])
+    for n in range(Para.N_line):
+        if Para.Line[n,6] == 0 and Para.Line[n,9] == 1:  # DC line
             for s in range(Para.N_scene):
-                for t in range(Para.N_stage):
-                    expr.addTerms(d_y_line[n,s,t], model._vars[i])
-                    c = c - d_y_line[n,s,t] * Incumbent[i]
-                    i = i + 1
-        model.cbLazy(model._vars[-1] >= expr + c)
+                y_line[n,s,:] = x_line[n,:]
+    # Values in the order of master variables
+    Start = [0.0 for i in range(len(model._vars))]
+    Value = np.r_[x_line.flatten(), x_conv.flatten(), x_sub.flatten(),
+                  x_gen.flatten(), y_line.flatten()]
+    Start[0:Pre.N_free] = Pre.Reduce(Value)
+    return Start
+
+
+# This function saves the planning results into a compressed npz file. Each
+# result is a named array, and the objective, optimality gap, runtime and hash
+# of input data are saved with them. Decisions are saved as 8-bit integers
+#
+def SaveResult(filename,Data,Res):
+    case = hashlib.sha1()
+    for data in Data:
+        case.update(np.ascontiguousarray(data,dtype = float).tobytes())
+    np.savez_compressed(filename,
+                        x_line  = Res.x_line.astype(np.int8),
+                        x_conv  = Res.x_conv.astype(np.int8),
+                        x_sub   = Res.x_sub .astype(np.int8),
+                        x_gen   = Res.x_gen .astype(np.int8),
+                        y_line  = Res.y_line.astype(np.int8),
+                        obj     = Res.obj,
+                        obj_con = Res.obj_con,
+                        obj_opr = Res.obj_opr,
+                        gap     = Res.gap,
+                        runtime = Res.runtime,
+                        case    = case.hexdigest())
+
+
+# This function loads the planning results saved by SaveResult. Arrays are read
+# lazily, i.e. only when they are accessed by name, e.g.
+#   Result = LoadResult('result/result.npz')
+#   x_line = Result['x_line'][:,t]  # plan of stage t
+#
+def LoadResult(filename):
+    return np.load(filename)
+
+
+# This function samples hourly operating states around the typical days. An
+# operating state is a row of [stage, scenario, load, type-1, type-2, type-3],
+# i.e. the stage and reconfiguration scenario it is operated under and the
+# factors of load and renewables as in Typical_Day. Historical states in the
+# same form can be evaluated as well. Factors are disturbed by normal errors
+# with the standard deviation of 'sigma' (load, renewables)
+#
+def SampleState(Para,n_sample,sigma = [0.1,0.2],seed = 0):
+    rng = np.random.default_rng(seed)
+    t = rng.integers(0, Para.N_stage, n_sample)
+    s = rng.integers(0, Para.N_scene, n_sample)
+    h = rng.integers(0, Para.N_hour , n_sample)
+    index_hour = s * Para.N_hour + h
+    ty_load = Para.Ty_load[index_hour] * (1 + sigma[0] * rng.standard_normal(n_sample))
+    ty_gen  = Para.Ty_gen [index_hour] * (1 + sigma[1] * rng.standard_normal((n_sample,3)))
+    ty_load = np.maximum(ty_load, 0)
+    ty_gen  = np.clip(ty_gen, 0, 1)
+    return np.c_[t, s, ty_load, ty_gen]
+
+
+# This function initializes a process of the evaluation pool. One worker model
+# is created in each process and kept for all operating states, and the plan
+# is passed here once instead of with every batch
+#
+def EvaluateInit(para,info,plan):
+    global Para, Info
+    Para = para
+    Info = info
+    Indexing(Para)
+    model = createWorkerLP(Para,Info,0,0)
+    model.Params.OutputFlag = 0  # turn off the display
+    EvaluatePool['model'] = model
+    EvaluatePool['plan' ] = plan
+    EvaluatePool['case' ] = (-1,-1)
+
+
+# This function evaluates a batch of operating states with the fixed plan. The
+# worker model has N_hour hours which are independent once x and y are fixed,
+# so states of the same stage and scenario are evaluated N_hour at a time by
+# updating the data-dependent right-hand sides and coefficients. Each row of
+# the output is [hourly cost, load shedding, curtailment, flag]
+#
+def EvaluateWorker(State):
+    model = EvaluatePool['model']
+    [x_line,x_conv,x_sub,x_gen,y_line] = EvaluatePool['plan']
+    var = model.getVars()
+    obj = np.array(model.getAttr('Obj',var[N_Index:]))
+    gen_type = Para.Gen[:,6].astype(int)
+    # Data-dependent constraints
+    con_load = [con[0] for con in model._load]
+    con_gen  = [con[0] for con in model._gen ]
+    index_load = np.array([con[1:] for con in model._load]).reshape((-1,3))
+    index_gen  = np.array([con[1:] for con in model._gen ]).reshape((-1,3))
+    # Group states by stage and scenario, with N_hour states at most
+    Batch = []
+    order = np.lexsort((State[:,1],State[:,0]))
+    case  = State[order,0] * Para.N_scene + State[order,1]
+    for group in np.split(order, np.flatnonzero(np.diff(case)) + 1):
+        for k in range(0, len(group), Para.N_hour):
+            Batch.append(group[k : k + Para.N_hour])
+    Output = np.zeros((len(State),4))
+    for batch in Batch:
+        # Fix the plan of the stage and scenario
+        t = int(State[batch[0],0])
+        s = int(State[batch[0],1])
+        if EvaluatePool['case'] != (s,t):
+            link = np.r_[x_line[:,t], x_conv[:,t], x_sub[:,t], x_gen[:,t], y_line[:,s,t]]
+            model.setAttr('LB', var[0:N_Index], link)
+            model.setAttr('UB', var[0:N_Index], link)
+            EvaluatePool['case'] = (s,t)
+        # Operating data, unused hours are empty
+        Data_load = np.zeros((Para.N_bus,Para.N_hour))
+        Data_gen  = np.zeros((Para.N_gen,Para.N_hour))
+        n_hour = len(batch)
+        Data_load[:,0:n_hour] = np.outer(Para.Load[:,t], State[batch,2])
+        Data_gen [:,0:n_hour] = Para.Gen[:,2:3] * State[batch][:,3 + gen_type].T
+        rhs_load = Data_load[index_load[:,0].astype(int),index_load[:,1].astype(int)] * index_load[:,2]
+        rhs_gen  = Data_gen [index_gen [:,0].astype(int),index_gen [:,1].astype(int)] * index_gen [:,2]
+        model.setAttr('RHS', con_load, rhs_load.tolist())
+        model.setAttr('RHS', con_gen , rhs_gen .tolist())
+        for [con,n,h,coeff] in model._xgen:
+            model.chgCoeff(con, var[N_X_gen + n], coeff * Data_gen[n,h])
+        model.optimize()
+        # Operating results
+        if model.status == GRB.Status.OPTIMAL:
+            value = np.array(model.getAttr('X',var[N_Index:]))
+            cost  = (value * obj).reshape((N_Var,Para.N_hour)) / Para.N_time
+            value = value.reshape((N_Var,Para.N_hour))
+            Output[batch,0] = cost.sum(axis = 0)[0:n_hour]
+            Output[batch,1] = value[N_C_load : N_C_load + Para.N_bus, 0:n_hour].sum(axis = 0)
+            Output[batch,2] = value[N_C_gen  : N_C_gen  + Para.N_gen, 0:n_hour].sum(axis = 0)
+            Output[batch,3] = 1
+        else:
+            Output[batch,0:3] = np.nan
+            Output[batch,3] = -1
+    return Output
+
+
+# This function evaluates a fixed plan over a large number of operating states,
+# e.g. those given by SampleState. States are divided into batches which are
+# evaluated in a spawned process pool, each process keeping one worker model
+#
+def EvaluatePlan(Para,Info,Res,State,n_process = 4,n_batch = 600):
+    plan = [Res.x_line, Res.x_conv, Res.x_sub, Res.x_gen, Res.y_line]
+    # Sort states so that each batch covers few stages and scenarios
+    order = np.lexsort((State[:,1],State[:,0]))
+    Batch = [State[order[k : k + n_batch]] for k in range(0, len(State), n_batch)]
+    if n_process > 1:
+        context = multiprocessing.get_context('spawn')
+        with context.Pool(n_process, initializer = EvaluateInit,
+                          initargs = (Para,Info,plan)) as pool:
+            Output = pool.map(EvaluateWorker,Batch)
+    else:
+        EvaluateInit(Para,Info,plan)
+        Output = [EvaluateWorker(batch) for batch in Batch]
+    # Restore the order of input states
+    Output = np.concatenate(Output)
+    result = np.zeros((len(State),4))
+    result[order] = Output
+    return ResultEvaluate(State,result)
 
 
-# This function creates the DSEP model using benders decomposition
+# This function creates the DSEP model using benders decomposition. Master
+# solutions in 'Point' are turned into cuts before optimization, and 'Start'
+# is used as the MIP start instead of the constructive heuristic if given
 #
-def BendersDSEP(MasterMILP,WorkerPool):
+def BendersDSEP(MasterMILP,WorkerPool,heuristic = 1,Point = [],Start = []):
     # Copy
     model = MasterMILP.copy()
     model._vars = model.getVars()
+    model._trouble = 0  # numerical trouble in the callback
+    model._point = []  # master solutions where cuts are generated
     # Set parameters
     model.Params.lazyConstraints = 1
     model.Params.MIPGap = 0.025
     model.Params.TimeLimit = 36000  # 6 hours
+    # Cuts of given master solutions
+    for Incumbent in Point:
+        BendersPoint(model,Incumbent,WorkerPool)
+    # MIP start from a given solution or a constructive heuristic
+    if Start == [] and heuristic == 1:
+        Start = HeuristicStart(Para,Info,model)
+    if Start != []:
+        Benders = BendersPoint(model,Start,WorkerPool)
+        if Benders != 0 and Benders.infeasible == []:
+            for i in range(Pre.N_free):
+                model._vars[i].Start = Start[i]
+            model._vars[-1].Start = Benders.obj
     # Optimize
     model.optimize(BendersCut)
-    # Result
-    if model.status == GRB.Status.OPTIMAL:
+    # Result, which is not reliable if any incumbent was not priced
+    if model.status == GRB.Status.OPTIMAL and model._trouble == 0:
         variable = [(model._vars[i]).x for i in range(len(model._vars))]
         result = ResultMasterMILP(model,Para,variable)
+        result.obj = model.ObjVal
+        result.gap = model.MIPGap
+        result.runtime = model.Runtime
+        result.start = variable  # for warm start
+        result.point = model._point
         return result
     else:
         return 0
 
 
+# This function returns the system parameter of a point in the sweep, where
+# 'Point' is a dict of {name: value}, e.g. {'Cost_load': 80, 'Int_rate': 0.06}.
+# Depreciation rates are updated with the interest rate
+#
+def SweepParameter(Para,Point):
+    para = copy.copy(Para)
+    for name,value in Point.items():
+        setattr(para,name,value)
+    para.Dep_line = Depreciation(25,para.Int_rate)
+    para.Dep_conv = Depreciation(20,para.Int_rate)
+    para.Dep_sub  = Depreciation(15,para.Int_rate)
+    para.Dep_gen  = Depreciation(15,para.Int_rate)
+    return para
+
+
+# This function updates the objective of all the worker problems in place with
+# the operating costs of the given parameter
+#
+def SweepWorker(Para,WorkerPool):
+    c = np.zeros(N_Var)
+    c[N_P_sub  : N_P_sub  + Para.N_sub] = Para.Cost_load
+    c[N_S_gen  : N_S_gen  + Para.N_gen] = Para.Cost_gen
+    c[N_C_gen  : N_C_gen  + Para.N_gen] = Para.Cost_cutgen
+    c[N_C_load : N_C_load + Para.N_bus] = Para.Cost_cutload
+    for worker in WorkerPool:
+        for model in (worker if isinstance(worker,list) else [worker]):
+            var = model.getVars()
+            n_hour = (len(var) - N_Index) // N_Var  # index of N_Index + n * n_hour + h
+            model.setAttr('Obj', var[N_Index:], np.repeat(c * Para.N_time, n_hour).tolist())
+            model.update()
+    for model in BatchPool:
+        BatchObj(model)
+
+
+# This function solves the planning model over a grid of parameters, e.g.
+#   Grid = [{'Cost_load': 60}, {'Cost_load': 70}, {'Cost_load': 80}]
+# Points are solved in order and each run is warm-started by the previous one:
+#   1) The previous plan is the MIP start
+#   2) The latest 'n_carry' master solutions of the previous run, where cuts
+#      were generated, are re-priced by the workers with the current costs and
+#      added as cuts. Duals of the old costs are not reused, since they may be
+#      infeasible for the workers with new costs
+# A table of parameters, costs and the number of investments in the last stage
+# is returned with the results of all points
+#
+def SweepDSEP(Grid,WorkerPool,heuristic = 1,n_carry = 20):
+    global Para
+    Base = Para
+    Name = sorted(set().union(*[point.keys() for point in Grid]))
+    Table = []
+    Result = []
+    Point = []
+    Start = []
+    for k in range(len(Grid)):
+        Para = SweepParameter(Base,Grid[k])
+        SweepWorker(Para,WorkerPool)
+        MasterMILP = createMasterMILP(Para,Info)
+        result = BendersDSEP(MasterMILP,WorkerPool,heuristic,Point,Start)
+        row = [getattr(Para,name) for name in Name]
+        if result != 0:
+            row.extend([result.obj, result.obj_con, result.obj_opr,
+                        result.gap, result.runtime])
+            row.extend([result.x_line[:,-1].sum(), result.x_conv[:,-1].sum(),
+                        result.x_sub [:,-1].sum(), result.x_gen [:,-1].sum()])
+            Point = result.point[-n_carry:]
+            Start = result.start
+        else:
+            row.extend([np.nan] * 9)
+        Table.append(row)
+        Result.append(result)
+    # Restore the base parameter
+    Para = Base
+    SweepWorker(Para,WorkerPool)
+    Name.extend(['obj','obj_con','obj_opr','gap','runtime',
+                 'n_line','n_conv','n_sub','n_gen'])
+    return [Name,np.array(Table),Result]
+
+
 # Main function
 if __name__ == "__main__":
 
@@ -837,19 +1805,30 @@ if __name__ == "__main__":
     WorkerPool = []
     for t in range(Para.N_stage):
         for s in range(Para.N_scene):
-            WorkerPool.append(createWorkerLP(Para,Info,s,t))
-    
+            if Para.Decompose == 1:  # hour-decomposed workers
+                WorkerPool.append([createWorkerLP(Para,Info,s,t,h) for h in range(Para.N_hour)])
+            else:
+                WorkerPool.append(createWorkerLP(Para,Info,s,t))
+    if Para.Batch > 0:  # batched worker LPs
+        BatchPool = createBatchLP(Para,WorkerPool,Para.Batch)
+
     # Benders decomposition
     Result_DSEP = BendersDSEP(MasterMILP,WorkerPool)
     
     # Save results
-    with open('result/result.csv', 'w', newline = '') as f:
-        writer = csv.writer(f)
-        writer.writerows(Result_DSEP.x_line.tolist())
-        writer.writerows(Result_DSEP.x_conv.tolist())
-        writer.writerows(Result_DSEP.x_sub .tolist())
-        writer.writerows(Result_DSEP.x_gen .tolist())
-        writer.writerows(Result_DSEP.y_line.tolist())
+    os.makedirs('result', exist_ok = True)  # output directory, not tracked
+    SaveResult('result/result.npz',Data,Result_DSEP)
+
+    # Out-of-sample evaluation
+    State = SampleState(Para,5000)
+    Result_Eval = EvaluatePlan(Para,Info,Result_DSEP,State)
+    print('Expected cost %.2f, load shedding %.4f, curtailment %.4f'
+          % tuple(Result_Eval.expect))
+
+    # Sensitivity of operating costs
+    # Grid = [{'Cost_load': cost} for cost in [60,70,80]]
+    # [Name,Table,Result] = SweepDSEP(Grid,WorkerPool)
+    # np.savetxt('result/sweep.csv',Table,delimiter = ',',header = ','.join(Name))
 
     # Plot
     # plot.Planning(Para,Result_DSEP,2)
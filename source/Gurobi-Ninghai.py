@@ -10,13 +10,20 @@
 # Master-problem
 
 
+import os
 import sys
 import math
 import xlrd
 import time
+import multiprocessing
 import numpy as np
 import matplotlib.pyplot as plt
 
+from matplotlib.figure import Figure
+from matplotlib.collections import LineCollection
+
+from scipy import sparse
+
 from gurobipy import *
 
 
@@ -33,6 +40,7 @@ class Parameter(object):
         self.N_time   = 90  # number of times
         self.Int_rate = 0.05  # interest rate
         self.Big_M = 500  # Big M
+        self.Tight_M = 1  # per-line Big M (1) or uniform Big M (0)
         self.Factor = [0.95,math.sqrt(1-0.95**2)]  # power factor
         self.Voltage = 35
         self.Voltage_low = 35 * 0.95
@@ -60,6 +68,8 @@ class Parameter(object):
         self.Line_R = self.Line[:,4]
         self.Line_X = self.Line[:,5]
         self.Line_S = self.Line[:,6:8]
+        self.Line_S_max = (self.Line_S).sum(axis = 1)
+        [self.Big_M_V,self.Big_M_S] = BigM(self)
         self.Dep_line = Depreciation(25,self.Int_rate)
         # Converter station
         self.Conv = Data[2]
@@ -107,16 +117,210 @@ class BusInfo(object):
         self.Conv_tail = Conv_tail
 
 
+# This class builds the operating constraints of one hour as a sparse template.
+# The constraints of all hours, scenarios and stages share the same matrix, and
+# only the load and renewable data change. Columns of the template are:
+#   [Var of the hour, x_line, x_conv, x_sub, x_gen (of the stage), y_line]
+# The right-hand side is b0 + B_load * Data_load + B_gen * Data_gen, and the
+# coefficient of x_gen in the renewable equation is A_gen * Data_gen. Rows are
+# in the same order as the constraints written term by term
+#
+class OperatingBlock(object):
+    def __init__(self,Para,Info):
+        # Index of operating variables
+        N_V_bus  = 0  # Square of bus voltage
+        N_P_line = N_V_bus  + Para.N_bus   # power flow (active)
+        N_Q_line = N_P_line + Para.N_line  # power flow (reactive)
+        N_P_conv = N_Q_line + Para.N_line  # power conversion (active)
+        N_Q_conv = N_P_conv + Para.N_conv  # power conversion (reactive)
+        N_P_sub  = N_Q_conv + Para.N_conv  # power injection at substation (active)
+        N_Q_sub  = N_P_sub  + Para.N_sub   # power injection at substation (reactive)
+        N_C_load = N_Q_sub  + Para.N_sub   # Load shedding
+        N_S_gen  = N_C_load + Para.N_bus   # renewables generation
+        N_C_gen  = N_S_gen  + Para.N_gen   # renewables curtailment
+        N_Var    = N_C_gen  + Para.N_gen   # Number of all variables
+        # Index of linking variables
+        N_x_line = N_Var
+        N_x_conv = N_x_line + Para.N_line
+        N_x_sub  = N_x_conv + Para.N_conv
+        N_x_gen  = N_x_sub  + Para.N_sub
+        N_y_line = N_x_gen  + Para.N_gen
+        N_Col    = N_y_line + Para.N_line
+        self.N_Var = N_Var
+        self.N_x   = N_y_line - N_Var  # number of investment variables
+        # Cost of operating variables in one hour
+        self.c = np.zeros(N_Var)
+        self.c[N_P_sub  : N_P_sub  + Para.N_sub] = Para.Cost_load    * Para.N_time
+        self.c[N_S_gen  : N_S_gen  + Para.N_gen] = Para.Cost_gen     * Para.N_time
+        self.c[N_C_gen  : N_C_gen  + Para.N_gen] = Para.Cost_cutgen  * Para.N_time
+        self.c[N_C_load : N_C_load + Para.N_bus] = Para.Cost_cutload * Para.N_time
+        # Template
+        self.row, self.col, self.val = [],[],[]
+        self.sense, self.b0 = [],[]
+        self.load = [[],[],[]]  # row, bus, coefficient
+        self.gen  = [[],[],[]]  # row, renewables, coefficient
+        self.xgen = [[],[],[]]  # row, renewables, coefficient
+        M_V = Para.Big_M_V  # Big M of voltage drop
+        M_S = Para.Big_M_S  # Big M of power flow
+        # 1.Active power balance equation
+        for n in range(Para.N_bus):
+            expr = {}
+            for i in Info.Line_head[n]: expr[N_P_line + i] = -1
+            for i in Info.Line_tail[n]: expr[N_P_line + i] =  1
+            for i in Info.Conv_head[n]: expr[N_P_conv + i] = -1
+            for i in Info.Conv_tail[n]: expr[N_P_conv + i] =  1
+            if Para.Bus[n,7] == 0:  # AC bus
+                expr[N_C_load + n] = Para.Factor[0]
+            if Para.Bus[n,7] == 1:  # DC bus
+                expr[N_C_load + n] = 1.0
+            if n in Para.Sub[:,1]:
+                bus_no = np.where(n == Para.Sub[:,1])[0][0]
+                expr[N_P_sub + bus_no] = 1
+            if n in Para.Gen[:,1]:
+                bus_no = np.where(n == Para.Gen[:,1])[0][0]
+                if Para.Gen[bus_no,6] == 1:
+                    expr[N_S_gen + bus_no] = 1.0
+                else:
+                    expr[N_S_gen + bus_no] = Para.Factor[0]
+            if Para.Bus[n,7] == 0:  # AC bus
+                self.Add(expr,'=',0,load = [n,Para.Factor[0]])
+            if Para.Bus[n,7] == 1:  # DC bus
+                self.Add(expr,'=',0,load = [n,1.0])
+        # 2.Reactive power balance equation
+        for n in range(Para.N_bus):
+            expr = {}
+            for i in Info.Line_head[n]: expr[N_Q_line + i] = -1
+            for i in Info.Line_tail[n]: expr[N_Q_line + i] =  1
+            if Para.Bus[n,7] == 0:  # AC bus
+                for i in Info.Conv_head[n]: expr[N_Q_conv + i] = -1
+                for i in Info.Conv_tail[n]: expr[N_Q_conv + i] =  1
+                expr[N_C_load + n] = Para.Factor[1]
+            if n in Para.Sub[:,1]:
+                bus_no = np.where(n == Para.Sub[:,1])[0][0]
+                expr[N_Q_sub + bus_no] = 1
+            if n in Para.Gen[:,1]:
+                bus_no = np.where(n == Para.Gen[:,1])[0][0]
+                if Para.Gen[bus_no,6] != 1:
+                    expr[N_S_gen + bus_no] = Para.Factor[1]
+            if Para.Bus[n,7] == 0:  # AC bus
+                self.Add(expr,'=',0,load = [n,Para.Factor[1]])
+            if Para.Bus[n,7] == 1:  # DC bus
+                self.Add(expr,'=',0)
+        # 3.Voltage balance on line
+        for n in range(Para.N_line):
+            bus_head = int(round(Para.Line[n,1]))
+            bus_tail = int(round(Para.Line[n,2]))
+            expr = {N_V_bus + bus_head: 1, N_V_bus + bus_tail: -1,
+                    N_P_line + n: -2 * Para.Line_R[n],
+                    N_Q_line + n: -2 * Para.Line_X[n]}
+            self.Add({**expr, N_y_line + n: -M_V[n]},'>',-M_V[n])
+            self.Add({**expr, N_y_line + n:  M_V[n]},'<', M_V[n])
+        # 4.Renewable generation
+        for n in range(Para.N_gen):
+            expr = {N_S_gen + n: 1, N_C_gen + n: 1}
+            self.Add(expr,'=',0,xgen = [n,-1])
+        # 5.Linearization of quadratic terms in line equations
+        for sign in [1,-1]:
+            for n in range(Para.N_line):
+                expr = {N_P_line + n: 1, N_Q_line + n: sign}
+                S_0 = 1.414 * Para.Line_S[n,0]
+                S_1 = 1.414 * Para.Line_S[n,1]
+                self.Add({**expr, N_x_line + n:  S_1},'>',-S_0)
+                self.Add({**expr, N_x_line + n: -S_1},'<', S_0)
+                self.Add({**expr, N_y_line + n:  1.414 * M_S[n]},'>',0)
+                self.Add({**expr, N_y_line + n: -1.414 * M_S[n]},'<',0)
+        # 6.Linearization of quadratic terms in converter equations
+        for sign in [1,-1]:
+            for n in range(Para.N_conv):
+                expr = {N_P_conv + n: 1, N_Q_conv + n: sign}
+                S_1 = 1.414 * Para.Conv[n,3]
+                self.Add({**expr, N_x_conv + n:  S_1},'>',0)
+                self.Add({**expr, N_x_conv + n: -S_1},'<',0)
+        # 7.Linearization of quadratic terms in substation equations
+        for sign in [1,-1]:
+            for n in range(Para.N_sub):
+                expr = {N_P_sub + n: 1, N_Q_sub + n: sign}
+                S_0 = 1.414 * Para.Sub_S[n,0]
+                S_1 = 1.414 * Para.Sub_S[n,1]
+                self.Add(expr,'>',0)
+                self.Add({**expr, N_x_sub + n: -S_1},'<',S_0)
+        # 8.Bounds of variables
+        # 1) Voltage
+        for n in range(Para.N_bus):
+            self.Add({N_V_bus + n: 1},'>',Para.Voltage_low ** 2)
+            self.Add({N_V_bus + n: 1},'<',Para.Voltage_upp ** 2)
+        # 2) Power flow
+        for n in range(Para.N_line):
+            self.Add({N_P_line + n: 1, N_y_line + n:  M_S[n]},'>',0)
+            self.Add({N_P_line + n: 1, N_y_line + n: -M_S[n]},'<',0)
+            self.Add({N_P_line + n: 1, N_x_line + n:  Para.Line_S[n,1]},'>',-Para.Line_S[n,0])
+            self.Add({N_P_line + n: 1, N_x_line + n: -Para.Line_S[n,1]},'<', Para.Line_S[n,0])
+        for n in range(Para.N_line):
+            if Para.Line[n,9] == 0:
+                self.Add({N_Q_line + n: 1, N_y_line + n:  M_S[n]},'>',0)
+                self.Add({N_Q_line + n: 1, N_y_line + n: -M_S[n]},'<',0)
+                self.Add({N_Q_line + n: 1, N_x_line + n:  Para.Line_S[n,1]},'>',-Para.Line_S[n,0])
+                self.Add({N_Q_line + n: 1, N_x_line + n: -Para.Line_S[n,1]},'<', Para.Line_S[n,0])
+            if Para.Line[n,9] == 1:
+                self.Add({N_Q_line + n: 1},'=',0)
+        # 3) Converter
+        for N_conv in [N_P_conv,N_Q_conv]:
+            for n in range(Para.N_conv):
+                self.Add({N_conv + n: 1, N_x_conv + n:  Para.Conv[n,3]},'>',0)
+                self.Add({N_conv + n: 1, N_x_conv + n: -Para.Conv[n,3]},'<',0)
+        # 4) Substation
+        for N_sub in [N_P_sub,N_Q_sub]:
+            for n in range(Para.N_sub):
+                self.Add({N_sub + n: 1},'>',0)
+                self.Add({N_sub + n: 1, N_x_sub + n: -Para.Sub_S[n,1]},'<',Para.Sub_S[n,0])
+        # 5) Load shedding
+        for n in range(Para.N_bus):
+            self.Add({N_C_load + n: 1},'>',0)
+            self.Add({N_C_load + n: 1},'<',0,load = [n,1.0])
+        # 6) Renewables
+        for N_gen in [N_S_gen,N_C_gen]:
+            for n in range(Para.N_gen):
+                self.Add({N_gen + n: 1},'>',0)
+                self.Add({N_gen + n: 1},'<',0,gen = [n,1.0])
+        # Sparse matrices
+        N_row = len(self.b0)
+        self.A = sparse.csr_matrix((self.val,(self.row,self.col)),shape = (N_row,N_Col))
+        self.A_gen  = sparse.coo_matrix((self.xgen[2],(self.xgen[0],self.xgen[1])),
+                                        shape = (N_row,Para.N_gen))
+        self.B_load = sparse.csr_matrix((self.load[2],(self.load[0],self.load[1])),
+                                        shape = (N_row,Para.N_bus))
+        self.B_gen  = sparse.csr_matrix((self.gen [2],(self.gen [0],self.gen [1])),
+                                        shape = (N_row,Para.N_gen))
+        self.sense = np.array(self.sense)
+        self.b0 = np.array(self.b0)
+        del self.row, self.col, self.val, self.load, self.gen, self.xgen
+    # Add a row: expr (sense) rhs, where expr is a dict of {column: coefficient}
+    def Add(self,expr,sense,rhs,load = [],gen = [],xgen = []):
+        n_row = len(self.b0)
+        for col,val in expr.items():
+            if val != 0:
+                self.row.append(n_row)
+                self.col.append(col)
+                self.val.append(val)
+        for [data,item] in [[self.load,load],[self.gen,gen],[self.xgen,xgen]]:
+            if item != []:
+                data[0].append(n_row)
+                data[1].append(item[0])
+                data[2].append(item[1])
+        self.sense.append(sense)
+        self.b0.append(rhs)
+
+
 # This class restores the results of planning master problem
 class ResultPlanning(object):
     def __init__(self,model,Para,x_line,x_conv,x_sub,x_gen,y_line,
                  obj_con,obj_opr):
         # Variables
-        self.x_line = GurobiValue(x_line,'integer')
-        self.x_conv = GurobiValue(x_conv,'integer')
-        self.x_sub  = GurobiValue(x_sub, 'integer')
-        self.x_gen  = GurobiValue(x_gen, 'integer')
-        self.y_line = GurobiValue(y_line,'integer')
+        self.x_line = GurobiValue(model,x_line,'integer')
+        self.x_conv = GurobiValue(model,x_conv,'integer')
+        self.x_sub  = GurobiValue(model,x_sub, 'integer')
+        self.x_gen  = GurobiValue(model,x_gen, 'integer')
+        self.y_line = GurobiValue(model,y_line,'integer')
         # Objective
         self.obj_con = obj_con.getValue()
         self.obj_opr = obj_opr.getValue()
@@ -130,7 +334,7 @@ class ResultReconfig(object):
         # Saving objective
         self.obj = (model.getObjective()).getValue()
         # Saving variables
-        var = GurobiValue(Var)
+        var = GurobiValue(model,Var)
         self.V_bus  = var[N_V_bus  : N_V_bus  + Para.N_bus, :]
         self.P_line = var[N_P_line : N_P_line + Para.N_line,:]
         self.Q_line = var[N_Q_line : N_Q_line + Para.N_line,:]
@@ -170,53 +374,82 @@ class BendersInfo(object):
         self.obj = 0
 
 
-# This class restores the 'plot' function
+# This class restores the 'plot' function. A figure is shown on the screen, or
+# saved to a file if the filename is given. Batch renders the planning of all
+# stages and the reconfiguration of all scenarios into files in a process pool,
+# which does not need a display
 class PlotFunc(object):
     def __init__(self,Para):
         pass
-    def Planning(self,Para,Res,t):
-        x_line = Res.x_line[:,t]
-        x_conv = Res.x_conv[:,t]
-        for n in range(Para.N_line):
-            if Para.Line[n,6] > 0:
-                x_line[n] = 1
-        self.Plot_Figure(Para,x_line,x_conv)
-    def Reconfig(self,Para,Res,s,t):
+    def Planning(self,Para,Res,t,filename = ''):
+        [x_line,x_conv] = self.Planning_State(Para,Res,t)
+        self.Plot_Figure(Para,x_line,x_conv,filename)
+    def Reconfig(self,Para,Res,s,t,filename = ''):
         y_line = Res.y_line[:,s,t]
         x_conv = Res.x_conv[:,t]
-        self.Plot_Figure(Para,y_line,x_conv)
-    def Plot_Figure(self,Para,Line,Conv):
-        x = Para.Bus[:,2]
-        y = Para.Bus[:,3]
-        for n in range(Para.N_bus):  # Bus
-            if Para.Bus[n,7] == 1:
-                y[n] = y[n] - 150
-        for n in range(Para.N_bus):  # Bus
-            plt.text(x[n] + 3, y[n] + 3, '%s'%n)
-            if n in Para.Sub[:,1]:
-                plt.plot(x[n],y[n],'rs')
-            else:
-                plt.plot(x[n],y[n],'b.')
-        for n in range(Para.N_line):  # lines
-            x1 = x[int(round(Para.Line[n,1]))]
-            y1 = y[int(round(Para.Line[n,1]))]
-            x2 = x[int(round(Para.Line[n,2]))]
-            y2 = y[int(round(Para.Line[n,2]))]
-            if Line[n] == 1:
-                if Para.Line[n,9] == 0:
-                    plt.plot([x1,x2],[y1,y2],'r-')
-                if Para.Line[n,9] == 1:
-                    plt.plot([x1,x2],[y1,y2],'b-')
-            else:
-                plt.plot([x1,x2],[y1,y2],'b--')
-        for n in range(Para.N_conv):  # converters
-            if Conv[n] == 1:
-                head = int(round(Para.Conv[n,1]))
-                tail = int(round(Para.Conv[n,2]))
-                plt.plot(x[head],y[head],'bs')
-                plt.plot(x[tail],y[tail],'bs')
-        plt.axis('equal')
-        plt.show()
+        self.Plot_Figure(Para,y_line,x_conv,filename)
+    def Batch(self,Para,Res,path,form = 'png',n_process = 4):
+        os.makedirs(path,exist_ok = True)
+        task = []
+        for t in range(Para.N_stage):
+            [x_line,x_conv] = self.Planning_State(Para,Res,t)
+            filename = os.path.join(path,'planning-%d.%s' % (t,form))
+            task.append((Para,x_line,x_conv,filename))
+            for s in range(Para.N_scene):
+                filename = os.path.join(path,'reconfig-%d-%d.%s' % (s,t,form))
+                task.append((Para,Res.y_line[:,s,t],x_conv,filename))
+        context = multiprocessing.get_context('spawn')
+        with context.Pool(n_process) as pool:
+            pool.starmap(PlotFile,task)
+    def Planning_State(self,Para,Res,t):
+        x_line = (Res.x_line[:,t]).copy()
+        x_conv = (Res.x_conv[:,t]).copy()
+        x_line[Para.Line[:,6] > 0] = 1  # existing line
+        return [x_line,x_conv]
+    def Plot_Figure(self,Para,Line,Conv,filename = ''):
+        if filename == '':
+            fig = plt.figure()
+            PlotTopology(fig.add_subplot(111),Para,Line,Conv)
+            plt.show()
+        else:
+            PlotFile(Para,Line,Conv,filename)
+
+
+# This function draws the topology on the axes. Buses are drawn by scatter and
+# lines by one LineCollection. Lines in service are solid (AC in red and DC in
+# blue) and other lines are dashed
+#
+def PlotTopology(ax,Para,Line,Conv):
+    x = (Para.Bus[:,2]).copy()
+    y = (Para.Bus[:,3]).copy()
+    y[Para.Bus[:,7] == 1] = y[Para.Bus[:,7] == 1] - 150  # DC bus
+    sub = np.isin(np.arange(Para.N_bus),Para.Sub[:,1])
+    for n in range(Para.N_bus):  # Bus
+        ax.text(x[n] + 3, y[n] + 3, '%s'%n)
+    ax.scatter(x[~sub],y[~sub],s = 10,c = 'b',marker = '.')
+    ax.scatter(x[ sub],y[ sub],s = 30,c = 'r',marker = 's')
+    head = np.round(Para.Line[:,1]).astype(int)
+    tail = np.round(Para.Line[:,2]).astype(int)
+    segment = np.stack([np.c_[x[head],y[head]],np.c_[x[tail],y[tail]]],axis = 1)
+    state = np.array(Line) == 1
+    color = np.where(state & (Para.Line[:,9] == 0),'r','b')
+    style = np.where(state,'solid','dashed')
+    ax.add_collection(LineCollection(segment,colors = color.tolist(),
+                                     linestyles = style.tolist()))
+    conv = Para.Conv[np.array(Conv) == 1]  # converters
+    node = np.round(np.r_[conv[:,1],conv[:,2]]).astype(int)
+    ax.scatter(x[node],y[node],s = 30,c = 'b',marker = 's')
+    ax.autoscale_view()
+    ax.axis('equal')
+
+
+# This function renders the topology into a file. The figure is not managed by
+# pyplot, so no display is needed and the memory is released after saving
+#
+def PlotFile(Para,Line,Conv,filename):
+    fig = Figure()
+    PlotTopology(fig.add_subplot(111),Para,Line,Conv)
+    fig.savefig(filename)
 
 
 # This function input data from Excel files. The filtname can be changed 
@@ -251,6 +484,22 @@ def Matrix_slice(Matrix,Coordinate):
     return Matrix_partitioned
 
 
+# This function computes the Big M of each line, i.e. the tightest values for
+# constraints relaxed by y_line when line is switched off. The flow of a line
+# which is switched off is zero, so terms of R and X vanish and
+#   1) Voltage drop: |V_i - V_j - 2*(R*P + X*Q)| <= V_upp^2 - V_low^2
+#   2) Power flow: |P|, |Q| <= S_max, the capacity with investment
+# If Tight_M = 0, the uniform Big_M is used for benchmarking
+#
+def BigM(Para):
+    Big_M_V = np.ones(Para.N_line) * (Para.Voltage_upp ** 2 - Para.Voltage_low ** 2)
+    Big_M_S = Para.Line_S_max.copy()
+    if Para.Tight_M == 0:
+        Big_M_V = np.ones(Para.N_line) * Para.Big_M
+        Big_M_S = np.ones(Para.N_line) * Para.Big_M
+    return [Big_M_V,Big_M_S]
+
+
 # This function creates a depreciation calculator
 #
 def Depreciation(life,rate):
@@ -258,41 +507,26 @@ def Depreciation(life,rate):
     return recovery
 
 
-# This function get the value of gurobi variables
-def GurobiValue(var,string = 'continuous'):
+# This function get the value of gurobi variables. The values are retrieved in
+# one call and placed into a matrix by the index of keys (1-D to 4-D)
+#
+def GurobiValue(model,var,string = 'continuous'):
     key = var.keys()
-    cpy = var.copy()
-    dim = key._tuplelist__tuplelen  # dimention
-    for i in range(len(key)):
-        if string == 'integer':
-            cpy[key[i]] = int(round(var[key[i]].x))
-        else:
-            cpy[key[i]] = var[key[i]].x
-    if dim == 1:
-        dim_1 = len(key.select('*'))
-        matrix_var = np.zeros(dim_1)
-        for i in range(dim_1):
-            matrix_var[i] = cpy[i]
-    if dim == 2:
-        dim_1 = len(key.select('*',0))
-        dim_2 = len(key.select(0,'*'))
-        matrix_var = np.zeros((dim_1,dim_2))
-        for i in range(dim_1):
-            for j in range(dim_2):
-                matrix_var[i,j] = cpy[i,j]
-    if dim == 3:
-        dim_1 = len(key.select('*',0,0))
-        dim_2 = len(key.select(0,'*',0))
-        dim_3 = len(key.select(0,0,'*'))
-        matrix_var = np.zeros((dim_1,dim_2,dim_3))
-        for i in range(dim_1):
-            for j in range(dim_2):
-                for k in range(dim_3):
-                    matrix_var[i,j,k] = cpy[i,j,k]
+    # Values of all variables are retrieved in one call
+    value = np.array(model.getAttr('X', var.values()))
+    if string == 'integer':
+        value = np.round(value)
+    # Dimensions are known from the largest index of keys
+    index = np.array([k for k in key], dtype = int)
+    if index.ndim == 1:  # 1-D tupledict with scalar keys
+        index = index.reshape(-1,1)
+    shape = tuple(index.max(axis = 0) + 1)
+    matrix_var = np.zeros(shape)
+    matrix_var[tuple(index.T)] = value
     return matrix_var
 
 
-def Planning(Para,Info):
+def Planning(Para,Info,Scene = [],Fix = [],Res = 0):
     #
     # minimize
     #       Investment costs of line, converter, substation and
@@ -301,6 +535,13 @@ def Planning(Para,Info):
     #       1) ...
     #       2) ...
     #
+    # Scene is the list of operating scenarios [s,t,w] modeled with weight w. By
+    # default all scenarios of all stages are modeled, i.e. the extensive form.
+    # Investments of stages in Fix are fixed to the solution in Res
+    #
+    if Scene == []:
+        Scene = [[s,t,1] for t in range(Para.N_stage) for s in range(Para.N_scene)]
+    Key = tuplelist([(s,t) for [s,t,w] in Scene])  # index of scenarios
     model = Model()
 
     # Investment variables
@@ -309,15 +550,15 @@ def Planning(Para,Info):
     x_sub  = model.addVars(Para.N_sub,  Para.N_stage, vtype = GRB.BINARY)
     x_gen  = model.addVars(Para.N_gen,  Para.N_stage, vtype = GRB.BINARY)
     # Reconfiguration variables
-    y_line = model.addVars(Para.N_line, Para.N_scene, Para.N_stage, vtype = GRB.BINARY)
-    y_pos  = model.addVars(Para.N_line, Para.N_scene, Para.N_stage, vtype = GRB.BINARY)
-    y_neg  = model.addVars(Para.N_line, Para.N_scene, Para.N_stage, vtype = GRB.BINARY)
+    y_line = model.addVars(Para.N_line, Key, vtype = GRB.BINARY)
+    y_pos  = model.addVars(Para.N_line, Key, vtype = GRB.BINARY)
+    y_neg  = model.addVars(Para.N_line, Key, vtype = GRB.BINARY)
     # Fictitious power flow variables
-    f_line = model.addVars(Para.N_line, Para.N_scene, Para.N_stage, lb = -1e2)
-    f_conv = model.addVars(Para.N_conv, Para.N_scene, Para.N_stage, lb = -1e2)
-    f_load = model.addVars(Para.N_bus,  Para.N_scene, Para.N_stage, lb = -1e2)
-    f_gen  = model.addVars(Para.N_gen,  Para.N_scene, Para.N_stage, lb = -1e2)
-    f_sub  = model.addVars(Para.N_sub,  Para.N_scene, Para.N_stage, lb = -1e2)
+    f_line = model.addVars(Para.N_line, Key, lb = -1e2)
+    f_conv = model.addVars(Para.N_conv, Key, lb = -1e2)
+    f_load = model.addVars(Para.N_bus,  Key, lb = -1e2)
+    f_gen  = model.addVars(Para.N_gen,  Key, lb = -1e2)
+    f_sub  = model.addVars(Para.N_sub,  Key, lb = -1e2)
 
     # Operating variables
     N_V_bus  = 0  # Square of bus voltage
@@ -331,7 +572,8 @@ def Planning(Para,Info):
     N_S_gen  = N_C_load + Para.N_bus   # renewables generation
     N_C_gen  = N_S_gen  + Para.N_gen   # renewables curtailment
     N_Var    = N_C_gen  + Para.N_gen   # Number of all variables
-    Var = model.addVars(N_Var, Para.N_hour, Para.N_scene, Para.N_stage, lb = -GRB.INFINITY)
+    Var = model.addVars(N_Var, Para.N_hour, Key, lb = -GRB.INFINITY)
+    Block = OperatingBlock(Para,Info)  # template of operating constraints
 
     # Set objective
     obj_con = LinExpr()
@@ -349,16 +591,21 @@ def Planning(Para,Info):
             obj_con = obj_con + RR * x_gen [n,t] * Para.Gen [n][3] * Para.Dep_gen
 
     obj_opr = LinExpr()
-    for t in range(Para.N_stage):
-        for s in range(Para.N_scene):
-            for h in range(Para.N_hour):
-                for n in range(Para.N_sub):
-                    obj_opr = obj_opr + Var[N_P_sub  + n,h,s,t] * Para.Cost_load * Para.N_time
-                for n in range(Para.N_gen):
-                    obj_opr = obj_opr + Var[N_S_gen  + n,h,s,t] * Para.Cost_gen * Para.N_time
-                    obj_opr = obj_opr + Var[N_C_gen  + n,h,s,t] * Para.Cost_cutgen * Para.N_time
-                for n in range(Para.N_bus):
-                    obj_opr = obj_opr + Var[N_C_load + n,h,s,t] * Para.Cost_cutload * Para.N_time
+    index = np.where(Block.c != 0)[0]
+    for [s,t,w] in Scene:
+        for h in range(Para.N_hour):
+            obj_opr.addTerms((Block.c[index] * w).tolist(),[Var[n,h,s,t] for n in index])
+
+    # Fixed investments
+    for t in Fix:
+        for n in range(Para.N_line):
+            x_line[n,t].LB = x_line[n,t].UB = Res.x_line[n,t]
+        for n in range(Para.N_conv):
+            x_conv[n,t].LB = x_conv[n,t].UB = Res.x_conv[n,t]
+        for n in range(Para.N_sub):
+            x_sub [n,t].LB = x_sub [n,t].UB = Res.x_sub [n,t]
+        for n in range(Para.N_gen):
+            x_gen [n,t].LB = x_gen [n,t].UB = Res.x_gen [n,t]
 
     # Constraint 1 (installation)
     for t in range(Para.N_stage-1):
@@ -368,75 +615,71 @@ def Planning(Para,Info):
         model.addConstrs(x_gen [n,t] <= x_gen [n,t+1] for n in range(Para.N_gen ))
     
     # Constraint 2 (reconfiguration)
-    for t in range(Para.N_stage):
-        for s in range(Para.N_scene):
-            for n in range(Para.N_line):
-                if Para.Line[n,6] > 0:  # existing line
-                    model.addConstr(y_line[n,s,t] <= 1)
-                else:  # expandable line
-                    if Para.Line[n,9] == 0:  # AC line
-                        model.addConstr(y_line[n,s,t] <= x_line[n,t])
-                    if Para.Line[n,9] == 1:  # DC line
-                        model.addConstr(y_line[n,s,t] == x_line[n,t])
-    
+    for [s,t,w] in Scene:
+        for n in range(Para.N_line):
+            if Para.Line[n,6] > 0:  # existing line
+                model.addConstr(y_line[n,s,t] <= 1)
+            else:  # expandable line
+                if Para.Line[n,9] == 0:  # AC line
+                    model.addConstr(y_line[n,s,t] <= x_line[n,t])
+                if Para.Line[n,9] == 1:  # DC line
+                    model.addConstr(y_line[n,s,t] == x_line[n,t])
+
     # Constraint 3 (fictitious power flow initialization)
-    for t in range(Para.N_stage):
-        for s in range(Para.N_scene):
-            for n in range(Para.N_bus):
-                if Para.Load[n,t] > 0:  # load bus
-                    model.addConstr(f_load[n,s,t] == 1)
-                else:  # none load bus
-                    model.addConstr(f_load[n,s,t] == 0)
-            for n in range(Para.N_line):
-                model.addConstr(f_line[n,s,t] >= -100 * y_line[n,s,t])
-                model.addConstr(f_line[n,s,t] <=  100 * y_line[n,s,t])
-            for n in range(Para.N_conv):
-                model.addConstr(f_conv[n,s,t] >= -100 * x_conv[n,t])
-                model.addConstr(f_conv[n,s,t] <=  100 * x_conv[n,t])
-            for n in range(Para.N_sub):
-                model.addConstr(f_sub [n,s,t] >=  0)
-                model.addConstr(f_sub [n,s,t] <=  100)
-            for n in range(Para.N_gen):
-                model.addConstr(f_gen [n,s,t] ==  x_gen[n,t])
-    
+    for [s,t,w] in Scene:
+        for n in range(Para.N_bus):
+            if Para.Load[n,t] > 0:  # load bus
+                model.addConstr(f_load[n,s,t] == 1)
+            else:  # none load bus
+                model.addConstr(f_load[n,s,t] == 0)
+        for n in range(Para.N_line):
+            model.addConstr(f_line[n,s,t] >= -100 * y_line[n,s,t])
+            model.addConstr(f_line[n,s,t] <=  100 * y_line[n,s,t])
+        for n in range(Para.N_conv):
+            model.addConstr(f_conv[n,s,t] >= -100 * x_conv[n,t])
+            model.addConstr(f_conv[n,s,t] <=  100 * x_conv[n,t])
+        for n in range(Para.N_sub):
+            model.addConstr(f_sub [n,s,t] >=  0)
+            model.addConstr(f_sub [n,s,t] <=  100)
+        for n in range(Para.N_gen):
+            model.addConstr(f_gen [n,s,t] ==  x_gen[n,t])
+
     # Constraint 4 (connectivity)
-    for t in range(Para.N_stage):
-        for s in range(Para.N_scene):
-            for i in range(Para.N_bus):
-                line_head = Info.Line_head[i]
-                line_tail = Info.Line_tail[i]
-                conv_head = Info.Conv_head[i]
-                conv_tail = Info.Conv_tail[i]
-                expr = LinExpr()
-                expr = expr + f_load[i,s,t]
-                expr = expr + quicksum(f_line[n,s,t] for n in line_head)
-                expr = expr - quicksum(f_line[n,s,t] for n in line_tail)
-                expr = expr + quicksum(f_conv[n,s,t] for n in conv_head)
-                expr = expr - quicksum(f_conv[n,s,t] for n in conv_tail)
-                if i in Para.Sub[:,1]:
-                    bus_no = int(np.where(i == Para.Sub[:,1])[0])
-                    expr = expr - f_sub[bus_no,s,t]
-                if i in Para.Gen[:,1]:
-                    bus_no = int(np.where(i == Para.Gen[:,1])[0])
-                    expr = expr + f_gen[bus_no,s,t]
-                model.addConstr(expr == 0)
-    
+    for [s,t,w] in Scene:
+        for i in range(Para.N_bus):
+            line_head = Info.Line_head[i]
+            line_tail = Info.Line_tail[i]
+            conv_head = Info.Conv_head[i]
+            conv_tail = Info.Conv_tail[i]
+            expr = LinExpr()
+            expr = expr + f_load[i,s,t]
+            expr = expr + quicksum(f_line[n,s,t] for n in line_head)
+            expr = expr - quicksum(f_line[n,s,t] for n in line_tail)
+            expr = expr + quicksum(f_conv[n,s,t] for n in conv_head)
+            expr = expr - quicksum(f_conv[n,s,t] for n in conv_tail)
+            if i in Para.Sub[:,1]:
+                bus_no = int(np.where(i == Para.Sub[:,1])[0])
+                expr = expr - f_sub[bus_no,s,t]
+            if i in Para.Gen[:,1]:
+                bus_no = int(np.where(i == Para.Gen[:,1])[0])
+                expr = expr + f_gen[bus_no,s,t]
+            model.addConstr(expr == 0)
+
     # Constraint 5 (cradial topology)
-    for t in range(Para.N_stage):
-        for s in range(Para.N_scene):
-            for i in range(Para.N_bus_AC):
-                line_head = Info.Line_head[i]
-                line_tail = Info.Line_tail[i]
-                expr = LinExpr()
-                expr = expr + quicksum(y_pos[n,s,t] for n in line_tail)
-                expr = expr + quicksum(y_neg[n,s,t] for n in line_head)
-                if Para.Load[i,t] > 0:  # load bus
-                    model.addConstr(expr == 1)
-                else:  # none load bus
-                    model.addConstr(expr == 0)
-            for n in range(Para.N_line):
-                model.addConstr(y_pos[n,s,t] + y_neg[n,s,t] == y_line[n,s,t])
-    
+    for [s,t,w] in Scene:
+        for i in range(Para.N_bus_AC):
+            line_head = Info.Line_head[i]
+            line_tail = Info.Line_tail[i]
+            expr = LinExpr()
+            expr = expr + quicksum(y_pos[n,s,t] for n in line_tail)
+            expr = expr + quicksum(y_neg[n,s,t] for n in line_head)
+            if Para.Load[i,t] > 0:  # load bus
+                model.addConstr(expr == 1)
+            else:  # none load bus
+                model.addConstr(expr == 0)
+        for n in range(Para.N_line):
+            model.addConstr(y_pos[n,s,t] + y_neg[n,s,t] == y_line[n,s,t])
+
     # Constraint 6 (renewable generation)
     for t in range(Para.N_stage):
         for n in range(Para.N_gen):
@@ -446,192 +689,52 @@ def Planning(Para,Info):
                 model.addConstr(x_gen[n,t] == 0)
 
     # Operating constraints
+    # The template of one hour is replicated over all hours and scenarios in a
+    # block-diagonal matrix, with investment and reconfiguration variables of
+    # the corresponding stage and scenario as linking columns
+    N_block = len(Scene) * Para.N_hour
+    Data_load = np.zeros((N_block,Para.N_bus))
+    Data_gen  = np.zeros((N_block,Para.N_gen))
+    Sel_x = np.zeros((N_block,Para.N_stage))  # stage of each block
+    Sel_y = np.zeros((N_block,len(Scene)))    # scenario of each block
+    gen_type = Para.Gen[:,6].astype(int)  # type of renewables
+    Column = []
+    for k in range(len(Scene)):
+        [s,t,w] = Scene[k]
+        for h in range(Para.N_hour):
+            b = k * Para.N_hour + h
+            index_hour = s * Para.N_hour + h
+            Data_load[b,:] = Para.Load[:,t] * Para.Ty_load[index_hour]
+            Data_gen [b,:] = Para.Gen [:,2] * Para.Ty_gen [index_hour,gen_type]
+            Sel_x[b,t] = 1
+            Sel_y[b,k] = 1
+            Column.extend([Var[n,h,s,t] for n in range(N_Var)])
     for t in range(Para.N_stage):
-        for s in range(Para.N_scene):
-            Data_gen  = np.zeros((Para.N_gen,Para.N_hour))
-            Data_load = np.zeros((Para.N_bus,Para.N_hour))
-            for h in range(Para.N_hour):
-                index_hour = s * Para.N_hour + h
-                for n in range(Para.N_bus):
-                    Data_load[n,h] = Para.Load[n,t] * Para.Ty_load[index_hour]
-                for n in range(Para.N_gen):
-                    gen_type = int(Para.Gen[n,6])  # type of renewables
-                    Data_gen [n,h] = Para.Gen [n,2] * Para.Ty_gen [index_hour,gen_type]
-            for h in range(Para.N_hour):
-                # 1.Active power balance equation
-                for n in range(Para.N_bus):
-                    # Bus-Branch information
-                    line_head = Info.Line_head[n]
-                    line_tail = Info.Line_tail[n]
-                    conv_head = Info.Conv_head[n]
-                    conv_tail = Info.Conv_tail[n]
-                    # Formulate expression
-                    expr = LinExpr()
-                    expr = expr - quicksum(Var[N_P_line + i,h,s,t] for i in line_head)
-                    expr = expr + quicksum(Var[N_P_line + i,h,s,t] for i in line_tail)
-                    expr = expr - quicksum(Var[N_P_conv + i,h,s,t] for i in conv_head)
-                    expr = expr + quicksum(Var[N_P_conv + i,h,s,t] for i in conv_tail)
-                    if Para.Bus[n,7] == 0:  # AC bus
-                        expr = expr + Var[N_C_load + n,h,s,t] * Para.Factor[0]
-                    if Para.Bus[n,7] == 1:  # DC bus
-                        expr = expr + Var[N_C_load + n,h,s,t] * 1.0
-                    if n in Para.Sub[:,1]:
-                        bus_no = int(np.where(n == Para.Sub[:,1])[0])
-                        expr = expr + Var[N_P_sub + bus_no,h,s,t]
-                    if n in Para.Gen[:,1]:
-                        bus_no = int(np.where(n == Para.Gen[:,1])[0])
-                        if Para.Gen[bus_no,6] == 1:
-                            expr = expr + Var[N_S_gen + bus_no,h,s,t] * 1.0
-                        else:
-                            expr = expr + Var[N_S_gen + bus_no,h,s,t] * Para.Factor[0]
-                    # Add constraint
-                    if Para.Bus[n,7] == 0:  # AC bus
-                        model.addConstr(expr == Data_load[n,h] * Para.Factor[0])
-                    if Para.Bus[n,7] == 1:  # DC bus
-                        model.addConstr(expr == Data_load[n,h] * 1.0)
-                
-                # 2.Reactive power balance equation
-                for n in range(Para.N_bus):
-                    # Bus-Branch information
-                    line_head = Info.Line_head[n]
-                    line_tail = Info.Line_tail[n]
-                    conv_head = Info.Conv_head[n]
-                    conv_tail = Info.Conv_tail[n]
-                    # Formulate expression
-                    expr = LinExpr()
-                    expr = expr - quicksum(Var[N_Q_line + i,h,s,t] for i in line_head)
-                    expr = expr + quicksum(Var[N_Q_line + i,h,s,t] for i in line_tail)
-                    if Para.Bus[n,7] == 0:  # AC bus
-                        expr = expr - quicksum(Var[N_Q_conv + i,h,s,t] for i in conv_head)
-                        expr = expr + quicksum(Var[N_Q_conv + i,h,s,t] for i in conv_tail)
-                        expr = expr + Var[N_C_load + n,h,s,t] * Para.Factor[1]
-                    if Para.Bus[n,7] == 1:  # DC bus
-                        expr = expr + Var[N_C_load + n,h,s,t] * 0.0
-                    if n in Para.Sub[:,1]:
-                        bus_no = int(np.where(n == Para.Sub[:,1])[0])
-                        expr = expr + Var[N_Q_sub + bus_no,h,s,t]
-                    if n in Para.Gen[:,1]:
-                        bus_no = int(np.where(n == Para.Gen[:,1])[0])
-                        if Para.Gen[bus_no,6] == 1:
-                            expr = expr + Var[N_S_gen + bus_no,h,s,t] * 0.0
-                        else:
-                            expr = expr + Var[N_S_gen + bus_no,h,s,t] * Para.Factor[1]
-                    # Add constraint
-                    if Para.Bus[n,7] == 0:  # AC bus
-                        model.addConstr(expr == Data_load[n,h] * Para.Factor[1])
-                    if Para.Bus[n,7] == 1:  # DC bus
-                        model.addConstr(expr == Data_load[n,h] * 0.0)
-                
-                # 3.Voltage balance on line
-                for n in range(Para.N_line):
-                    bus_head = Para.Line[n,1]
-                    bus_tail = Para.Line[n,2]
-                    expr = LinExpr()
-                    expr = expr + Var[N_V_bus + bus_head,h,s,t]
-                    expr = expr - Var[N_V_bus + bus_tail,h,s,t]
-                    expr = expr - Var[N_P_line + n,h,s,t] * 2 * Para.Line_R[n]
-                    expr = expr - Var[N_Q_line + n,h,s,t] * 2 * Para.Line_X[n]
-                    model.addConstr(expr >= -Para.Big_M * (1 - y_line[n,s,t]))
-                    model.addConstr(expr <=  Para.Big_M * (1 - y_line[n,s,t]))
-                
-                # 4.Renewable generation
-                for n in range(Para.N_gen):
-                    expr = LinExpr()
-                    expr = expr + Var[N_S_gen + n,h,s,t]
-                    expr = expr + Var[N_C_gen + n,h,s,t]
-                    model.addConstr(expr == x_gen[n,t] * Data_gen[n,h])
-                
-                # 5.Linearization of quadratic terms in line equations
-                for n in range(Para.N_line):
-                    expr_0 = Var[N_P_line + n,h,s,t] + Var[N_Q_line + n,h,s,t]
-                    expr_1 = Para.Line_S[n,0] + x_line[n,t] * Para.Line_S[n,1]
-                    model.addConstr(expr_0 >= -1.414 * expr_1)
-                    model.addConstr(expr_0 <=  1.414 * expr_1)
-                    model.addConstr(expr_0 >= -1.414 * Para.Big_M * y_line[n,s,t])
-                    model.addConstr(expr_0 <=  1.414 * Para.Big_M * y_line[n,s,t])
-                for n in range(Para.N_line):
-                    expr_0 = Var[N_P_line + n,h,s,t] - Var[N_Q_line + n,h,s,t]
-                    expr_1 = Para.Line_S[n,0] + x_line[n,t] * Para.Line_S[n,1]
-                    model.addConstr(expr_0 >= -1.414 * expr_1)
-                    model.addConstr(expr_0 <=  1.414 * expr_1)
-                    model.addConstr(expr_0 >= -1.414 * Para.Big_M * y_line[n,s,t])
-                    model.addConstr(expr_0 <=  1.414 * Para.Big_M * y_line[n,s,t])
-                
-                # 6.Linearization of quadratic terms in converter equations
-                for n in range(Para.N_conv):
-                    expr_0 = Var[N_P_conv + n,h,s,t] + Var[N_Q_conv + n,h,s,t]
-                    expr_1 = x_conv[n,t] * Para.Conv[n,3]
-                    model.addConstr(expr_0 >= -1.414 * expr_1)
-                    model.addConstr(expr_0 <=  1.414 * expr_1)
-                for n in range(Para.N_conv):
-                    expr_0 = Var[N_P_conv + n,h,s,t] - Var[N_Q_conv + n,h,s,t]
-                    expr_1 = x_conv[n,t] * Para.Conv[n,3]
-                    model.addConstr(expr_0 >= -1.414 * expr_1)
-                    model.addConstr(expr_0 <=  1.414 * expr_1)
-                
-                # 7.Linearization of quadratic terms in substation equations
-                for n in range(Para.N_sub):
-                    expr_0 = Var[N_P_sub + n,h,s,t] + Var[N_Q_sub + n,h,s,t]
-                    expr_1 = Para.Sub_S[n,0] + x_sub[n,t] * Para.Sub_S[n,1]
-                    model.addConstr(expr_0 >= 0)
-                    model.addConstr(expr_0 <= 1.414 * expr_1)
-                for n in range(Para.N_sub):
-                    expr_0 = Var[N_P_sub + n,h,s,t] - Var[N_Q_sub + n,h,s,t]
-                    expr_1 = Para.Sub_S[n,0] + x_sub[n,t] * Para.Sub_S[n,1]
-                    model.addConstr(expr_0 >= 0)
-                    model.addConstr(expr_0 <= 1.414 * expr_1)
-                
-                # 8.Bounds of variables
-                # 1) Voltage
-                for n in range(Para.N_bus):
-                    model.addConstr(Var[N_V_bus + n,h,s,t] >= Para.Voltage_low ** 2)
-                    model.addConstr(Var[N_V_bus + n,h,s,t] <= Para.Voltage_upp ** 2)
-                # 2) Power flow
-                for n in range(Para.N_line):
-                    expr = Para.Line_S[n,0] + x_line[n,t] * Para.Line_S[n,1]
-                    model.addConstr(Var[N_P_line + n,h,s,t] >= -y_line[n,s,t] * Para.Big_M)
-                    model.addConstr(Var[N_P_line + n,h,s,t] <=  y_line[n,s,t] * Para.Big_M)
-                    model.addConstr(Var[N_P_line + n,h,s,t] >= -expr)
-                    model.addConstr(Var[N_P_line + n,h,s,t] <=  expr)
-                for n in range(Para.N_line):
-                    if Para.Line[n,9] == 0:
-                        expr = Para.Line_S[n,0] + x_line[n,t] * Para.Line_S[n,1]
-                        model.addConstr(Var[N_Q_line + n,h,s,t] >= -y_line[n,s,t] * Para.Big_M)
-                        model.addConstr(Var[N_Q_line + n,h,s,t] <=  y_line[n,s,t] * Para.Big_M)
-                        model.addConstr(Var[N_Q_line + n,h,s,t] >= -expr)
-                        model.addConstr(Var[N_Q_line + n,h,s,t] <=  expr)
-                    if Para.Line[n,9] == 1:
-                        model.addConstr(Var[N_Q_line + n,h,s,t] ==  0)
-                # 3) Converter
-                for n in range(Para.N_conv):
-                    expr = x_conv[n,t] * Para.Conv[n,3]
-                    model.addConstr(Var[N_P_conv + n,h,s,t] >= -expr)
-                    model.addConstr(Var[N_P_conv + n,h,s,t] <=  expr)
-                for n in range(Para.N_conv):
-                    expr = x_conv[n,t] * Para.Conv[n,3]
-                    model.addConstr(Var[N_Q_conv + n,h,s,t] >= -expr)
-                    model.addConstr(Var[N_Q_conv + n,h,s,t] <=  expr)
-                # 4) Substation
-                for n in range(Para.N_sub):
-                    expr = Para.Sub_S[n,0] + x_sub[n,t] * Para.Sub_S[n,1]
-                    model.addConstr(Var[N_P_sub + n,h,s,t] >= 0)
-                    model.addConstr(Var[N_P_sub + n,h,s,t] <= expr)
-                for n in range(Para.N_sub):
-                    expr = Para.Sub_S[n,0] + x_sub[n,t] * Para.Sub_S[n,1]
-                    model.addConstr(Var[N_Q_sub + n,h,s,t] >= 0)
-                    model.addConstr(Var[N_Q_sub + n,h,s,t] <= expr)
-                # 5) Load shedding
-                for n in range(Para.N_bus):
-                    model.addConstr(Var[N_C_load + n,h,s,t] >= 0)
-                    model.addConstr(Var[N_C_load + n,h,s,t] <= Data_load[n,h])
-                # 6) Renewables
-                for n in range(Para.N_gen):
-                    model.addConstr(Var[N_S_gen + n,h,s,t] >= 0)
-                    model.addConstr(Var[N_S_gen + n,h,s,t] <= Data_gen[n,h])
-                for n in range(Para.N_gen):
-                    model.addConstr(Var[N_C_gen + n,h,s,t] >= 0)
-                    model.addConstr(Var[N_C_gen + n,h,s,t] <= Data_gen[n,h])
-    
+        Column.extend([x_line[n,t] for n in range(Para.N_line)])
+        Column.extend([x_conv[n,t] for n in range(Para.N_conv)])
+        Column.extend([x_sub [n,t] for n in range(Para.N_sub )])
+        Column.extend([x_gen [n,t] for n in range(Para.N_gen )])
+    for [s,t,w] in Scene:
+        Column.extend([y_line[n,s,t] for n in range(Para.N_line)])
+    N_row = len(Block.b0)
+    N_x   = Block.N_x
+    A_var = Block.A[:, 0 : N_Var]
+    A_x   = Block.A[:, N_Var : N_Var + N_x]
+    A_y   = Block.A[:, N_Var + N_x :]
+    # Coefficient of x_gen is scaled by renewable data of each block
+    G = Block.A_gen
+    row = (np.arange(N_block).reshape(-1,1) * N_row + G.row).ravel()
+    col = (np.argmax(Sel_x,axis = 1).reshape(-1,1) * N_x + N_x - Para.N_gen + G.col).ravel()
+    val = (Data_gen[:,G.col] * G.data).ravel()
+    A_gen = sparse.csr_matrix((val,(row,col)),shape = (N_block * N_row,Para.N_stage * N_x))
+    A = sparse.hstack([sparse.kron(sparse.identity(N_block),A_var),
+                       sparse.kron(sparse.csr_matrix(Sel_x),A_x) + A_gen,
+                       sparse.kron(sparse.csr_matrix(Sel_y),A_y)]).tocsr()
+    rhs = np.tile(Block.b0,N_block)
+    rhs = rhs + (Block.B_load.dot(Data_load.T)).T.ravel()
+    rhs = rhs + (Block.B_gen .dot(Data_gen .T)).T.ravel()
+    model.addMConstr(A,Column,np.tile(Block.sense,N_block),rhs)
+
     # Optimize
     model.setObjective(obj_con + obj_opr, GRB.MINIMIZE)
     model.setParam("MIPGap", 0.05)
@@ -642,6 +745,42 @@ def Planning(Para,Info):
     return result
 
 
+# This function solves the planning problem in a rolling-horizon manner. Stage t
+# is modeled in detail with investments of earlier stages fixed, and the next
+# n_ahead stages are aggregated into the peak-load scenario. The plan can then be
+# polished by fix-and-optimize, where each stage is re-optimized with the other
+# stages fixed. Finally the operating cost of each stage is evaluated under the
+# plan, so only one stage is modeled in detail at a time
+#
+def PlanningRolling(Para,Info,n_ahead = 1,polish = 1):
+    # Peak-load scenario for look-ahead stages
+    Ty_peak = [max(Para.Ty_load[s*Para.N_hour:(s+1)*Para.N_hour]) for s in range(Para.N_scene)]
+    s_peak  = int(np.argmax(Ty_peak))
+    # Rolling horizon
+    Res = 0
+    for t in range(Para.N_stage):
+        Scene = [[s,t,1] for s in range(Para.N_scene)]
+        for k in range(t + 1, min(t + 1 + n_ahead, Para.N_stage)):
+            Scene.append([s_peak,k,Para.N_scene])
+        Res = Planning(Para,Info,Scene,list(range(t)),Res)
+    # Fix-and-optimize and evaluation of each stage
+    y_line  = np.zeros((Para.N_line,Para.N_scene,Para.N_stage))
+    obj_opr = 0
+    for t in range(Para.N_stage):
+        Scene = [[s,t,1] for s in range(Para.N_scene)]
+        if polish == 1:
+            Fix = [k for k in range(Para.N_stage) if k != t]
+        else:
+            Fix = list(range(Para.N_stage))
+        Res = Planning(Para,Info,Scene,Fix,Res)
+        y_line[:,:,t] = Res.y_line[:,:,t]
+        obj_opr = obj_opr + Res.obj_opr
+    Res.y_line  = y_line
+    Res.obj_opr = obj_opr
+    Res.obj     = Res.obj_con + obj_opr
+    return Res
+
+
 if __name__ == "__main__":
 
     time_start=time.time()
@@ -652,7 +791,11 @@ if __name__ == "__main__":
     Para = Parameter(Data)  # System parameter
     Info = BusInfo(Para)  # Bus information
 
-    Result_Planning = Planning(Para,Info)
+    mode = 'extensive'  # 'extensive' or 'rolling' (rolling-horizon)
+    if mode == 'rolling':
+        Result_Planning = PlanningRolling(Para,Info)
+    else:
+        Result_Planning = Planning(Para,Info)
         
     '''
     # Figure
@@ -8,14 +8,19 @@
 # system in Zhejiang province, China.
 
 
+import os
 import sys
 import csv
 import math
 import xlrd
 import time
+import multiprocessing
 import numpy as np
 import matplotlib.pyplot as plt
 
+from matplotlib.figure import Figure
+from matplotlib.collections import LineCollection
+
 from gurobipy import *
 
 
@@ -32,6 +37,7 @@ class Parameter(object):
         self.N_time   = 90  # number of times
         self.Int_rate = 0.05  # interest rate
         self.Big_M = 245  # Big M
+        self.Tight_M = 1  # per-line Big M (1) or uniform Big M (0)
         self.Factor = [0.95,math.sqrt(1-0.95**2)]  # power factor
         self.Voltage = 35
         self.Voltage_low = 35 * 0.95
@@ -41,6 +47,10 @@ class Parameter(object):
         self.Cost_cutload = 200  # cost of load curtailment
         self.Cost_gen     = 10   # cost of renewable generation
         self.Cost_cutgen  = 200  # cost of renewable curtailment
+        # Uncertainty
+        self.Dev_load = 0.1  # maximum deviation of load (increase)
+        self.Dev_gen  = 0.2  # maximum deviation of renewables (decrease)
+        self.Budget   = 2    # budget of uncertainty, i.e. number of deviated hours
         # Bus
         self.Bus  = Data[0]
         self.Bus_AC = self.Bus[np.where(self.Bus[:,7] == 0)]
@@ -60,6 +70,7 @@ class Parameter(object):
         self.Line_X = self.Line[:,5]
         self.Line_S = self.Line[:,6:8]
         self.Line_S_max = (self.Line_S).sum(axis = 1)
+        [self.Big_M_V,self.Big_M_S] = BigM(self)
         self.Dep_line = Depreciation(25,self.Int_rate)
         # Converter station
         self.Conv = Data[2]
@@ -143,7 +154,9 @@ class ResultMasterMILP(object):
 
 # This class restores the results of reconfiguration worker-problem
 class ResultWorkerLP(object):
-    def __init__(self,model,Para,N_con):
+    def __init__(self,model,Para,N_con,flag = 1):
+        # Optimality (1) or feasibility (-1) information
+        self.flag = flag
         # Get all variables
         var = model.getVars()
         var = np.array([var[i].x for i in range(len(var))])
@@ -156,7 +169,8 @@ class ResultWorkerLP(object):
         self.x_gen  = var[N_X_gen  : N_X_gen  + Para.N_gen ]
         self.y_line = var[N_Y_line : N_Y_line + Para.N_line]
         # Saving operating variables
-        opr = var[N_Index:].reshape((N_Var,Para.N_hour), order = 'A')
+        opr = var[N_Index : N_Index + N_Var * Para.N_hour]
+        opr = opr.reshape((N_Var,Para.N_hour), order = 'A')
         self.V_bus  = opr[N_V_bus  : N_V_bus  + Para.N_bus , :]
         self.P_line = opr[N_P_line : N_P_line + Para.N_line, :]
         self.Q_line = opr[N_Q_line : N_Q_line + Para.N_line, :]
@@ -228,6 +242,22 @@ def Matrix_slice(Matrix,Coordinate):
     return Matrix_partitioned
 
 
+# This function computes the Big M of each line, i.e. the tightest values for
+# constraints relaxed by y_line when line is switched off. The flow of a line
+# which is switched off is zero, so terms of R and X vanish and
+#   1) Voltage drop: |V_i - V_j - 2*(R*P + X*Q)| <= V_upp^2 - V_low^2
+#   2) Power flow: |P|, |Q| <= S_max, the capacity with investment
+# If Tight_M = 0, the uniform Big_M is used for benchmarking
+#
+def BigM(Para):
+    Big_M_V = np.ones(Para.N_line) * (Para.Voltage_upp ** 2 - Para.Voltage_low ** 2)
+    Big_M_S = Para.Line_S_max.copy()
+    if Para.Tight_M == 0:
+        Big_M_V = np.ones(Para.N_line) * Para.Big_M
+        Big_M_S = np.ones(Para.N_line) * Para.Big_M
+    return [Big_M_V,Big_M_S]
+
+
 # This function creates a depreciation calculator
 #
 def Depreciation(life,rate):
@@ -235,53 +265,82 @@ def Depreciation(life,rate):
     return recovery
 
 
-# This class restores the 'plot' function
+# This class restores the 'plot' function. A figure is shown on the screen, or
+# saved to a file if the filename is given. Batch renders the planning of all
+# stages and the reconfiguration of all scenarios into files in a process pool,
+# which does not need a display
 class PlotFunc(object):
     def __init__(self,Para):
         pass
-    def Planning(self,Para,Res,t):
-        x_line = Res.x_line[:,t]
-        x_conv = Res.x_conv[:,t]
-        for n in range(Para.N_line):
-            if Para.Line[n,6] > 0:
-                x_line[n] = 1
-        self.Plot_Figure(Para,x_line,x_conv)
-    def Reconfig(self,Para,Res,s,t):
+    def Planning(self,Para,Res,t,filename = ''):
+        [x_line,x_conv] = self.Planning_State(Para,Res,t)
+        self.Plot_Figure(Para,x_line,x_conv,filename)
+    def Reconfig(self,Para,Res,s,t,filename = ''):
         y_line = Res.y_line[:,s,t]
         x_conv = Res.x_conv[:,t]
-        self.Plot_Figure(Para,y_line,x_conv)
-    def Plot_Figure(self,Para,Line,Conv):
-        x = (Para.Bus[:,2]).copy()
-        y = (Para.Bus[:,3]).copy()
-        for n in range(Para.N_bus):  # Bus
-            if Para.Bus[n,7] == 1:
-                y[n] = y[n] - 150
-        for n in range(Para.N_bus):  # Bus
-            plt.text(x[n] + 3, y[n] + 3, '%s'%n)
-            if n in Para.Sub[:,1]:
-                plt.plot(x[n],y[n],'rs')
-            else:
-                plt.plot(x[n],y[n],'b.')
-        for n in range(Para.N_line):  # lines
-            x1 = x[int(round(Para.Line[n,1]))]
-            y1 = y[int(round(Para.Line[n,1]))]
-            x2 = x[int(round(Para.Line[n,2]))]
-            y2 = y[int(round(Para.Line[n,2]))]
-            if Line[n] == 1:
-                if Para.Line[n,9] == 0:
-                    plt.plot([x1,x2],[y1,y2],'r-')
-                if Para.Line[n,9] == 1:
-                    plt.plot([x1,x2],[y1,y2],'b-')
-            else:
-                plt.plot([x1,x2],[y1,y2],'b--')
-        for n in range(Para.N_conv):  # converters
-            if Conv[n] == 1:
-                head = int(round(Para.Conv[n,1]))
-                tail = int(round(Para.Conv[n,2]))
-                plt.plot(x[head],y[head],'bs')
-                plt.plot(x[tail],y[tail],'bs')
-        plt.axis('equal')
-        plt.show()
+        self.Plot_Figure(Para,y_line,x_conv,filename)
+    def Batch(self,Para,Res,path,form = 'png',n_process = 4):
+        os.makedirs(path,exist_ok = True)
+        task = []
+        for t in range(Para.N_stage):
+            [x_line,x_conv] = self.Planning_State(Para,Res,t)
+            filename = os.path.join(path,'planning-%d.%s' % (t,form))
+            task.append((Para,x_line,x_conv,filename))
+            for s in range(Para.N_scene):
+                filename = os.path.join(path,'reconfig-%d-%d.%s' % (s,t,form))
+                task.append((Para,Res.y_line[:,s,t],x_conv,filename))
+        context = multiprocessing.get_context('spawn')
+        with context.Pool(n_process) as pool:
+            pool.starmap(PlotFile,task)
+    def Planning_State(self,Para,Res,t):
+        x_line = (Res.x_line[:,t]).copy()
+        x_conv = (Res.x_conv[:,t]).copy()
+        x_line[Para.Line[:,6] > 0] = 1  # existing line
+        return [x_line,x_conv]
+    def Plot_Figure(self,Para,Line,Conv,filename = ''):
+        if filename == '':
+            fig = plt.figure()
+            PlotTopology(fig.add_subplot(111),Para,Line,Conv)
+            plt.show()
+        else:
+            PlotFile(Para,Line,Conv,filename)
+
+
+# This function draws the topology on the axes. Buses are drawn by scatter and
+# lines by one LineCollection. Lines in service are solid (AC in red and DC in
+# blue) and other lines are dashed
+#
+def PlotTopology(ax,Para,Line,Conv):
+    x = (Para.Bus[:,2]).copy()
+    y = (Para.Bus[:,3]).copy()
+    y[Para.Bus[:,7] == 1] = y[Para.Bus[:,7] == 1] - 150  # DC bus
+    sub = np.isin(np.arange(Para.N_bus),Para.Sub[:,1])
+    for n in range(Para.N_bus):  # Bus
+        ax.text(x[n] + 3, y[n] + 3, '%s'%n)
+    ax.scatter(x[~sub],y[~sub],s = 10,c = 'b',marker = '.')
+    ax.scatter(x[ sub],y[ sub],s = 30,c = 'r',marker = 's')
+    head = np.round(Para.Line[:,1]).astype(int)
+    tail = np.round(Para.Line[:,2]).astype(int)
+    segment = np.stack([np.c_[x[head],y[head]],np.c_[x[tail],y[tail]]],axis = 1)
+    state = np.array(Line) == 1
+    color = np.where(state & (Para.Line[:,9] == 0),'r','b')
+    style = np.where(state,'solid','dashed')
+    ax.add_collection(LineCollection(segment,colors = color.tolist(),
+                                     linestyles = style.tolist()))
+    conv = Para.Conv[np.array(Conv) == 1]  # converters
+    node = np.round(np.r_[conv[:,1],conv[:,2]]).astype(int)
+    ax.scatter(x[node],y[node],s = 30,c = 'b',marker = 's')
+    ax.autoscale_view()
+    ax.axis('equal')
+
+
+# This function renders the topology into a file. The figure is not managed by
+# pyplot, so no display is needed and the memory is released after saving
+#
+def PlotFile(Para,Line,Conv,filename):
+    fig = Figure()
+    PlotTopology(fig.add_subplot(111),Para,Line,Conv)
+    fig.savefig(filename)
 
 
 # This function...
@@ -386,7 +445,7 @@ def createMasterMILP(Para,Info):
             index = s * Para.N_hour + 1
             for n in range(Para.N_bus ):
                 Data_load[n] = Para.Load[n,t] * Para.Ty_load[index]
-            for n in range(Para.N_hour):
+            for n in range(Para.N_gen):
                 tp = int(Para.Gen[n,6])  # type of renewables
                 Data_gen [n] = Para.Gen [n,2] * Para.Ty_gen [index,tp]
             # Initialize fictitious power flow
@@ -463,11 +522,12 @@ def createMasterMILP(Para,Info):
     return model
    
 
-# This function creates the reconfiguration worker problem. Dual variables 
+# This function creates the reconfiguration worker problem. Dual variables
 # are returned for generating Benders cut. The problem is formulated under
-# a given scenario 's' at stage 't'.
+# a given scenario 's' at stage 't'. If dev = 1, load and renewables of all
+# hours deviate to the bound of the uncertainty set
 #
-def createWorkerLP(Para,Info,s,t):
+def createWorkerLP(Para,Info,s,t,dev = 0):
     #
     # minimize
     #       Costs of power purchasing, load shedding, renewables generation
@@ -492,6 +552,9 @@ def createWorkerLP(Para,Info,s,t):
         for n in range(Para.N_gen):
             gen_type = int(Para.Gen[n,6])  # type of renewables
             Data_gen [n,h] = Para.Gen [n,2] * Para.Ty_gen [index_hour,gen_type]
+    if dev == 1:
+        Data_load = Data_load * (1 + Para.Dev_load)
+        Data_gen  = Data_gen  * (1 - Para.Dev_gen )
 
     # Model
     model = Model()
@@ -594,8 +657,8 @@ def createWorkerLP(Para,Info,s,t):
             expr = expr - Var[N_V_bus + bus_tail, h]
             expr = expr - Var[N_P_line + n, h] * 2 * Para.Line_R[n]
             expr = expr - Var[N_Q_line + n, h] * 2 * Para.Line_X[n]
-            model.addConstr(expr >= -Para.Big_M * (1 - y_line[n]))
-            model.addConstr(expr <=  Para.Big_M * (1 - y_line[n]))
+            model.addConstr(expr >= -Para.Big_M_V[n] * (1 - y_line[n]))
+            model.addConstr(expr <=  Para.Big_M_V[n] * (1 - y_line[n]))
         
         # 4.Renewable generation
         for n in range(Para.N_gen):
@@ -728,12 +791,70 @@ def WorkerLP(Para,Info,Res_Master,WorkerPool,s,t):
     if model.status == GRB.Status.OPTIMAL:
         result = ResultWorkerLP(model,Para,N_con)
         return result
+    if model.status in [GRB.Status.INFEASIBLE, GRB.Status.INF_OR_UNBD]:
+        result = WorkerPhaseOne(model,Para,N_con)
+        return result
     else:
         return 0
 
 
+# This function solves the phase-1 problem of an infeasible worker. All the
+# operating constraints are relaxed by slack variables with unit penalty, 
+# while the fixing constraints are kept so that their dual variables give
+# the coefficients of a feasibility cut
+#
+def WorkerPhaseOne(model,Para,N_con):
+    constr = model.getConstrs()
+    relax  = [constr[n] for n in range(N_con[-2])]  # operating constraints
+    model.feasRelax(0, False, None, None, None, relax, [1.0] * len(relax))
+    model.optimize()
+    if model.status == GRB.Status.OPTIMAL:
+        result = ResultWorkerLP(model,Para,N_con,-1)
+        return result
+    else:
+        return 0
+
+
+# This function formulates the linear expression of a Benders cut with the
+# given dual information. The constant term is returned together with the 
+# expression, i.e. cut = expr + c
+#
+def BendersExpr(model,Incumbent,d_x_line,d_x_conv,d_x_sub,d_x_gen,d_y_line,d_object):
+    i = 0  # index of variables
+    c = d_object  # constant
+    expr = LinExpr()
+    for n in range(Para.N_line):
+        for t in range(Para.N_stage):
+            expr.addTerms(d_x_line[n,t], model._vars[i])
+            c = c - d_x_line[n,t] * Incumbent[i]
+            i = i + 1
+    for n in range(Para.N_conv):
+        for t in range(Para.N_stage):
+            expr.addTerms(d_x_conv[n,t], model._vars[i])
+            c = c - d_x_conv[n,t] * Incumbent[i]
+            i = i + 1
+    for n in range(Para.N_sub ):
+        for t in range(Para.N_stage):
+            expr.addTerms(d_x_sub [n,t], model._vars[i])
+            c = c - d_x_sub [n,t] * Incumbent[i]
+            i = i + 1
+    for n in range(Para.N_gen ):
+        for t in range(Para.N_stage):
+            expr.addTerms(d_x_gen [n,t], model._vars[i])
+            c = c - d_x_gen [n,t] * Incumbent[i]
+            i = i + 1
+    for n in range(Para.N_line):
+        for s in range(Para.N_scene):
+            for t in range(Para.N_stage):
+                expr.addTerms(d_y_line[n,s,t], model._vars[i])
+                c = c - d_y_line[n,s,t] * Incumbent[i]
+                i = i + 1
+    return [expr,c]
+
+
 # This function adds Benders cut to the master problem once an
-# incumbent solution is found
+# incumbent solution is found. If any worker is infeasible, feasibility
+# cuts are added instead of the optimality cut
 #
 def BendersCut(model,where):
     if where == GRB.Callback.MIPSOL:
@@ -747,10 +868,19 @@ def BendersCut(model,where):
         d_x_gen  = np.zeros((Para.N_gen , Para.N_stage))
         d_y_line = np.zeros((Para.N_line, Para.N_scene, Para.N_stage))
         d_object = 0
+        Infeasible = []  # phase-1 results of infeasible workers
         # Operating worker linear programming
         for t in range(Para.N_stage):
             for s in range(Para.N_scene):
                 result = WorkerLP(Para,Info,Res_Master,WorkerPool,s,t)
+                if result == 0:  # numerical trouble, the incumbent is not priced
+                    print('Numerical trouble in the worker LPs, optimization is terminated')
+                    model._trouble = 1
+                    model.terminate()
+                    return
+                if result.flag == -1:
+                    Infeasible.append([result,s,t])
+                    continue
                 # Formulate coefficient
                 d_x_line[:,t] = d_x_line[:,t] + result.d_x_line
                 d_x_conv[:,t] = d_x_conv[:,t] + result.d_x_conv
@@ -758,36 +888,26 @@ def BendersCut(model,where):
                 d_x_gen [:,t] = d_x_gen [:,t] + result.d_x_gen
                 d_y_line[:,s,t] = result.d_y_line
                 d_object = d_object + result.obj
+        # Formulate feasibility cut
+        if Infeasible != []:
+            for [result,s,t] in Infeasible:
+                f_x_line = np.zeros((Para.N_line, Para.N_stage))
+                f_x_conv = np.zeros((Para.N_conv, Para.N_stage))
+                f_x_sub  = np.zeros((Para.N_sub , Para.N_stage))
+                f_x_gen  = np.zeros((Para.N_gen , Para.N_stage))
+                f_y_line = np.zeros((Para.N_line, Para.N_scene, Para.N_stage))
+                f_x_line[:,t] = result.d_x_line
+                f_x_conv[:,t] = result.d_x_conv
+                f_x_sub [:,t] = result.d_x_sub
+                f_x_gen [:,t] = result.d_x_gen
+                f_y_line[:,s,t] = result.d_y_line
+                [expr,c] = BendersExpr(model,Incumbent,f_x_line,f_x_conv,
+                                       f_x_sub,f_x_gen,f_y_line,result.obj)
+                model.cbLazy(expr + c <= 0)
+            return
         # Formulate Benders cut
-        i = 0  # index of variables
-        c = d_object  # constant
-        expr = LinExpr()
-        for n in range(Para.N_line):
-            for t in range(Para.N_stage):
-                expr.addTerms(d_x_line[n,t], model._vars[i])
-                c = c - d_x_line[n,t] * Incumbent[i]
-                i = i + 1
-        for n in range(Para.N_conv):
-            for t in range(Para.N_stage):
-                expr.addTerms(d_x_conv[n,t], model._vars[i])
-                c = c - d_x_conv[n,t] * Incumbent[i]
-                i = i + 1
-        for n in range(Para.N_sub ):
-            for t in range(Para.N_stage):
-                expr.addTerms(d_x_sub [n,t], model._vars[i])
-                c = c - d_x_sub [n,t] * Incumbent[i]
-                i = i + 1
-        for n in range(Para.N_gen ):
-            for t in range(Para.N_stage):
-                expr.addTerms(d_x_gen [n,t], model._vars[i])
-                c = c - d_x_gen [n,t] * Incumbent[i]
-                i = i + 1
-        for n in range(Para.N_line):
-            for s in range(Para.N_scene):
-                for t in range(Para.N_stage):
-                    expr.addTerms(d_y_line[n,s,t], model._vars[i])
-                    c = c - d_y_line[n,s,t] * Incumbent[i]
-                    i = i + 1
+        [expr,c] = BendersExpr(model,Incumbent,d_x_line,d_x_conv,
+                               d_x_sub,d_x_gen,d_y_line,d_object)
         model.cbLazy(model._vars[-1] >= expr + c)
 
 
@@ -797,14 +917,15 @@ def BendersDSEP(MasterMILP,WorkerPool):
     # Copy
     model = MasterMILP.copy()
     model._vars = model.getVars()
+    model._trouble = 0  # numerical trouble in the callback
     # Set parameters
     model.Params.lazyConstraints = 1
     model.Params.MIPGap = 0.025
     model.Params.TimeLimit = 1800  # half an hour
     # Optimize
     model.optimize(BendersCut)
-    # Result
-    if model.status == GRB.Status.OPTIMAL:
+    # Result, which is not reliable if any incumbent was not priced
+    if model.status == GRB.Status.OPTIMAL and model._trouble == 0:
         variable = [(model._vars[i]).x for i in range(len(model._vars))]
         result = ResultMasterMILP(model,Para,variable)
         return result
@@ -812,13 +933,180 @@ def BendersDSEP(MasterMILP,WorkerPool):
         return 0
 
 
-# This function creates the robust planning model
-def RobustDSEP(MasterMILP,WorkerPool):
+# This function initializes a process of the robust worker pool. Processes are
+# spawned, so the global parameters are passed and indexed here
+#
+def RobustInit(para,info):
+    global Para, Info
+    Para = para
+    Info = info
+    Indexing(Para)
+
+
+# This function returns the worker linear programming of scenario 's' at stage
+# 't' with nominal (dev = 0) or deviated (dev = 1) data. Models are created once
+# in each process and kept in RobustPool across iterations
+#
+RobustPool = {}
+def RobustModel(s,t,dev):
+    if (s,t,dev) not in RobustPool:
+        model = createWorkerLP(Para,Info,s,t,dev)
+        model.Params.OutputFlag = 0  # turn off the display
+        RobustPool[s,t,dev] = model
+    return RobustPool[s,t,dev]
+
+
+# This function solves the adversarial problem of scenario 's' at stage 't'
+# under the given planning and reconfiguration 'link'. With x and y fixed, the
+# worker problem is separable by hours, so the operating cost of each hour is
+# computed with nominal and deviated data. Infeasible hours have infinite cost
+#
+def RobustWorker(s,t,link):
+    cost = np.zeros((2,Para.N_hour))
+    for dev in [0,1]:
+        model = RobustModel(s,t,dev)
+        var = model.getVars()
+        model.setAttr('LB', var[0:N_Index], link)
+        model.setAttr('UB', var[0:N_Index], link)
+        model.optimize()
+        if model.status == GRB.Status.OPTIMAL:
+            value = np.array(model.getAttr('X',  var[N_Index:]))
+            coeff = np.array(model.getAttr('Obj',var[N_Index:]))
+            cost[dev,:] = (value * coeff).reshape((N_Var,Para.N_hour)).sum(axis = 0)
+        else:
+            cost[dev,:] = float("inf")
+    return cost
+
+
+# This function returns the index of master variables linked to the worker of
+# scenario 's' at stage 't', in the order of x_line, x_conv, x_sub, x_gen and
+# y_line of the worker
+#
+def RobustLink(s,t):
+    N_x = np.cumsum([0, Para.N_line, Para.N_conv, Para.N_sub, Para.N_gen]) * Para.N_stage
+    index = []
+    index.extend(N_x[0] + np.arange(Para.N_line) * Para.N_stage + t)
+    index.extend(N_x[1] + np.arange(Para.N_conv) * Para.N_stage + t)
+    index.extend(N_x[2] + np.arange(Para.N_sub ) * Para.N_stage + t)
+    index.extend(N_x[3] + np.arange(Para.N_gen ) * Para.N_stage + t)
+    index.extend(N_x[4] + np.arange(Para.N_line) * Para.N_scene * Para.N_stage
+                 + s * Para.N_stage + t)
+    return index
+
+
+# This function adds the operating block of hour 'h' in scenario 's' at stage
+# 't' to the master problem. The block is the rows of hour 'h' in the worker
+# problem, with worker x and y replaced by master variables. The operating
+# cost of the block is returned
+#
+def RobustBlock(model,Template,s,t,h):
+    [A,sense,rhs,obj] = Template
+    n_row = A.shape[0] // Para.N_hour  # rows of each hour
+    row = np.arange(h * n_row, (h + 1) * n_row)
+    col = N_Index + np.arange(N_Var) * Para.N_hour + h  # operating variables
+    Var = [model.addVar(lb = -GRB.INFINITY) for n in range(N_Var)]
+    var = [model._vars[i] for i in RobustLink(s,t)] + Var
+    A_h = A[row,:][:,np.r_[np.arange(N_Index),col]]
+    model.addMConstr(A_h, var, sense[row], rhs[row])
+    return LinExpr(obj[col].tolist(), Var)
+
+
+# This function solves the two-stage robust planning model by column-and-
+# constraint generation. The uncertainty set is budgeted: in each scenario at
+# most Para.Budget hours deviate, with load increased by Dev_load and renewables
+# decreased by Dev_gen. In each iteration:
+#   1) The master problem gives the planning and a lower bound
+#   2) Adversarial problems of all (s,t) are solved in parallel, giving the
+#      worst case and an upper bound
+#   3) Operating blocks of the worst case are added to the master problem,
+#      i.e. new columns and constraints. Blocks of (s,t,h,dev) are cached and
+#      shared by all worst cases, so each block is added only once
+# The upper bound is the best one so far, and the plan achieving it is returned
+#
+def RobustDSEP(MasterMILP,n_process = 4,max_iter = 20,tol = 1e-2):
     lower_bound = []
     upper_bound = []
+    best = 0  # plan of the best upper bound
     n_iter = 0
-    # Benders decomposition
-    Result_DSEP = BendersDSEP(MasterMILP,WorkerPool)
+    # Master problem
+    model = MasterMILP.copy()
+    model._vars = model.getVars()  # variables of the original master problem
+    model.Params.MIPGap = 0.025
+    model.Params.TimeLimit = 1800  # half an hour
+    eta = model.addVars(Para.N_scene, Para.N_stage)  # worst-case operating cost
+    model.addConstr(model._vars[-1] >= eta.sum())
+    Template = {}  # worker matrices of (s,t,dev)
+    Block = {}  # operating cost of blocks (s,t,h,dev) in the master problem
+    Case  = {}  # worst cases of (s,t) in the master problem
+    # Adversarial problems
+    if n_process > 1:
+        context = multiprocessing.get_context('spawn')
+        pool = context.Pool(n_process, initializer = RobustInit, initargs = (Para,Info))
+    while True:
+        # 1) Master problem
+        model.optimize()
+        if model.status not in [GRB.Status.OPTIMAL, GRB.Status.TIME_LIMIT] or model.SolCount == 0:
+            result = 0
+            break
+        variable = [(model._vars[i]).x for i in range(len(model._vars))]
+        result = ResultMasterMILP(model,Para,variable)
+        lower_bound.append(model.ObjBound)
+        # 2) Adversarial problems
+        task = []
+        for t in range(Para.N_stage):
+            for s in range(Para.N_scene):
+                link = np.r_[result.x_line[:,t], result.x_conv[:,t], result.x_sub[:,t],
+                             result.x_gen[:,t], result.y_line[:,s,t]]
+                task.append((s,t,link))
+        if n_process > 1:
+            Cost = pool.starmap(RobustWorker,task)
+        else:
+            Cost = [RobustWorker(*arg) for arg in task]
+        obj_opr = 0
+        n_new = 0  # number of new worst cases
+        for k in range(len(task)):
+            [s,t,_] = task[k]
+            cost = Cost[k]
+            rise = cost[1,:] - cost[0,:]
+            dev  = np.zeros(Para.N_hour, dtype = int)
+            pick = np.argsort(-rise)[0:Para.Budget]
+            dev[pick[rise[pick] > 0]] = 1  # worst case of the budgeted set
+            obj_opr = obj_opr + cost[dev,np.arange(Para.N_hour)].sum()
+            # 3) Operating blocks of the worst case
+            if tuple(dev) in Case.setdefault((s,t),[]):
+                continue
+            Case[s,t].append(tuple(dev))
+            n_new = n_new + 1
+            for h in range(Para.N_hour):
+                if (s,t,h,dev[h]) not in Block:
+                    if (s,t,dev[h]) not in Template:
+                        worker = RobustModel(s,t,dev[h])
+                        Template[s,t,dev[h]] = [worker.getA().tocsr(),
+                                                np.array(worker.getAttr('Sense',worker.getConstrs())),
+                                                np.array(worker.getAttr('RHS',  worker.getConstrs())),
+                                                np.array(worker.getAttr('Obj',  worker.getVars()))]
+                    Block[s,t,h,dev[h]] = RobustBlock(model,Template[s,t,dev[h]],s,t,h)
+            model.addConstr(eta[s,t] >= quicksum(Block[s,t,h,dev[h]] for h in range(Para.N_hour)))
+        if best == 0 or result.obj_con + obj_opr < upper_bound[-1]:
+            best = result
+            upper_bound.append(result.obj_con + obj_opr)
+        else:
+            upper_bound.append(upper_bound[-1])
+        gap = (upper_bound[-1] - lower_bound[-1]) / upper_bound[-1]
+        print('Iteration %d: lower bound %.2f, upper bound %.2f, gap %.4f'
+              % (n_iter, lower_bound[-1], upper_bound[-1], gap))
+        if gap <= tol or n_new == 0 or n_iter >= max_iter:
+            break
+        else:
+            n_iter = n_iter + 1
+    if n_process > 1:
+        pool.close()
+        pool.join()
+    if result != 0:
+        result = best
+        result.lower_bound = lower_bound
+        result.upper_bound = upper_bound
+    return result
 
 
 # Main function
@@ -834,15 +1122,13 @@ if __name__ == "__main__":
 
     # Create model
     MasterMILP = createMasterMILP(Para,Info)
-    WorkerPool = []
-    for t in range(Para.N_stage):
-        for s in range(Para.N_scene):
-            WorkerPool.append(createWorkerLP(Para,Info,s,t))
-    
-    # Benders decomposition
-    Result_DSEP = RobustDSEP(MasterMILP,WorkerPool)
+
+    # Column-and-constraint generation
+    n_process = 4  # number of processes, 1 for serial
+    Result_DSEP = RobustDSEP(MasterMILP,n_process)
     
     # Save results
+    os.makedirs('result', exist_ok = True)  # output directory, not tracked
     with open('result/result.csv', 'w', newline = '') as f:
         writer = csv.writer(f)
         writer.writerows(Result_DSEP.x_line.tolist())